@@ -1,3 +1,4 @@
+import atexit
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from pymongo import MongoClient
@@ -11,6 +12,13 @@ from models.wallet import Wallet
 from services.logger import AttackLogger
 from services.web3_service import Web3Service
 from services.analyzer import AttackAnalyzer
+from services.ingest_queue import IngestQueue
+from services.enrichment import EnrichmentWorker
+from services.spool import EventSpool, SpoolReplayer
+from services.event_hub import EventHub
+from services.retention import RetentionWorker
+from services.ip_profiles import IPProfileStore
+from services.heavy_hitters import TopIPTracker
 
 # Routes
 from routes import (
@@ -26,21 +34,45 @@ from routes import (
 from middleware import (
     register_error_handlers,
     setup_logging_middleware,
-    get_logger
+    get_logger,
+    rate_limiter
 )
 
 # Utils
 from utils.fake_data import FakeDataGenerator
+from utils.metrics import register_metrics
+from utils.db_health import DatabaseHealth
+from utils.job_lease import JobLease
+from utils.tool_matcher import tool_matcher
 
 # Get logger
 logger = get_logger()
 
+def shutdown_app(app):
+    """Dừng các worker nền theo thứ tự ngược lúc khởi tạo (ingest queue được flush trước khi đóng MongoClient)"""
+    hooks = app.extensions.pop('shutdown_hooks', [])
+
+    for hook in reversed(hooks):
+        try:
+            hook()
+        except Exception as e:
+            print(f"[WARNING] Loi khi dung {getattr(hook, '__qualname__', hook)}: {str(e)}")
+
+
 def create_app():
-    """Factory function để tạo Flask app"""
+    """Factory function để tạo Flask app
+
+    MongoClient và các thread nền được tạo ở đây: với gunicorn phải gọi trong từng worker sau khi fork (xem wsgi.py).
+    """
 
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    # Hook dừng worker nền, chạy bởi shutdown_app (gunicorn worker_exit hoặc atexit)
+    shutdown_hooks = app.extensions['shutdown_hooks'] = []
+    on_shutdown = shutdown_hooks.append
+    atexit.register(shutdown_app, app)
+
     # Enable CORS
     CORS(app, resources={
         r"/api/*": {
@@ -54,11 +86,30 @@ def create_app():
     setup_logging_middleware(app)
     register_error_handlers(app)
 
+    # Sweeper dọn key rate limit không còn hoạt động
+    rate_limiter.start()
+    register_metrics('rate_limiter', rate_limiter.get_metrics)
+    on_shutdown(rate_limiter.stop)
+
     logger.info("Khoi dong CryptoBeekeeper Honeypot System")
 
     # MongoDB connection
+    mongo_client = None
+    db = None
+    db_health = DatabaseHealth()
+
     try:
-        mongo_client = MongoClient(Config.MONGODB_URI)
+        mongo_client = MongoClient(
+            Config.MONGODB_URI,
+            serverSelectionTimeoutMS=Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=Config.MONGODB_MIN_POOL_SIZE,
+            connectTimeoutMS=Config.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=Config.MONGODB_SOCKET_TIMEOUT_MS or None,
+            waitQueueTimeoutMS=Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS or None
+        )
+        # Đóng client sau cùng, khi các worker nền đã dừng
+        on_shutdown(mongo_client.close)
         db = mongo_client[Config.MONGODB_DB]
 
         # Test connection
@@ -70,7 +121,13 @@ def create_app():
         logger.error(f"[ERROR] Loi ket noi MongoDB: {str(e)}")
         print(f"[ERROR] Loi ket noi MongoDB: {str(e)}")
         print("[WARNING] Dam bao MongoDB dang chay tren localhost:27017")
-        db = None
+        db_health.mark_offline(e)
+
+        # Có spool thì honeypot vẫn chạy, event được ghi xuống đĩa và replay sau
+        if mongo_client is None or not Config.SPOOL_ENABLED:
+            db = None
+        else:
+            print("[WARNING] Honeypot van hoat dong, attack logs duoc ghi vao spool")
 
     # Initialize models and services
     attack_log_model = None
@@ -78,16 +135,164 @@ def create_app():
     attack_logger = None
     web3_service = None
     analyzer = None
+    event_hub = None
+    ip_profiles = None
+    top_ip_tracker = None
 
     if db is not None:
-        attack_log_model = AttackLog(db)
-        wallet_model = Wallet(db)
+        attack_log_model = AttackLog(db, health=db_health, create_indexes=db_health.is_online())
+        wallet_model = Wallet(db, health=db_health, create_indexes=db_health.is_online())
+        register_metrics('database', db_health.get_metrics)
+        if attack_log_model.stats_cache is not None:
+            register_metrics('stats_cache', attack_log_model.stats_cache.get_metrics)
+
+        # Rollup chưa được dựng cho dữ liệu cũ
+        rollups = attack_log_model.rollups
+        if rollups is not None and db_health.is_online() and not rollups.has_data() \
+                and attack_log_model.estimated_count():
+            print("[WARNING] Rollup thong ke trong, chay scripts/rebuild_rollups.py de dung lai tu attack_logs")
+
+        # Log cũ còn trong collection gốc sẽ không được đọc khi đã bật partition
+        register_metrics('partitions', attack_log_model.partitions.get_metrics)
+        if attack_log_model.partitions.enabled and db_health.is_online() \
+                and attack_log_model.collection.estimated_document_count():
+            print("[WARNING] Collection attack_logs con du lieu, chay scripts/partition_attack_logs.py de chuyen sang partition")
+        if attack_log_model.header_sets is not None:
+            register_metrics('header_set_cache', attack_log_model.header_sets.cache.get_metrics)
+
+        # Spool trên đĩa khi MongoDB không ghi được hoặc ingest queue bị đầy
+        if Config.SPOOL_ENABLED:
+            spool = EventSpool(
+                Config.SPOOL_DIR,
+                segment_bytes=Config.SPOOL_SEGMENT_BYTES,
+                fsync_interval=Config.SPOOL_FSYNC_INTERVAL_MS / 1000,
+                fsync_batch=Config.SPOOL_FSYNC_BATCH
+            )
+            attack_log_model.attach_spool(spool)
+
+            spool_replayer = SpoolReplayer(
+                spool,
+                attack_log_model,
+                db_health,
+                ping_fn=lambda: mongo_client.admin.command('ping'),
+                interval=Config.SPOOL_REPLAY_INTERVAL,
+                batch_size=Config.SPOOL_REPLAY_BATCH_SIZE,
+                on_recover=[attack_log_model._create_indexes, wallet_model._create_indexes]
+            )
+            spool_replayer.start()
+            register_metrics('spool', spool_replayer.get_metrics)
+            on_shutdown(spool_replayer.stop)
+
+        # Write-behind ingest queue
+        if Config.ATTACK_LOG_WRITE_MODE == 'async':
+            ingest_queue = IngestQueue(
+                attack_log_model.write_batch,
+                max_size=Config.INGEST_QUEUE_SIZE,
+                batch_size=Config.INGEST_BATCH_SIZE,
+                flush_interval=Config.INGEST_FLUSH_INTERVAL_MS / 1000,
+                overflow_fn=attack_log_model.spill
+            )
+            ingest_queue.start()
+            attack_log_model.attach_writer(ingest_queue)
+            register_metrics('ingest_queue', ingest_queue.get_metrics)
+
+            # Flush queue khi process thoát
+            on_shutdown(ingest_queue.stop)
+            logger.info("[OK] Bat che do ghi log bat dong bo (write-behind)")
 
         # Initialize services
-        attack_logger = AttackLogger(attack_log_model)
+        # Live feed cho dashboard
+        event_hub = EventHub(
+            max_rate=Config.STREAM_MAX_RATE,
+            buffer_size=Config.STREAM_BUFFER_SIZE,
+            max_subscribers=Config.STREAM_MAX_SUBSCRIBERS
+        )
+        event_hub.start()
+        register_metrics('event_hub', event_hub.get_metrics)
+        on_shutdown(event_hub.stop)
+
+        # Profile hành vi theo IP trong bộ nhớ, snapshot định kỳ vào MongoDB
+        if Config.IP_PROFILES_ENABLED:
+            ip_profiles = IPProfileStore(
+                db['ip_profiles'],
+                max_ips=Config.IP_PROFILE_MAX_IPS,
+                window_seconds=Config.IP_PROFILE_WINDOW,
+                hll_precision=Config.IP_PROFILE_HLL_PRECISION,
+                snapshot_interval=Config.IP_PROFILE_SNAPSHOT_INTERVAL,
+                is_online=db_health.is_online
+            )
+            ip_profiles.start()
+            register_metrics('ip_profiles', ip_profiles.get_metrics)
+            on_shutdown(ip_profiles.stop)
+
+        # Top IP thời gian thực (sketch Space-Saving), checkpoint định kỳ vào MongoDB
+        if Config.HEAVY_HITTERS_ENABLED:
+            top_ip_tracker = TopIPTracker(
+                db['heavy_hitters'],
+                capacity=Config.HEAVY_HITTERS_CAPACITY,
+                checkpoint_interval=Config.HEAVY_HITTERS_CHECKPOINT_INTERVAL,
+                is_online=db_health.is_online
+            )
+            top_ip_tracker.start()
+            register_metrics('heavy_hitters', top_ip_tracker.get_metrics)
+            on_shutdown(top_ip_tracker.stop)
+
+        attack_logger = AttackLogger(
+            attack_log_model,
+            event_hub=event_hub,
+            ip_profiles=ip_profiles,
+            top_ips=top_ip_tracker
+        )
+        register_metrics('geo_cache', attack_logger.ip_tracker.get_cache_metrics)
+        register_metrics('rule_engine', attack_logger.rule_engine.get_metrics)
+        register_metrics('tool_cache', tool_matcher.get_metrics)
+        if attack_logger.ip_tracker.geoip_db is not None:
+            register_metrics('geoip', attack_logger.ip_tracker.geoip_db.get_metrics)
         web3_service = Web3Service()
         analyzer = AttackAnalyzer(attack_log_model)
 
+        # Worker enrichment nền (geolocation, tool): chỉ process giữ lease chạy
+        if Config.ENRICHMENT_MODE == 'deferred':
+            enrichment_lease = JobLease(db['job_leases'], 'enrichment', ttl=Config.JOB_LEASE_TTL)
+            enrichment_worker = EnrichmentWorker(
+                attack_log_model,
+                attack_logger.ip_tracker,
+                analyzer,
+                batch_size=Config.ENRICHMENT_BATCH_SIZE,
+                workers=Config.ENRICHMENT_WORKERS,
+                poll_interval=Config.ENRICHMENT_POLL_INTERVAL,
+                backfill=Config.ENRICHMENT_BACKFILL,
+                is_leader=enrichment_lease.is_held,
+                state_collection=db['settings']
+            )
+            enrichment_worker.start()
+            register_metrics('enrichment', enrichment_worker.get_metrics)
+            register_metrics('enrichment_lease', enrichment_lease.get_metrics)
+            # Hook chạy theo thứ tự ngược: worker dừng xong mới trả lease
+            on_shutdown(enrichment_lease.release)
+            on_shutdown(enrichment_worker.stop)
+
+        # Worker xóa log hết hạn theo settings.database.log_retention_days: chỉ process giữ lease chạy
+        if Config.RETENTION_ENABLED:
+            retention_lease = JobLease(db['job_leases'], 'retention', ttl=Config.JOB_LEASE_TTL)
+            retention_worker = RetentionWorker(
+                attack_log_model,
+                db['settings'],
+                batch_size=Config.RETENTION_BATCH_SIZE,
+                batch_interval=Config.RETENTION_BATCH_INTERVAL,
+                max_rate=Config.RETENTION_MAX_RATE,
+                poll_interval=Config.RETENTION_POLL_INTERVAL,
+                window=Config.RETENTION_WINDOW,
+                write_concern=Config.RETENTION_WRITE_CONCERN,
+                is_leader=retention_lease.is_held
+            )
+            retention_worker.start()
+            register_metrics('retention', retention_worker.get_metrics)
+            register_metrics('retention_lease', retention_lease.get_metrics)
+            # Hook chạy theo thứ tự ngược: worker dừng xong mới trả lease
+            on_shutdown(retention_lease.release)
+            on_shutdown(retention_worker.stop)
+
         logger.info("[OK] Da khoi tao models va services")
         print("[OK] Da khoi tao models va services")
     else:
@@ -106,8 +311,8 @@ def create_app():
     # Initialize routes dependencies AFTER
     print("[DEBUG] Initializing route dependencies...")
     init_honeypot_routes(attack_logger, web3_service, wallet_model)
-    init_analytics_routes(attack_log_model, analyzer)
-    init_settings_routes(db)
+    init_analytics_routes(attack_log_model, analyzer, event_hub, ip_profiles, top_ip_tracker)
+    init_settings_routes(db, health=db_health)
 
     logger.info("[OK] Da dang ky tat ca routes")
     print("[OK] Da dang ky tat ca routes")
@@ -135,7 +340,7 @@ def create_app():
     # Health check
     @app.route('/health')
     def health():
-        db_status = 'connected' if db is not None else 'disconnected'
+        db_status = 'connected' if db is not None and db_health.is_online() else 'disconnected'
 
         return jsonify({
             'status': 'healthy',
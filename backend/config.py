@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,15 +11,165 @@ class Config:
     FLASK_APP = os.getenv('FLASK_APP', 'app.py')
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
     FLASK_PORT = int(os.getenv('FLASK_PORT', 5000))
+
+    # Gunicorn (production, xem gunicorn.conf.py)
+    GUNICORN_BIND = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('FLASK_PORT', 5000)}")
+    GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 2))
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 8))
+    GUNICORN_TIMEOUT = int(os.getenv('GUNICORN_TIMEOUT', 30))
+    GUNICORN_GRACEFUL_TIMEOUT = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 
     # MongoDB config
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
     MONGODB_DB = os.getenv('MONGODB_DB', 'cryptobeekeeper')
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 3000))
+    # Connection pool của mỗi process (mỗi gunicorn worker có pool riêng); timeout = 0 là không giới hạn
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+    MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 0))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 0))
 
     # Ethereum Testnet
     ETHEREUM_TESTNET_URL = os.getenv('ETHEREUM_TESTNET_URL', '')
 
+    # Ingest: 'async' = write-behind queue + insert_many, 'sync' = insert_one mỗi request
+    ATTACK_LOG_WRITE_MODE = os.getenv('ATTACK_LOG_WRITE_MODE', 'async')
+    INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 10000))
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 500))
+    INGEST_FLUSH_INTERVAL_MS = int(os.getenv('INGEST_FLUSH_INTERVAL_MS', 200))
+
+    # Spool trên đĩa (append-only) khi MongoDB không khả dụng hoặc ingest queue đầy
+    SPOOL_ENABLED = os.getenv('SPOOL_ENABLED', 'true').lower() == 'true'
+    SPOOL_DIR = os.getenv('SPOOL_DIR', 'spool')
+    SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', 16 * 1024 * 1024))
+    SPOOL_FSYNC_INTERVAL_MS = int(os.getenv('SPOOL_FSYNC_INTERVAL_MS', 50))
+    SPOOL_FSYNC_BATCH = int(os.getenv('SPOOL_FSYNC_BATCH', 256))
+    SPOOL_REPLAY_INTERVAL = int(os.getenv('SPOOL_REPLAY_INTERVAL', 5))
+    SPOOL_REPLAY_BATCH_SIZE = int(os.getenv('SPOOL_REPLAY_BATCH_SIZE', 1000))
+
+    # Rule engine phân loại tấn công
+    RULES_PATH = os.getenv(
+        'RULES_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'attack_rules.json')
+    )
+    # true: loại tấn công theo rule ghi đè attack_type do route truyền vào
+    RULES_OVERRIDE_ROUTE_TYPE = os.getenv('RULES_OVERRIDE_ROUTE_TYPE', 'false').lower() == 'true'
+
+    # Chia attack_logs theo thời gian: none (một collection) | month | week
+    ATTACK_LOG_PARTITION = os.getenv('ATTACK_LOG_PARTITION', 'none')
+
+    # Profile hành vi theo IP trong bộ nhớ (cập nhật lúc ingest)
+    IP_PROFILES_ENABLED = os.getenv('IP_PROFILES_ENABLED', 'true').lower() == 'true'
+    IP_PROFILE_MAX_IPS = int(os.getenv('IP_PROFILE_MAX_IPS', 10000))
+    IP_PROFILE_WINDOW = int(os.getenv('IP_PROFILE_WINDOW', 3600))  # giây
+    IP_PROFILE_HLL_PRECISION = int(os.getenv('IP_PROFILE_HLL_PRECISION', 10))
+    IP_PROFILE_SNAPSHOT_INTERVAL = float(os.getenv('IP_PROFILE_SNAPSHOT_INTERVAL', 60))
+
+    # Top IP thời gian thực bằng sketch Space-Saving (giờ qua, ngày qua, toàn thời gian)
+    HEAVY_HITTERS_ENABLED = os.getenv('HEAVY_HITTERS_ENABLED', 'true').lower() == 'true'
+    HEAVY_HITTERS_CAPACITY = int(os.getenv('HEAVY_HITTERS_CAPACITY', 1000))
+    HEAVY_HITTERS_CHECKPOINT_INTERVAL = float(os.getenv('HEAVY_HITTERS_CHECKPOINT_INTERVAL', 60))
+
+    # Rate limiter (sliding window counter, khóa chia shard)
+    # memory: riêng từng process | shared: bảng mmap dùng chung giữa các worker trên cùng host
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_SHARED_PATH = os.getenv('RATE_LIMIT_SHARED_PATH') or os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+        'cryptobeekeeper_ratelimit'
+    )
+    RATE_LIMIT_SHARED_SLOTS = int(os.getenv('RATE_LIMIT_SHARED_SLOTS', 65536))
+    RATE_LIMIT_SHARDS = int(os.getenv('RATE_LIMIT_SHARDS', 64))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 200000))
+    RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv('RATE_LIMIT_SWEEP_INTERVAL', 30))
+
+    # Worker xóa log hết hạn theo settings.database.log_retention_days
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'true').lower() == 'true'
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 1000))
+    RETENTION_BATCH_INTERVAL = float(os.getenv('RETENTION_BATCH_INTERVAL', 0.5))
+    RETENTION_MAX_RATE = int(os.getenv('RETENTION_MAX_RATE', 2000))  # log/giây, 0 = không giới hạn
+    RETENTION_POLL_INTERVAL = float(os.getenv('RETENTION_POLL_INTERVAL', 300))
+    RETENTION_WINDOW = os.getenv('RETENTION_WINDOW', '')  # UTC, vd. 02:00-05:00; rỗng = mọi lúc
+    RETENTION_WRITE_CONCERN = os.getenv('RETENTION_WRITE_CONCERN', 'majority')
+
+    # Lease (giây) để chỉ một process chạy enrichment/retention khi có nhiều gunicorn worker
+    JOB_LEASE_TTL = int(os.getenv('JOB_LEASE_TTL', 30))
+
+    # Rollup thống kê (bucket phút/giờ/ngày) cập nhật lúc ingest cho dashboard
+    ROLLUPS_ENABLED = os.getenv('ROLLUPS_ENABLED', 'true').lower() == 'true'
+    ROLLUP_MINUTE_TTL_HOURS = int(os.getenv('ROLLUP_MINUTE_TTL_HOURS', 48))
+    ROLLUP_HOUR_TTL_DAYS = int(os.getenv('ROLLUP_HOUR_TTL_DAYS', 30))
+    # Count IP theo ngày: giữ top N IP mỗi ngày, hết hạn sau IP_TTL_DAYS ngày (/top-ips tính trong khoảng này)
+    ROLLUP_IP_TOP_N = int(os.getenv('ROLLUP_IP_TOP_N', 1000))
+    ROLLUP_IP_TTL_DAYS = int(os.getenv('ROLLUP_IP_TTL_DAYS', 30))
+    # Precision HLL đếm IP phân biệt theo ngày (2^p register, sai số ~1.04/sqrt(2^p))
+    UNIQUE_HLL_PRECISION = int(os.getenv('UNIQUE_HLL_PRECISION', 10))
+    # Số endpoint/attack type phân biệt tối đa mỗi ngày có HLL riêng, phần còn lại gộp vào '__other__'
+    UNIQUE_MAX_KEYS_PER_DAY = int(os.getenv('UNIQUE_MAX_KEYS_PER_DAY', 1000))
+
+    # Cache kết quả analytics: TTL theo loại, có event mới thì kết quả cũ chỉ dùng thêm tối đa MAX_STALENESS giây
+    STATS_CACHE_ENABLED = os.getenv('STATS_CACHE_ENABLED', 'true').lower() == 'true'
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 30))
+    STATS_CACHE_TIMELINE_TTL = float(os.getenv('STATS_CACHE_TIMELINE_TTL', 300))
+    STATS_CACHE_MAX_STALENESS = float(os.getenv('STATS_CACHE_MAX_STALENESS', 2))
+    # memory: version ghi riêng từng process (max_staleness chỉ đúng trong một worker)
+    # shared: version trên bảng mmap dùng chung giữa các worker cùng host
+    STATS_CACHE_BACKEND = os.getenv('STATS_CACHE_BACKEND', 'shared')
+    STATS_CACHE_SHARED_PATH = os.getenv('STATS_CACHE_SHARED_PATH') or os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+        'cryptobeekeeper_stats_version'
+    )
+
+    # Live feed SSE cho dashboard: số frame tối đa mỗi giây, buffer frame mỗi client, số client mỗi process.
+    # Với gthread mỗi kết nối SSE giữ một thread: gunicorn.conf.py dùng ít nhất 2 x STREAM_MAX_SUBSCRIBERS thread
+    STREAM_MAX_RATE = float(os.getenv('STREAM_MAX_RATE', 2))
+    STREAM_BUFFER_SIZE = int(os.getenv('STREAM_BUFFER_SIZE', 32))
+    STREAM_MAX_SUBSCRIBERS = int(os.getenv('STREAM_MAX_SUBSCRIBERS', 16))
+    STREAM_KEEPALIVE = int(os.getenv('STREAM_KEEPALIVE', 15))
+    STREAM_RETRY_MS = int(os.getenv('STREAM_RETRY_MS', 3000))
+
+    # Export: số document mỗi lần getMore của cursor, kích thước chunk gửi về client
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 2000))
+    EXPORT_CHUNK_BYTES = int(os.getenv('EXPORT_CHUNK_BYTES', 65536))
+
+    # Số dòng mỗi record batch (row group với parquet) khi export parquet/arrow
+    EXPORT_RECORD_BATCH_ROWS = int(os.getenv('EXPORT_RECORD_BATCH_ROWS', 65536))
+
+    # Số User-Agent được memo kết quả nhận diện công cụ
+    TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', 4096))
+
+    # GeoIP: 'auto' = file offline nếu có, ngược lại ip-api.com; 'local' | 'remote'
+    GEOIP_PROVIDER = os.getenv('GEOIP_PROVIDER', 'auto')
+    GEOIP_DATABASE_PATH = os.getenv('GEOIP_DATABASE_PATH', 'data/geoip.csv')
+    GEOIP_RELOAD_INTERVAL = int(os.getenv('GEOIP_RELOAD_INTERVAL', 30))
+
+    # Cache geolocation theo IP (giây)
+    GEO_CACHE_SIZE = int(os.getenv('GEO_CACHE_SIZE', 50000))
+    GEO_CACHE_TTL = int(os.getenv('GEO_CACHE_TTL', 86400))
+    GEO_CACHE_NEGATIVE_TTL = int(os.getenv('GEO_CACHE_NEGATIVE_TTL', 300))
+
+    # Enrichment: 'deferred' = lưu event trước, worker nền bổ sung geolocation/tool; 'inline'
+    ENRICHMENT_MODE = os.getenv('ENRICHMENT_MODE', 'deferred')
+    ENRICHMENT_BATCH_SIZE = int(os.getenv('ENRICHMENT_BATCH_SIZE', 500))
+    ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', 4))
+    ENRICHMENT_POLL_INTERVAL = float(os.getenv('ENRICHMENT_POLL_INTERVAL', 1.0))
+    ENRICHMENT_BACKFILL = os.getenv('ENRICHMENT_BACKFILL', 'true').lower() == 'true'
+
+    # Lưu header set một lần (collection header_sets), attack log chỉ giữ fingerprint
+    HEADER_DEDUP = os.getenv('HEADER_DEDUP', 'true').lower() == 'true'
+    HEADER_SET_CACHE_SIZE = int(os.getenv('HEADER_SET_CACHE_SIZE', 10000))
+
+    # Giới hạn dữ liệu request được lưu (bytes / số phần tử)
+    CAPTURE_MAX_BODY_BYTES = int(os.getenv('CAPTURE_MAX_BODY_BYTES', 65536))
+    CAPTURE_MAX_DEPTH = int(os.getenv('CAPTURE_MAX_DEPTH', 8))
+    CAPTURE_MAX_KEYS = int(os.getenv('CAPTURE_MAX_KEYS', 100))
+    CAPTURE_MAX_NODES = int(os.getenv('CAPTURE_MAX_NODES', 2000))
+    CAPTURE_MAX_STRING = int(os.getenv('CAPTURE_MAX_STRING', 4096))
+    CAPTURE_MAX_HEADERS = int(os.getenv('CAPTURE_MAX_HEADERS', 64))
+    CAPTURE_MAX_HEADER_BYTES = int(os.getenv('CAPTURE_MAX_HEADER_BYTES', 4096))
+    CAPTURE_MAX_QUERY_PARAMS = int(os.getenv('CAPTURE_MAX_QUERY_PARAMS', 64))
+
     # Log retention (days)
     LOG_RETENTION_DAYS = 90
 
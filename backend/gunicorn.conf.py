@@ -0,0 +1,46 @@
+"""
+Cấu hình gunicorn cho production
+
+    cd backend && gunicorn -c gunicorn.conf.py wsgi:application
+
+Mỗi worker có MongoClient, ingest queue, event hub, profile IP và sketch riêng (trong bộ nhớ process).
+Live feed SSE chỉ thấy event do worker đang giữ kết nối ghi nhận, số liệu dashboard vẫn đọc từ MongoDB.
+Sketch top IP checkpoint riêng theo worker (hostname:pid), top-k gộp checkpoint của các worker còn sống.
+Enrichment và retention chỉ chạy ở worker giữ lease (collection job_leases, JOB_LEASE_TTL),
+spool replay chia segment giữa các worker bằng rename nguyên tử.
+Dùng RATE_LIMIT_BACKEND=shared để các worker chung một bảng rate limit.
+Cách đo throughput và kết quả so với dev server: docstring của scripts/benchmark_serving.py.
+"""
+from config import Config
+
+bind = Config.GUNICORN_BIND
+workers = Config.GUNICORN_WORKERS
+
+# gthread: SSE /api/analytics/stream giữ một thread suốt kết nối. Mỗi worker nhận tối đa
+# STREAM_MAX_SUBSCRIBERS kết nối SSE (client vượt nhận 503, dashboard chuyển sang polling) và có
+# ít nhất 2 x STREAM_MAX_SUBSCRIBERS thread để SSE chiếm không quá một nửa, phần còn lại phục vụ API
+worker_class = 'gthread'
+threads = max(Config.GUNICORN_THREADS, 2 * Config.STREAM_MAX_SUBSCRIBERS)
+
+timeout = Config.GUNICORN_TIMEOUT
+graceful_timeout = Config.GUNICORN_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Import code một lần ở master, app được tạo trong post_fork
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
+    server.log.info(f"Worker {worker.pid}: da khoi tao app va MongoClient")
+
+
+def worker_exit(server, worker):
+    # SIGTERM/SIGINT: flush ingest queue và dừng thread nền trước khi process thoát
+    import wsgi
+    wsgi.shutdown_worker()
+    server.log.info(f"Worker {worker.pid}: da flush ingest queue va dong MongoClient")
@@ -1,60 +1,214 @@
 from flask import request, jsonify
-from datetime import datetime, timedelta
-from collections import defaultdict
 import threading
+import time
+from config import Config
+from utils.client_ip import get_client_ip
+from utils.shared_table import SharedCounterTable
 
-class SimpleRateLimiter:
-    """Simple in-memory rate limiter"""
 
-    def __init__(self):
-        self.requests = defaultdict(list)
-        self.lock = threading.Lock()
+class SlidingWindowRateLimiter:
+    """In-memory sliding-window-counter rate limiter
 
-    def is_allowed(self, ip_address, max_requests=100, window_seconds=60):
+    Each key holds fixed-size state [window index, current count, previous count]; the
+    request rate is estimated as previous * (remaining fraction of window) + current.
+    Keys are spread over sharded locks and idle keys are dropped by a background sweeper.
+    """
+
+    def __init__(self, shards=64, max_keys=200000, sweep_interval=30):
+        self.shard_count = shards
+        self.max_keys_per_shard = max(1, max_keys // shards)
+        self.sweep_interval = sweep_interval
+
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.swept = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='rate-limit-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_allowed(self, ip_address, max_requests=100, window_seconds=60, now=None):
         """Check if request is allowed"""
-        with self.lock:
-            now = datetime.utcnow()
-            cutoff = now - timedelta(seconds=window_seconds)
-
-            # Clean old requests
-            self.requests[ip_address] = [
-                req_time for req_time in self.requests[ip_address]
-                if req_time > cutoff
-            ]
-
-            # Check limit
-            if len(self.requests[ip_address]) >= max_requests:
+        now = time.time() if now is None else now
+        window = int(now // window_seconds)
+        key = (ip_address, window_seconds)
+        index = hash(key) % self.shard_count
+        shard = self._shards[index]
+
+        with self._locks[index]:
+            state = shard.get(key)
+
+            if state is None:
+                # Shard full: drop the oldest inserted key
+                if len(shard) >= self.max_keys_per_shard:
+                    del shard[next(iter(shard))]
+                    self.evicted += 1
+                state = shard[key] = [window, 0, 0]
+            elif state[0] != window:
+                # Roll over: the current window becomes the previous one (or both reset after a gap)
+                state[2] = state[1] if state[0] == window - 1 else 0
+                state[1] = 0
+                state[0] = window
+
+            elapsed = (now % window_seconds) / window_seconds
+            if state[2] * (1 - elapsed) + state[1] >= max_requests:
+                self.rejected += 1
                 return False
 
-            # Add current request
-            self.requests[ip_address].append(now)
+            state[1] += 1
+            self.allowed += 1
             return True
 
-    def cleanup(self):
-        """Clean up old data"""
-        with self.lock:
-            now = datetime.utcnow()
-            cutoff = now - timedelta(minutes=5)
+    def _run(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            self.cleanup()
+
+    def cleanup(self, now=None):
+        """Drop keys idle for more than a full window (their estimate is already zero)"""
+        now = time.time() if now is None else now
+        removed = 0
 
-            for ip in list(self.requests.keys()):
-                self.requests[ip] = [
-                    req_time for req_time in self.requests[ip]
-                    if req_time > cutoff
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                idle = [
+                    key for key, state in shard.items()
+                    if state[0] < int(now // key[1]) - 1
                 ]
+                for key in idle:
+                    del shard[key]
+            removed += len(idle)
+
+        self.swept += removed
+        return removed
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def get_metrics(self):
+        return {
+            'backend': 'memory',
+            'keys': len(self),
+            'max_keys': self.max_keys_per_shard * self.shard_count,
+            'shards': self.shard_count,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+            'swept': self.swept,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+class SharedRateLimiter:
+    """Sliding-window-counter rate limiter backed by a memory-mapped table shared by all worker processes on the host"""
+
+    def __init__(self, path, slots=65536, sweep_interval=30):
+        self.table = SharedCounterTable(path, slots=slots)
+        self.sweep_interval = sweep_interval
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Counters (this process only)
+        self.allowed = 0
+        self.rejected = 0
+        self.swept = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='rate-limit-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_allowed(self, ip_address, max_requests=100, window_seconds=60, now=None):
+        """Check if request is allowed"""
+        now = time.time() if now is None else now
+
+        if self.table.hit(ip_address, max_requests, window_seconds, now):
+            self.allowed += 1
+            return True
 
-                if not self.requests[ip]:
-                    del self.requests[ip]
+        self.rejected += 1
+        return False
+
+    def _run(self):
+        while not self._stop_event.wait(self.sweep_interval):
+            self.cleanup()
+
+    def cleanup(self, now=None):
+        """Drop keys idle for more than a full window"""
+        removed = self.table.sweep(time.time() if now is None else now)
+        self.swept += removed
+        return removed
+
+    def get_metrics(self):
+        return {
+            'backend': 'shared',
+            'path': self.table.path,
+            'slots': self.table.slots,
+            'inserts': self.table.inserts,
+            'evictions': self.table.evictions,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'swept': self.swept,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
+
+
+def create_rate_limiter():
+    """Build the limiter selected by RATE_LIMIT_BACKEND (memory | shared)"""
+    if Config.RATE_LIMIT_BACKEND == 'shared':
+        try:
+            return SharedRateLimiter(
+                Config.RATE_LIMIT_SHARED_PATH,
+                slots=Config.RATE_LIMIT_SHARED_SLOTS,
+                sweep_interval=Config.RATE_LIMIT_SWEEP_INTERVAL
+            )
+        except (RuntimeError, OSError) as e:
+            print(f"[WARNING] Khong mo duoc shared rate limit table, dung bo nho rieng tung process: {str(e)}")
+
+    return SlidingWindowRateLimiter(
+        shards=Config.RATE_LIMIT_SHARDS,
+        max_keys=Config.RATE_LIMIT_MAX_KEYS,
+        sweep_interval=Config.RATE_LIMIT_SWEEP_INTERVAL
+    )
 
 
 # Global rate limiter instance
-rate_limiter = SimpleRateLimiter()
+rate_limiter = create_rate_limiter()
 
 
 def apply_rate_limit(max_requests=100, window_seconds=60):
     """Decorator for rate limiting"""
     def decorator(f):
         def wrapped(*args, **kwargs):
-            ip = request.remote_addr
+            ip = get_client_ip(request)
 
             if not rate_limiter.is_allowed(ip, max_requests, window_seconds):
                 return jsonify({
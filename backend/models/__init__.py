@@ -1,4 +1,5 @@
 from .attack_log import AttackLog
 from .wallet import Wallet
+from .header_set import HeaderSet
 
-__all__ = ['AttackLog', 'Wallet']
+__all__ = ['AttackLog', 'Wallet', 'HeaderSet']
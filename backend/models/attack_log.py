@@ -1,23 +1,125 @@
-from datetime import datetime
+import heapq
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, ConnectionFailure
 from config import Config
+from models.header_set import HeaderSet
+from models.attack_rollup import AttackRollup
+from models.partition import PartitionScheme
+from utils.cache import ResultCache
+from utils.shared_table import SharedCounterTable
+from utils.pagination import encode_cursor, decode_cursor, keyset_condition
+
+# Mã lỗi MongoDB khi trùng _id (replay lại event đã ghi)
+DUPLICATE_KEY_ERROR = 11000
+
+# Header set chưa có trong database đi kèm event tới lúc ghi lô (không lưu vào attack_logs)
+PENDING_HEADERS_FIELD = '_pending_headers'
+
+# Các field được phép chọn qua `fields=` và các field của view summary (bảng log)
+LOG_FIELDS = (
+    'timestamp', 'ip_address', 'method', 'endpoint', 'headers', 'payload', 'query_params',
+    'response_status', 'attack_type', 'attack_types', 'rule_ids', 'user_agent', 'geolocation',
+    'tool', 'capture', 'enriched_at'
+)
+SUMMARY_FIELDS = ('timestamp', 'ip_address', 'method', 'endpoint', 'attack_type', 'tool', 'geolocation.country')
+
+# Số endpoint tối đa trả về khi phân tích một IP
+IP_ENDPOINT_LIMIT = 1000
+
+EPOCH = datetime(1970, 1, 1)
+
+# Field cần để trừ một log khỏi rollup
+ROLLUP_PROJECTION = {'timestamp': 1, 'attack_type': 1, 'endpoint': 1, 'ip_address': 1, 'geolocation.country': 1}
+
+
+def _naive_utc(value):
+    """Chuẩn hóa datetime có timezone về UTC naive (như timestamp lưu trong MongoDB)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
 
 class AttackLog:
     """Model cho attack log"""
 
-    def __init__(self, db):
+    def __init__(self, db, health=None, create_indexes=True):
+        # Collection gốc; khi bật partition, log được ghi vào attack_logs_YYYYMM / attack_logs_YYYYwWW
         self.collection = db['attack_logs']
-        self._create_indexes()
+        self.partitions = PartitionScheme(
+            db,
+            base='attack_logs',
+            granularity=Config.ATTACK_LOG_PARTITION,
+            on_create=self._create_collection_indexes
+        )
+        self.writer = None
+        self.spool = None
+        self.health = health
+        self.header_sets = HeaderSet(db, cache_size=Config.HEADER_SET_CACHE_SIZE) if Config.HEADER_DEDUP else None
+
+        # Rollup thống kê cập nhật lúc ingest (dashboard không phải quét attack_logs)
+        self.rollups = None
+        if Config.ROLLUPS_ENABLED:
+            self.rollups = AttackRollup(
+                db,
+                minute_ttl=Config.ROLLUP_MINUTE_TTL_HOURS * 3600,
+                hour_ttl=Config.ROLLUP_HOUR_TTL_DAYS * 86400,
+                ip_top_n=Config.ROLLUP_IP_TOP_N,
+                ip_ttl=Config.ROLLUP_IP_TTL_DAYS * 86400,
+                hll_precision=Config.UNIQUE_HLL_PRECISION,
+                unique_max_keys=Config.UNIQUE_MAX_KEYS_PER_DAY,
+                create_indexes=create_indexes
+            )
+
+        # Cache kết quả thống kê, vô hiệu khi có event mới
+        self.stats_cache = None
+        if Config.STATS_CACHE_ENABLED:
+            self.stats_cache = ResultCache(
+                ttl=Config.STATS_CACHE_TTL,
+                max_staleness=Config.STATS_CACHE_MAX_STALENESS,
+                shared_version=self._open_shared_version()
+            )
+
+        # Khi khởi động lúc MongoDB down, indexes được tạo sau khi kết nối lại
+        if create_indexes:
+            self._create_indexes()
 
     def _create_indexes(self):
         """Tạo indexes cho query nhanh"""
-        self.collection.create_index('timestamp')
-        self.collection.create_index('ip_address')
-        self.collection.create_index('attack_type')
+        for collection in self.partitions.collections_for():
+            self._create_collection_indexes(collection)
+
+        if self.rollups is not None:
+            self.rollups._create_indexes()
+
+    @staticmethod
+    def _create_collection_indexes(collection):
+        """Indexes của một collection log (mỗi partition có bộ index riêng, nhỏ)"""
+        collection.create_index('timestamp')
+        collection.create_index([('timestamp', -1), ('_id', -1)])
+        collection.create_index([('attack_type', 1), ('timestamp', -1), ('_id', -1)])
+        collection.create_index([('ip_address', 1), ('timestamp', -1), ('_id', -1)])
+        collection.create_index('ip_address')
+        collection.create_index('attack_type')
+        collection.create_index('enrichment_pending', sparse=True)
+        collection.create_index('tool')
+
+    def attach_writer(self, writer):
+        """Bật chế độ write-behind: create() đẩy event vào queue thay vì insert_one"""
+        self.writer = writer
+
+    def attach_spool(self, spool):
+        """Bật spool trên đĩa cho event không ghi được vào MongoDB"""
+        self.spool = spool
+
+    def is_online(self):
+        return self.health is None or self.health.is_online()
 
     def create(self, data):
         """Tạo attack log mới"""
         log_entry = {
+            '_id': ObjectId(),
             'timestamp': datetime.utcnow(),
             'ip_address': data.get('ip_address'),
             'method': data.get('method'),
@@ -31,11 +133,437 @@ class AttackLog:
             'geolocation': data.get('geolocation', {}),
         }
 
-        result = self.collection.insert_one(log_entry)
-        return str(result.inserted_id)
+        # Công cụ tấn công nhận diện từ User-Agent
+        if data.get('tool'):
+            log_entry['tool'] = data['tool']
+
+        # Kết quả rule engine
+        if data.get('rule_ids'):
+            log_entry['attack_types'] = data.get('attack_types', [])
+            log_entry['rule_ids'] = data['rule_ids']
+
+        # Metadata khi payload/headers bị cắt theo capture policy
+        if data.get('capture'):
+            log_entry['capture'] = data['capture']
+
+        # Header set lưu một lần ở collection header_sets, log chỉ giữ fingerprint.
+        # Request chỉ tính fingerprint; header set mới được upsert cùng lô ở insert_many
+        if self.header_sets is not None and log_entry['headers']:
+            headers = log_entry.pop('headers')
+            log_entry['header_fp'] = self.header_sets.fingerprint(headers)
+            if not self.header_sets.is_known(log_entry['header_fp']):
+                log_entry[PENDING_HEADERS_FIELD] = headers
+
+            # user_agent trùng với header User-Agent thì bỏ, khi đọc sẽ khôi phục lại
+            if log_entry['user_agent'] == headers.get('User-Agent', 'Unknown'):
+                del log_entry['user_agent']
+
+        # Event chờ worker nền bổ sung geolocation/tool
+        if data.get('enrichment_pending'):
+            log_entry['enrichment_pending'] = True
+
+        # _id sinh phía client để trả về ngay cả khi ghi bất đồng bộ
+        if self.writer is not None:
+            self.writer.enqueue(log_entry)
+        else:
+            self.write_batch([log_entry])
+
+        return str(log_entry['_id'])
+
+    def write_batch(self, log_entries):
+        """Ghi một lô event; chuyển sang spool khi MongoDB không khả dụng
+
+        Có spool thì lô không bao giờ bị bỏ: event MongoDB từ chối (lỗi dữ liệu) vào file dead-letter,
+        lỗi khác của cả lô (write concern timeout, lỗi header set...) thì cả lô vào spool để replay
+        (replay bỏ qua event trùng _id đã ghi được).
+        """
+        if self.spool is None:
+            return self.insert_many(log_entries)
+
+        if not self.is_online():
+            self.spool.append(log_entries)
+            return 0
+
+        rejected = []
+        try:
+            written = self.insert_many(log_entries, rejected=rejected)
+        except ConnectionFailure as e:
+            if self.health is not None:
+                self.health.mark_offline(e)
+            self.spool.append(log_entries)
+            return 0
+        except Exception as e:
+            print(f"[WARNING] Loi ghi lo {len(log_entries)} attack logs, chuyen vao spool: {str(e)}")
+            self.spool.append(log_entries)
+            return 0
+
+        if rejected:
+            print(f"[WARNING] MongoDB tu choi {len(rejected)} attack logs, ghi vao dead-letter")
+            self.spool.reject(rejected)
+
+        return written
+
+    def spill(self, log_entries):
+        """Ghi event vào spool (ingest queue bị đầy), fallback ghi trực tiếp nếu không có spool"""
+        if self.spool is not None:
+            self.spool.append(log_entries)
+            return 0
+
+        return self.insert_many(log_entries)
+
+    def insert_many(self, log_entries, rejected=None):
+        """Ghi một lô attack logs (dùng bởi ingest queue)
+
+        Event bị MongoDB từ chối (lỗi khác trùng _id) được thêm vào `rejected` nếu có truyền,
+        ngược lại lỗi được raise sau khi đã cộng rollup cho phần ghi được.
+        """
+        if not log_entries:
+            return 0
+
+        # Header set phải có trong database trước khi log tham chiếu tới nó
+        self._store_header_sets(log_entries)
+
+        # Route theo timestamp: mỗi partition một lần insert_many
+        groups = {}
+        for entry in log_entries:
+            groups.setdefault(self.partitions.name_for(entry['timestamp']), []).append(entry)
+
+        inserted = []
+        failures = []
+        for entries in groups.values():
+            written, failed, error = self._insert_partition(entries)
+            inserted.extend(written)
+            if failed:
+                failures.append((failed, error))
+
+        # Chỉ cộng rollup cho event thực sự được ghi (replay không đếm trùng)
+        self._record_rollups(inserted)
+        self._notify_write(len(inserted))
+
+        if failures:
+            if rejected is None:
+                raise failures[0][1]
+            for failed, _ in failures:
+                rejected.extend(failed)
+
+        return len(inserted)
+
+    def _store_header_sets(self, log_entries):
+        """Upsert header set mới của lô bằng một bulk_write, sau đó bỏ field tạm khỏi event"""
+        pending = {}
+        for entry in log_entries:
+            headers = entry.get(PENDING_HEADERS_FIELD)
+            if headers is not None:
+                pending[entry['header_fp']] = headers
+
+        if not pending:
+            return
+
+        if self.header_sets is not None:
+            # Lỗi ở đây giữ nguyên field tạm để lô được spool cùng headers
+            self.header_sets.store_many(pending)
+
+        for entry in log_entries:
+            headers = entry.pop(PENDING_HEADERS_FIELD, None)
+            if headers is not None and self.header_sets is None:
+                # Event spool từ lúc HEADER_DEDUP còn bật: lưu headers inline
+                entry['headers'] = headers
+                del entry['header_fp']
+                entry.setdefault('user_agent', headers.get('User-Agent', 'Unknown'))
+
+    def _insert_partition(self, log_entries):
+        """insert_many vào partition của lô
+
+        Trả về (event thực sự được ghi, event bị từ chối, lỗi); event trùng _id được bỏ qua
+        để replay idempotent.
+        """
+        collection = self.partitions.collection_for_write(log_entries[0]['timestamp'])
+
+        try:
+            collection.insert_many(log_entries, ordered=False)
+            return log_entries, [], None
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            skipped = {error.get('index') for error in errors}
+            failed = {error.get('index') for error in errors if error.get('code') != DUPLICATE_KEY_ERROR}
+
+            written = [entry for index, entry in enumerate(log_entries) if index not in skipped]
+            return written, [log_entries[index] for index in sorted(failed)], e
+
+    @staticmethod
+    def _open_shared_version():
+        """Bảng mmap giữ version ghi chung cho stats cache của mọi worker trên host"""
+        if Config.STATS_CACHE_BACKEND != 'shared':
+            return None
+        try:
+            return SharedCounterTable(Config.STATS_CACHE_SHARED_PATH, slots=8, ways=8, lock_stripes=1)
+        except (RuntimeError, OSError) as e:
+            print(f"[WARNING] Khong mo duoc shared stats cache version, dung version rieng tung process: {str(e)}")
+            return None
+
+    def _notify_write(self, count):
+        if self.stats_cache is not None and count:
+            self.stats_cache.notify_write(count)
+
+    def cached(self, key, fn, ttl=None):
+        """Lấy kết quả thống kê qua stats cache (nếu bật)"""
+        if self.stats_cache is None:
+            return fn()
+        return self.stats_cache.get_or_compute(key, fn, ttl=ttl)
+
+    def _record_rollups(self, log_entries, sign=1):
+        if self.rollups is None or not log_entries:
+            return
+
+        try:
+            self.rollups.record(log_entries, sign=sign)
+        except Exception as e:
+            # Rollup lệch có thể dựng lại bằng scripts/rebuild_rollups.py
+            print(f"[WARNING] Khong cap nhat duoc rollup: {str(e)}")
+
+    def find_pending_enrichment(self, limit=500):
+        """Lấy các event đang chờ enrichment"""
+        events = []
+
+        # Event pending gần như luôn nằm ở partition mới nhất
+        for collection in self.partitions.collections_for():
+            events.extend(collection.find(
+                {'enrichment_pending': True},
+                {'ip_address': 1, 'user_agent': 1, 'header_fp': 1, 'tool': 1, 'timestamp': 1, 'geolocation.country': 1}
+            ).limit(limit - len(events)))
+
+            if len(events) >= limit:
+                break
+
+        return self._rehydrate_headers(events)
+
+    def count_pending_enrichment(self):
+        return sum(
+            collection.count_documents({'enrichment_pending': True})
+            for collection in self.partitions.collections_for()
+        )
+
+    def find_unenriched(self, after_id=None, limit=500):
+        """Lấy log lịch sử chưa có geolocation hoặc tool (theo _id tăng dần để resume)"""
+        query = {
+            'enrichment_pending': {'$exists': False},
+            '$or': [
+                {'geolocation.country': 'Unknown', 'enriched_at': {'$exists': False}},
+                {'tool': {'$exists': False}}
+            ]
+        }
+        start = None
+        if after_id is not None:
+            query['_id'] = {'$gt': after_id}
+            start = _naive_utc(after_id.generation_time)
+
+        events = []
+        for collection in self.partitions.collections_for(start=start, newest_first=False):
+            events.extend(collection.find(
+                query,
+                {'ip_address': 1, 'user_agent': 1, 'header_fp': 1, 'tool': 1, 'timestamp': 1, 'geolocation.country': 1}
+            ).sort('_id', 1).limit(limit - len(events)))
+
+            if len(events) >= limit:
+                break
+
+        return self._rehydrate_headers(events)
+
+    def _rehydrate_headers(self, logs):
+        """Khôi phục headers và user_agent cho các log chỉ lưu header_fp"""
+        if self.header_sets is None:
+            return logs
+
+        fingerprints = [log['header_fp'] for log in logs if log.get('header_fp')]
+        if not fingerprints:
+            return logs
+
+        header_map = self.header_sets.get_many(fingerprints)
+
+        for log in logs:
+            fp = log.pop('header_fp', None)
+            if fp is None:
+                continue
+
+            headers = header_map.get(fp, {})
+            log['headers'] = headers
+            log.setdefault('user_agent', headers.get('User-Agent', 'Unknown'))
+
+        return logs
+
+    def apply_enrichment(self, operations, country_changes=None, time_range=None):
+        """Ghi kết quả enrichment bằng bulk_write
+
+        country_changes = [(timestamp, cũ, mới)] cho rollup; time_range = (min, max) timestamp của lô để chọn partition
+        """
+        if not operations:
+            return 0
+
+        start, end = time_range or (None, None)
+        modified = 0
+        for collection in self.partitions.collections_for(start, end):
+            modified += collection.bulk_write(operations, ordered=False).modified_count
+        self._notify_write(modified)
+
+        if self.rollups is not None and country_changes:
+            try:
+                self.rollups.move_countries(country_changes)
+            except Exception as e:
+                print(f"[WARNING] Khong cap nhat duoc rollup country: {str(e)}")
+
+        return modified
+
+    def get_all(self, limit=100, skip=0, filters=None, after=None, before=None, total='exact', projection=None):
+        """Lấy logs với filter; phân trang theo cursor (after/before) hoặc offset (skip)
+
+        total: 'exact' (count_documents), 'estimated' (rollup / estimated_document_count) hoặc 'none'
+        projection: chỉ đọc các field cần thiết (None = cả document)
+        """
+        query = self._build_query(filters)
+        page_query = query
+        start, end = self._time_bounds(filters)
+
+        # Keyset pagination trên index (timestamp, _id): chi phí không phụ thuộc độ sâu trang
+        direction = 'before' if before else 'after' if after else None
+        if direction:
+            timestamp, object_id = decode_cursor(before or after)
+            condition = keyset_condition(timestamp, object_id, direction)
+            page_query = {'$and': [query, condition]} if query else condition
+
+            # Chỉ cần các partition phía sau/trước cursor
+            if direction == 'after':
+                end = timestamp if end is None else min(end, timestamp)
+            else:
+                start = timestamp if start is None else max(start, timestamp)
+
+        # headers/user_agent có thể chỉ còn header_fp, cần đọc kèm để khôi phục
+        wants_headers = projection is None or 'headers' in projection or 'user_agent' in projection
+        if projection is not None:
+            projection = dict(projection, timestamp=1)
+            if wants_headers:
+                projection['header_fp'] = 1
+
+        sort_order = 1 if direction == 'before' else -1
+        collections = self.partitions.collections_for(start, end, newest_first=sort_order == -1)
+        remaining_skip = 0 if direction else skip
+
+        # Partition rời nhau theo thời gian: nối kết quả theo thứ tự partition là đúng thứ tự sắp xếp.
+        # Lấy dư một bản ghi để biết còn trang tiếp theo
+        logs = []
+        for collection in collections:
+            needed = limit + 1 - len(logs)
+            if needed <= 0:
+                break
+
+            # Offset: bỏ qua nguyên partition nếu số bản ghi khớp không vượt quá phần còn phải skip
+            if remaining_skip and len(collections) > 1:
+                matched = collection.count_documents(page_query)
+                if matched <= remaining_skip:
+                    remaining_skip -= matched
+                    continue
+
+            cursor = collection.find(page_query, projection).sort([('timestamp', sort_order), ('_id', sort_order)])
+            if remaining_skip:
+                cursor = cursor.skip(remaining_skip)
+                remaining_skip = 0
+
+            logs.extend(cursor.limit(needed))
+
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+
+        if direction == 'before':
+            logs.reverse()
+
+        next_cursor = None
+        prev_cursor = None
+        if logs:
+            if direction == 'before' or has_more:
+                next_cursor = encode_cursor(logs[-1]['timestamp'], logs[-1]['_id'])
+            if direction == 'after' or skip or (direction == 'before' and has_more):
+                prev_cursor = encode_cursor(logs[0]['timestamp'], logs[0]['_id'])
+
+        # Convert ObjectId to string
+        for log in logs:
+            log['_id'] = str(log['_id'])
+
+        self._rehydrate_projected(logs, wants_headers, projection)
+
+        result = {
+            'logs': logs,
+            'total': self._count(query, filters, total, self._time_bounds(filters)),
+            'total_mode': total,
+            'per_page': limit,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
+
+        # Trang theo offset giữ nguyên field page (tương thích ngược)
+        if not direction:
+            result['page'] = skip // limit + 1
+
+        return result
+
+    def iter_logs(self, filters=None, projection=None, batch_size=2000):
+        """Duyệt logs theo filter bằng cursor phía server (mới nhất trước), không giữ cả tập kết quả trong bộ nhớ"""
+        wants_headers = projection is None or 'headers' in projection or 'user_agent' in projection
+        if projection is not None and wants_headers:
+            projection = dict(projection, header_fp=1)
+
+        query = self._build_query(filters)
+        start, end = self._time_bounds(filters)
+
+        batch = []
+        for collection in self.partitions.collections_for(start, end):
+            cursor = collection.find(query, projection) \
+                .sort([('timestamp', -1), ('_id', -1)]) \
+                .batch_size(batch_size)
+
+            for log in cursor:
+                batch.append(log)
+                if len(batch) >= batch_size:
+                    yield from self._rehydrate_projected(batch, wants_headers, projection)
+                    batch = []
+
+        if batch:
+            yield from self._rehydrate_projected(batch, wants_headers, projection)
+
+    def _rehydrate_projected(self, logs, wants_headers, projection):
+        """Khôi phục headers/user_agent khi được yêu cầu, bỏ headers nếu projection chỉ cần user_agent"""
+        if wants_headers:
+            self._rehydrate_headers(logs)
+            if projection is not None and 'headers' not in projection:
+                for log in logs:
+                    log.pop('headers', None)
+        return logs
 
-    def get_all(self, limit=100, skip=0, filters=None):
-        """Lấy tất cả logs với pagination và filter"""
+    def get_by_id(self, log_id):
+        """Lấy đầy đủ một attack log (headers, payload...) theo id"""
+        try:
+            object_id = ObjectId(log_id)
+        except Exception:
+            return None
+
+        # Thử partition theo thời điểm sinh _id trước
+        preferred = self.partitions.name_for(_naive_utc(object_id.generation_time))
+        names = sorted(self.partitions.partitions(), key=lambda name: name != preferred)
+
+        log = None
+        for name in names:
+            log = self.partitions.db[name].find_one({'_id': object_id})
+            if log is not None:
+                break
+
+        if log is None:
+            return None
+
+        log['_id'] = str(log['_id'])
+        self._rehydrate_headers([log])
+
+        return log
+
+    @staticmethod
+    def _build_query(filters):
         query = {}
 
         if filters:
@@ -50,59 +578,212 @@ class AttackLog:
                 if filters.get('end_date'):
                     query['timestamp']['$lte'] = filters['end_date']
 
-        logs = list(self.collection.find(query)
-                   .sort('timestamp', -1)
-                   .skip(skip)
-                   .limit(limit))
+        return query
 
-        # Convert ObjectId to string
-        for log in logs:
-            log['_id'] = str(log['_id'])
+    @staticmethod
+    def _time_bounds(filters):
+        """Khoảng thời gian của filter, dùng để chọn partition"""
+        filters = filters or {}
+        return _naive_utc(filters.get('start_date')), _naive_utc(filters.get('end_date'))
 
-        total = self.collection.count_documents(query)
+    def estimated_count(self):
+        """Ước lượng số log (metadata của từng collection, không quét)"""
+        return sum(collection.estimated_document_count() for collection in self.partitions.collections_for())
 
-        return {
-            'logs': logs,
-            'total': total,
-            'page': skip // limit + 1,
-            'per_page': limit
-        }
+    def _count(self, query, filters, mode, time_bounds=(None, None)):
+        """Total theo chế độ: đếm chính xác, ước lượng hoặc bỏ qua"""
+        if mode == 'none':
+            return None
+
+        if mode == 'estimated':
+            active = {key for key, value in (filters or {}).items() if value}
+
+            # Không filter hoặc chỉ lọc attack_type: đọc từ rollup (O(1))
+            if self.rollups is not None and active <= {'attack_type'}:
+                totals = self.rollups.get_totals()
+                if not active:
+                    return totals.get('total', 0)
+                return AttackRollup.counts(totals, 'attack_types').get(filters['attack_type'], 0)
+
+            if not active:
+                return self.estimated_count()
+
+        return sum(collection.count_documents(query) for collection in self.partitions.collections_for(*time_bounds))
+
+    def _group_counts(self, field, match=None, collections=None):
+        """$group đếm theo field trên từng partition rồi gộp lại"""
+        pipeline = [{'$group': {'_id': f'${field}', 'count': {'$sum': 1}}}]
+        if match:
+            pipeline.insert(0, {'$match': match})
+
+        counts = Counter()
+        for collection in collections if collections is not None else self.partitions.collections_for():
+            for item in collection.aggregate(pipeline):
+                key = item['_id']
+                counts[tuple(sorted(key.items())) if isinstance(key, dict) else key] += item['count']
+
+        return counts
 
     def get_stats(self):
         """Lấy thống kê tổng quan"""
-        total_attacks = self.collection.count_documents({})
+        return self.cached(('stats',), self._get_stats)
 
-        # Tấn công hôm nay
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_attacks = self.collection.count_documents({'timestamp': {'$gte': today_start}})
+    def _get_stats(self):
+        if self.rollups is not None:
+            totals = self.rollups.get_totals()
+            total_attacks = totals.get('total', 0)
 
-        # Top IP addresses
-        top_ips = list(self.collection.aggregate([
-            {'$group': {'_id': '$ip_address', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]))
+            # Tấn công hôm nay
+            today_attacks = self.rollups.get_bucket('day', datetime.utcnow()).get('total', 0)
+        else:
+            total_attacks = sum(collection.count_documents({}) for collection in self.partitions.collections_for())
 
-        # Attack types distribution
-        attack_types = list(self.collection.aggregate([
-            {'$group': {'_id': '$attack_type', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
-        ]))
+            # Tấn công hôm nay
+            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            today_attacks = sum(
+                collection.count_documents({'timestamp': {'$gte': today_start}})
+                for collection in self.partitions.collections_for(start=today_start)
+            )
 
         return {
             'total_attacks': total_attacks,
             'today_attacks': today_attacks,
-            'top_ips': top_ips,
-            'attack_types': attack_types
+            'top_ips': self.get_top_ips(limit=10),
+            'attack_types': self.get_attack_type_counts()
         }
 
+    def top_ip_days(self, days=None):
+        """Số ngày gần nhất mà get_top_ips tính (None: toàn bộ log còn giữ)
+
+        Có rollup thì mặc định là ROLLUP_IP_TTL_DAYS (count IP theo ngày hết hạn sau khoảng này).
+        """
+        if days or self.rollups is None:
+            return days or None
+        return self.rollups.default_top_ip_days()
+
+    def get_top_ips(self, limit=10, days=None):
+        """Top IP addresses tấn công nhiều nhất trong top_ip_days(days) ngày gần nhất"""
+        days = self.top_ip_days(days)
+        return self.cached(('top_ips', limit, days), lambda: self._get_top_ips(limit, days))
+
+    def _get_top_ips(self, limit, days):
+        if self.rollups is not None:
+            return self.rollups.get_top_ips(limit, days=days)
+
+        match, collections = None, None
+        if days:
+            start_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+            match = {'timestamp': {'$gte': start_date}}
+            collections = self.partitions.collections_for(start=start_date)
+
+        return [
+            {'_id': ip, 'count': count}
+            for ip, count in self._group_counts('ip_address', match, collections).most_common(limit)
+        ]
+
+    def get_attack_type_counts(self):
+        """Phân bố attack types"""
+        return self.cached(('attack_types',), self._get_attack_type_counts)
+
+    def _get_attack_type_counts(self):
+        if self.rollups is not None:
+            counts = AttackRollup.counts(self.rollups.get_totals(), 'attack_types')
+            attack_types = [{'_id': attack_type, 'count': count} for attack_type, count in counts.items()]
+            attack_types.sort(key=lambda x: x['count'], reverse=True)
+            return attack_types
+
+        return [
+            {'_id': attack_type, 'count': count}
+            for attack_type, count in self._group_counts('attack_type').most_common()
+        ]
+
+    def get_ip_activity(self, ip_address, start_date, bucket_seconds=3600, endpoint_limit=IP_ENDPOINT_LIMIT):
+        """Thống kê hoạt động của một IP từ start_date bằng một $facet trên index (ip_address, timestamp)
+
+        Trả về total, counts theo endpoint/attack_type/method và số request theo bucket thời gian.
+        unique_endpoints chính xác khi danh sách endpoint của mọi partition đầy đủ (không bị cắt ở
+        endpoint_limit); nếu không thì là cận dưới và unique_endpoints_approximate = True.
+        """
+        bucket_ms = bucket_seconds * 1000
+        pipeline = [
+            {'$match': {'ip_address': ip_address, 'timestamp': {'$gte': start_date}}},
+            {'$facet': {
+                'total': [{'$count': 'count'}],
+                'unique_endpoints': [{'$group': {'_id': '$endpoint'}}, {'$count': 'count'}],
+                # Giới hạn để kết quả $facet (một document) không vượt 16MB khi IP fuzz hàng triệu endpoint
+                'endpoints': [
+                    {'$group': {'_id': '$endpoint', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}},
+                    {'$limit': endpoint_limit}
+                ],
+                'attack_types': [{'$group': {'_id': '$attack_type', 'count': {'$sum': 1}}}],
+                'methods': [{'$group': {'_id': '$method', 'count': {'$sum': 1}}}],
+                # Làm tròn timestamp xuống đầu bucket: ts - ((ts - epoch) mod bucket)
+                'rate': [{'$group': {
+                    '_id': {'$subtract': ['$timestamp', {'$mod': [{'$subtract': ['$timestamp', EPOCH]}, bucket_ms]}]},
+                    'count': {'$sum': 1}
+                }}]
+            }}
+        ]
+
+        activity = {'total': 0, 'unique_endpoints': 0, 'unique_endpoints_approximate': False,
+                    'endpoints': Counter(), 'attack_types': Counter(), 'methods': Counter(), 'rate': Counter()}
+        partition_uniques = []
+
+        for collection in self.partitions.collections_for(start=start_date):
+            for result in collection.aggregate(pipeline):
+                activity['total'] += sum(item['count'] for item in result['total'])
+                partition_uniques.append(sum(item['count'] for item in result['unique_endpoints']))
+                for field in ('endpoints', 'attack_types', 'methods', 'rate'):
+                    for item in result[field]:
+                        activity[field][item['_id']] += item['count']
+
+        # Endpoint trùng giữa các partition không được cộng lặp: khi không partition nào bị cắt,
+        # endpoints đã gộp là hợp đầy đủ. Một partition thì số $group của nó đã chính xác
+        if len(partition_uniques) == 1:
+            activity['unique_endpoints'] = partition_uniques[0]
+        elif all(count <= endpoint_limit for count in partition_uniques):
+            activity['unique_endpoints'] = len(activity['endpoints'])
+        elif partition_uniques:
+            activity['unique_endpoints'] = max(len(activity['endpoints']), *partition_uniques)
+            activity['unique_endpoints_approximate'] = True
+
+        return activity
+
+    def get_tool_stats(self):
+        """Thống kê công cụ tấn công trên toàn bộ dữ liệu (field tool đã index)"""
+        return self.cached(('tools',), self._get_tool_stats)
+
+    def _get_tool_stats(self):
+        # Log cũ chưa backfill (tool = null) được tính là Unknown Tool
+        tool_counts = {}
+        for tool, count in self._group_counts('tool').items():
+            tool = tool or 'Unknown Tool'
+            tool_counts[tool] = tool_counts.get(tool, 0) + count
+
+        tools_list = [{'tool': tool, 'count': count} for tool, count in tool_counts.items()]
+        tools_list.sort(key=lambda x: x['count'], reverse=True)
+
+        return tools_list
+
     def get_timeline(self, days=7):
         """Lấy timeline tấn công theo ngày"""
-        from datetime import timedelta
+        return self.cached(('timeline', days), lambda: self._get_timeline(days), ttl=Config.STATS_CACHE_TIMELINE_TTL)
 
+    def _get_timeline(self, days):
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
 
+        if self.rollups is not None:
+            return [
+                {
+                    '_id': {'year': doc['_id'].year, 'month': doc['_id'].month, 'day': doc['_id'].day},
+                    'count': doc['total']
+                }
+                for doc in self.rollups.get_series('day', start_date, end_date)
+                if doc.get('total', 0) > 0
+            ]
+
         pipeline = [
             {'$match': {'timestamp': {'$gte': start_date, '$lte': end_date}}},
             {'$group': {
@@ -116,15 +797,183 @@ class AttackLog:
             {'$sort': {'_id': 1}}
         ]
 
-        timeline = list(self.collection.aggregate(pipeline))
+        # Chỉ aggregate các partition giao với khoảng thời gian rồi gộp theo ngày
+        counts = Counter()
+        for collection in self.partitions.collections_for(start_date, end_date):
+            for item in collection.aggregate(pipeline):
+                date = item['_id']
+                counts[(date['year'], date['month'], date['day'])] += item['count']
+
+        timeline = [
+            {'_id': {'year': year, 'month': month, 'day': day}, 'count': count}
+            for (year, month, day), count in sorted(counts.items())
+        ]
 
         return timeline
 
+    def get_unique_attackers(self, days=1, group_by=None, limit=None):
+        """Số IP phân biệt trong N ngày gần nhất (tính cả hôm nay), có thể nhóm theo endpoint/attack_type
+
+        limit: chỉ trả về limit nhóm nhiều IP nhất (group_count là tổng số nhóm).
+        """
+        return self.cached(
+            ('unique_attackers', days, group_by, limit),
+            lambda: self._get_unique_attackers(days, group_by, limit),
+            ttl=Config.STATS_CACHE_TTL
+        )
+
+    def _get_unique_attackers(self, days, group_by, limit):
+        end_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_day = end_day - timedelta(days=days - 1)
+
+        # Rollup: union register HLL theo ngày (ước lượng, bộ nhớ cố định)
+        if self.rollups is not None:
+            result = self.rollups.get_unique(start_day, end_day, group_by, limit=limit)
+            result['estimated'] = True
+            return result
+
+        # Không có rollup: đếm chính xác bằng $group (quét toàn bộ khoảng thời gian)
+        facets = {
+            'total': [{'$group': {'_id': '$ip_address'}}],
+            'series': [{'$group': {'_id': {
+                'year': {'$year': '$timestamp'},
+                'month': {'$month': '$timestamp'},
+                'day': {'$dayOfMonth': '$timestamp'},
+                'ip': '$ip_address'
+            }}}]
+        }
+        if group_by:
+            facets['groups'] = [{'$group': {'_id': {'key': f'${group_by}', 'ip': '$ip_address'}}}]
+
+        pipeline = [{'$match': {'timestamp': {'$gte': start_day}}}, {'$facet': facets}]
+
+        total, series, groups = set(), {}, {}
+        for collection in self.partitions.collections_for(start=start_day):
+            for result in collection.aggregate(pipeline):
+                total.update(item['_id'] for item in result['total'])
+                for item in result['series']:
+                    day = datetime(item['_id']['year'], item['_id']['month'], item['_id']['day'])
+                    series.setdefault(day, set()).add(item['_id']['ip'])
+                for item in result.get('groups', []):
+                    groups.setdefault(item['_id'].get('key') or 'unknown', set()).add(item['_id']['ip'])
+
+        counts = {key: len(ips) for key, ips in groups.items()}
+        if limit is not None:
+            counts = dict(heapq.nlargest(limit, counts.items(), key=lambda item: item[1]))
+
+        return {
+            'total': len(total),
+            'series': [{'day': day, 'unique': len(ips)} for day, ips in sorted(series.items())],
+            'groups': counts,
+            'group_count': len(groups),
+            'estimated': False
+        }
+
     def delete_old_logs(self, days=90):
-        """Xóa logs cũ hơn X ngày"""
-        from datetime import timedelta
+        """Xóa logs cũ hơn X ngày
 
+        Khi bật partition: drop nguyên các partition đã hết hạn hoàn toàn (không delete_many),
+        log trong partition còn giao với cutoff được giữ tới khi cả partition hết hạn.
+        """
         cutoff_date = datetime.utcnow() - timedelta(days=days)
+
+        if self.partitions.enabled:
+            return self.drop_expired_partitions(cutoff_date)
+
+        # Trừ các log sắp xóa khỏi rollup để thống kê khớp với dữ liệu còn lại
+        self._subtract_rollups(self.collection, {'timestamp': {'$lt': cutoff_date}})
+
         result = self.collection.delete_many({'timestamp': {'$lt': cutoff_date}})
+        self._notify_write(result.deleted_count)
 
         return result.deleted_count
+
+    def drop_expired_partitions(self, cutoff_date):
+        """Drop các partition nằm hoàn toàn trước cutoff, trả về số log đã xóa"""
+        expired = [
+            collection for collection in self.partitions.collections_for(end=cutoff_date, newest_first=False)
+            if self.partitions.range_for(collection.name)[1] <= cutoff_date
+        ]
+
+        deleted = 0
+        for collection in expired:
+            deleted += collection.estimated_document_count()
+
+            # Cả partition bị drop: trừ rollup theo bucket ngày đã lưu, không quét từng log
+            if self.rollups is not None:
+                try:
+                    self.rollups.drop_range(*self.partitions.range_for(collection.name))
+                except Exception as e:
+                    print(f"[WARNING] Khong cap nhat duoc rollup: {str(e)}")
+
+        self.partitions.drop_before(cutoff_date)
+        self._notify_write(deleted)
+
+        return deleted
+
+    def find_expired(self, cutoff_date, after=None, limit=1000):
+        """Lô log cũ nhất có timestamp < cutoff, theo (timestamp, _id) tăng dần từ sau checkpoint after"""
+        query = {'timestamp': {'$lt': cutoff_date}}
+        if after is not None:
+            query = {'$and': [query, keyset_condition(after[0], after[1], 'before')]}
+
+        return list(
+            self.collection.find(query, ROLLUP_PROJECTION)
+            .sort([('timestamp', 1), ('_id', 1)])
+            .limit(limit)
+        )
+
+    def delete_batch(self, entries, write_concern=None):
+        """Xóa một lô log (đã lấy bằng find_expired) bằng một delete_many theo _id
+
+        deleted_count bằng cỡ lô thì trừ cả lô khỏi rollup. Ít hơn nghĩa là một số log đã bị xóa
+        song song ở nơi khác (delete_old_logs trừ rollup trước khi xóa) và không biết là log nào:
+        dựng lại rollup của các ngày trong lô từ log còn lại thay vì trừ từng log.
+        """
+        if not entries:
+            return 0
+
+        collection = self.collection
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+
+        deleted = collection.delete_many({'_id': {'$in': [entry['_id'] for entry in entries]}}).deleted_count
+
+        if deleted == len(entries):
+            self._record_rollups(entries, sign=-1)
+        elif deleted:
+            self.rebuild_rollup_days({
+                entry['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0) for entry in entries
+            })
+        self._notify_write(deleted)
+
+        return deleted
+
+    def rebuild_rollup_days(self, days):
+        """Dựng lại rollup của các ngày từ log còn trong collection (sửa lệch sau khi xóa song song)"""
+        if self.rollups is None:
+            return
+
+        for day in sorted(days):
+            try:
+                self.rollups.drop_range(day, day + timedelta(days=1))
+                self._apply_rollups(self.collection, {'timestamp': {'$gte': day, '$lt': day + timedelta(days=1)}})
+            except Exception as e:
+                print(f"[WARNING] Khong dung lai duoc rollup ngay {day:%Y-%m-%d}: {str(e)}")
+
+    def _subtract_rollups(self, collection, query, batch_size=5000):
+        """Trừ các log khớp query khỏi rollup (trước khi xóa)"""
+        self._apply_rollups(collection, query, sign=-1, batch_size=batch_size)
+
+    def _apply_rollups(self, collection, query, sign=1, batch_size=5000):
+        """Cộng (sign=1) hoặc trừ (sign=-1) các log khớp query vào rollup theo lô"""
+        if self.rollups is None:
+            return
+
+        batch = []
+        for entry in collection.find(query, ROLLUP_PROJECTION):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                self._record_rollups(batch, sign=sign)
+                batch = []
+        self._record_rollups(batch, sign=sign)
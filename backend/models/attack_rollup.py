@@ -0,0 +1,398 @@
+import heapq
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from utils.hyperloglog import HyperLogLog
+
+# Hàm làm tròn timestamp về đầu bucket cho từng độ phân giải
+GRANULARITIES = {
+    'minute': lambda ts: ts.replace(second=0, microsecond=0),
+    'hour': lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    'day': lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+TOTALS_ID = 'all'
+
+# Chiều của HLL đếm IP phân biệt theo ngày ('all' = toàn bộ)
+UNIQUE_DIMENSIONS = ('endpoint', 'attack_type')
+UNIQUE_ALL = 'all'
+# Key gộp các giá trị vượt giới hạn key phân biệt mỗi ngày (endpoint do fuzzing)
+UNIQUE_OTHER = '__other__'
+
+# Field name MongoDB không được chứa '.' hoặc bắt đầu bằng '$' (endpoint như /.env)
+_KEY_ESCAPES = (('\\', '\\\\'), ('.', '．'), ('$', '＄'))
+
+
+def encode_key(value):
+    key = str(value) if value not in (None, '') else 'unknown'
+    for raw, escaped in _KEY_ESCAPES:
+        key = key.replace(raw, escaped)
+    return key
+
+
+def decode_key(key):
+    for raw, escaped in reversed(_KEY_ESCAPES):
+        key = key.replace(escaped, raw)
+    return key
+
+
+class AttackRollup:
+    """Model cho rollup thống kê: bucket phút/giờ/ngày và bảng tổng được cập nhật bằng $inc lúc ingest"""
+
+    def __init__(self, db, minute_ttl=172800, hour_ttl=2592000, ip_top_n=1000, ip_ttl=2592000,
+                 hll_precision=10, unique_max_keys=1000, create_indexes=True):
+        self.buckets = {name: db[f'attack_rollups_{name}'] for name in GRANULARITIES}
+        self.totals = db['attack_rollups_totals']
+
+        # Count IP theo (ngày, IP), mỗi ngày chỉ giữ ip_top_n IP nhiều nhất và hết hạn sau ip_ttl giây:
+        # IP xoay vòng không làm collection tăng mãi
+        self.ips = db['attack_rollups_ips']
+        self.ip_top_n = ip_top_n
+        self.ip_ttl = ip_ttl
+        self._ip_inserts = Counter()
+
+        # Register HLL thưa theo (ngày, chiều, key): mỗi field r.<index> chỉ tăng bằng $max
+        self.unique = db['attack_rollups_unique']
+        self.hll_precision = hll_precision
+
+        # Mỗi (ngày, chiều) giữ tối đa unique_max_keys key, phần còn lại vào UNIQUE_OTHER (0 = không giới hạn).
+        # Key đã biết được cache theo process; nhiều worker cùng ghi thì vượt tối đa unique_max_keys mỗi worker
+        self.unique_max_keys = unique_max_keys
+        self._unique_keys = {}
+
+        # Bucket phút/giờ chỉ phục vụ dữ liệu gần đây, hết hạn theo TTL
+        self.ttl = {'minute': minute_ttl, 'hour': hour_ttl}
+
+        if create_indexes:
+            self._create_indexes()
+
+    def _create_indexes(self):
+        for name, collection in self.buckets.items():
+            if self.ttl.get(name):
+                collection.create_index('bucket', expireAfterSeconds=self.ttl[name])
+        self.ips.create_index([('day', 1), ('count', -1)])
+        if self.ip_ttl:
+            self.ips.create_index('day', expireAfterSeconds=self.ip_ttl)
+        self.unique.create_index([('dim', 1), ('day', 1)])
+
+    def record(self, log_entries, sign=1):
+        """Cộng (sign=1) hoặc trừ (sign=-1) một lô attack log vào các rollup"""
+        if not log_entries:
+            return
+
+        bucket_incs = {name: defaultdict(Counter) for name in GRANULARITIES}
+        totals_inc = Counter()
+        # (ngày, IP) -> count, last_seen
+        ip_counts = Counter()
+        ip_last_seen = {}
+
+        for entry in log_entries:
+            timestamp = entry['timestamp']
+            attack_type = encode_key(entry.get('attack_type'))
+            endpoint = encode_key(entry.get('endpoint'))
+
+            fields = ['total', f'attack_types.{attack_type}', f'endpoints.{endpoint}']
+
+            # Country chỉ tính khi geolocation đã có (event deferred được tính lúc enrichment)
+            country = (entry.get('geolocation') or {}).get('country')
+            if country:
+                fields.append(f'countries.{encode_key(country)}')
+
+            for name, floor in GRANULARITIES.items():
+                bucket_incs[name][floor(timestamp)].update(fields)
+
+            totals_inc.update(['total', f'attack_types.{attack_type}'])
+
+            ip_key = (GRANULARITIES['day'](timestamp), entry.get('ip_address') or 'unknown')
+            ip_counts[ip_key] += 1
+            if ip_key not in ip_last_seen or timestamp > ip_last_seen[ip_key]:
+                ip_last_seen[ip_key] = timestamp
+
+        upsert = sign > 0
+
+        for name, increments in bucket_incs.items():
+            self.buckets[name].bulk_write([
+                UpdateOne(
+                    {'_id': bucket},
+                    {'$inc': {field: count * sign for field, count in counts.items()},
+                     '$setOnInsert': {'bucket': bucket}},
+                    upsert=upsert
+                )
+                for bucket, counts in increments.items()
+            ], ordered=False)
+
+        self.totals.update_one(
+            {'_id': TOTALS_ID},
+            {'$inc': {field: count * sign for field, count in totals_inc.items()}},
+            upsert=True
+        )
+
+        ip_ids = [f'{day:%Y-%m-%d}|{ip}' for day, ip in ip_counts]
+        ip_operations = []
+        for ip_id, ((day, ip), count) in zip(ip_ids, ip_counts.items()):
+            update = {'$inc': {'count': count * sign}}
+            if upsert:
+                update['$max'] = {'last_seen': ip_last_seen[(day, ip)]}
+                update['$setOnInsert'] = {'day': day, 'ip': ip}
+            ip_operations.append(UpdateOne({'_id': ip_id}, update, upsert=upsert))
+        result = self.ips.bulk_write(ip_operations, ordered=False)
+
+        if upsert and result.upserted_count:
+            ip_keys = list(ip_counts)
+            self._trim_ips_after_insert([ip_keys[index][0] for index in result.upserted_ids])
+
+        # HLL không trừ được: log hết hạn vẫn nằm trong số IP phân biệt của ngày đó
+        if upsert:
+            self._record_unique(log_entries)
+
+        # Dọn bucket/IP đã về 0 sau khi trừ, chỉ trong các _id vừa cập nhật (không quét cả collection)
+        if not upsert:
+            for name, increments in bucket_incs.items():
+                self.buckets[name].delete_many({'_id': {'$in': list(increments)}, 'total': {'$lte': 0}})
+            self.ips.delete_many({'_id': {'$in': ip_ids}, 'count': {'$lte': 0}})
+
+    def _trim_ips_after_insert(self, days):
+        """Ngày đã thêm ip_top_n IP mới kể từ lần trim trước thì trim lại (mỗi ngày giữ tối đa ~2 x ip_top_n)"""
+        self._ip_inserts.update(days)
+
+        for day in [day for day, inserted in self._ip_inserts.items() if inserted >= self.ip_top_n]:
+            self.trim_ips(day)
+            del self._ip_inserts[day]
+
+        # Chỉ cần đếm cho vài ngày gần nhất (event ingest luôn thuộc ngày hiện tại)
+        for day in sorted(self._ip_inserts)[:-7]:
+            del self._ip_inserts[day]
+
+    def trim_ips(self, day):
+        """Chỉ giữ ip_top_n IP có count lớn nhất của ngày, trả về số IP đã xóa"""
+        stale = [
+            doc['_id'] for doc in self.ips.find({'day': day}, {'_id': 1})
+            .sort([('count', -1), ('_id', 1)])
+            .skip(self.ip_top_n)
+        ]
+
+        for start in range(0, len(stale), 1000):
+            self.ips.delete_many({'_id': {'$in': stale[start:start + 1000]}})
+
+        return len(stale)
+
+    def _record_unique(self, log_entries):
+        """Cập nhật register HLL IP phân biệt theo ngày, theo endpoint và attack type"""
+        registers = defaultdict(dict)
+        keys = {}
+        positions = {}
+
+        for entry in log_entries:
+            ip = entry.get('ip_address') or 'unknown'
+            if ip not in positions:
+                positions[ip] = HyperLogLog.position(ip, self.hll_precision)
+            index, rank = positions[ip]
+
+            day = GRANULARITIES['day'](entry['timestamp'])
+            dims = [(UNIQUE_ALL, UNIQUE_ALL)] + [
+                (dim, self._unique_key(day, dim, encode_key(entry.get(dim)))) for dim in UNIQUE_DIMENSIONS
+            ]
+
+            for dim, key in dims:
+                doc_id = f'{day:%Y-%m-%d}|{dim}|{key}'
+                keys[doc_id] = (day, dim, key)
+                doc = registers[doc_id]
+                if rank > doc.get(index, 0):
+                    doc[index] = rank
+
+        self.unique.bulk_write([
+            UpdateOne(
+                {'_id': doc_id},
+                {'$max': {f'r.{index}': rank for index, rank in doc.items()},
+                 '$setOnInsert': {'day': keys[doc_id][0], 'dim': keys[doc_id][1], 'key': keys[doc_id][2],
+                                  'p': self.hll_precision}},
+                upsert=True
+            )
+            for doc_id, doc in registers.items()
+        ], ordered=False)
+
+    def _unique_key(self, day, dim, key):
+        """Key ghi register của chiều dim trong ngày, UNIQUE_OTHER khi ngày đó đã đủ unique_max_keys key"""
+        if not self.unique_max_keys:
+            return key
+
+        known = self._unique_keys.get((day, dim))
+        if known is None:
+            known = self._unique_keys[(day, dim)] = set(self.unique.distinct('key', {'day': day, 'dim': dim}))
+
+            # Chỉ cần cache vài ngày gần nhất (event ingest luôn thuộc ngày hiện tại)
+            for stale in sorted(self._unique_keys)[:-7 * len(UNIQUE_DIMENSIONS)]:
+                del self._unique_keys[stale]
+
+        if key in known:
+            return key
+        if len(known) >= self.unique_max_keys:
+            return UNIQUE_OTHER
+
+        known.add(key)
+        return key
+
+    def get_unique(self, start_day, end_day, group_by=None, limit=None):
+        """Số IP phân biệt trong [start_day, end_day]: union register của các ngày
+
+        Trả về (total, {key: unique}) khi có group_by (chỉ limit nhóm nhiều IP nhất nếu có limit,
+        group_count là tổng số nhóm), và series theo ngày của tổng.
+        """
+        dims = [UNIQUE_ALL] + ([group_by] if group_by else [])
+        cursor = self.unique.find({
+            'dim': {'$in': dims},
+            'day': {'$gte': start_day, '$lte': end_day},
+            'p': self.hll_precision
+        })
+
+        total = HyperLogLog(self.hll_precision)
+        groups = defaultdict(lambda: HyperLogLog(self.hll_precision))
+        series = {}
+
+        for doc in cursor:
+            sketch = HyperLogLog(self.hll_precision)
+            for index, rank in (doc.get('r') or {}).items():
+                sketch.registers[int(index)] = rank
+
+            if doc['dim'] == UNIQUE_ALL:
+                total.merge(sketch)
+                series[doc['day']] = sketch.count()
+            else:
+                groups[decode_key(doc['key'])].merge(sketch)
+
+        counts = {key: sketch.count() for key, sketch in groups.items()}
+        if limit is not None:
+            counts = dict(heapq.nlargest(limit, counts.items(), key=lambda item: item[1]))
+
+        return {
+            'total': total.count(),
+            'series': [{'day': day, 'unique': count} for day, count in sorted(series.items())],
+            'groups': counts,
+            'group_count': len(groups)
+        }
+
+    def move_countries(self, changes):
+        """Chuyển count country của event sau enrichment: changes = [(timestamp, country cũ, country mới)]"""
+        bucket_incs = {name: defaultdict(Counter) for name in GRANULARITIES}
+
+        for timestamp, old_country, new_country in changes:
+            if timestamp is None or old_country == new_country:
+                continue
+
+            for name, floor in GRANULARITIES.items():
+                counts = bucket_incs[name][floor(timestamp)]
+                if old_country:
+                    counts[f'countries.{encode_key(old_country)}'] -= 1
+                if new_country:
+                    counts[f'countries.{encode_key(new_country)}'] += 1
+
+        for name, increments in bucket_incs.items():
+            operations = [
+                UpdateOne({'_id': bucket}, {'$inc': dict(counts), '$setOnInsert': {'bucket': bucket}}, upsert=True)
+                for bucket, counts in increments.items()
+                if any(counts.values())
+            ]
+            if operations:
+                self.buckets[name].bulk_write(operations, ordered=False)
+
+    def drop_range(self, start, end):
+        """Bỏ toàn bộ dữ liệu trong [start, end) (partition bị drop), trả về số log đã trừ
+
+        Totals được trừ theo các bucket ngày đã lưu thay vì quét lại log; bucket và count IP
+        trong khoảng bị xóa. Register HLL giữ nguyên (không trừ được).
+        """
+        totals_inc = Counter()
+        for doc in self.buckets['day'].find({'_id': {'$gte': start, '$lt': end}}):
+            totals_inc['total'] += doc.get('total', 0)
+            for key, count in (doc.get('attack_types') or {}).items():
+                totals_inc[f'attack_types.{key}'] += count
+
+        if totals_inc:
+            self.totals.update_one(
+                {'_id': TOTALS_ID},
+                {'$inc': {field: -count for field, count in totals_inc.items()}}
+            )
+
+        for collection in self.buckets.values():
+            collection.delete_many({'_id': {'$gte': start, '$lt': end}})
+        self.ips.delete_many({'day': {'$gte': start, '$lt': end}})
+
+        return totals_inc['total']
+
+    def get_totals(self):
+        return self.totals.find_one({'_id': TOTALS_ID}) or {}
+
+    def get_bucket(self, granularity, timestamp):
+        floor = GRANULARITIES[granularity]
+        return self.buckets[granularity].find_one({'_id': floor(timestamp)}) or {}
+
+    def get_series(self, granularity, start, end=None):
+        """Các bucket từ start tới end (theo thứ tự thời gian)"""
+        query = {'_id': {'$gte': GRANULARITIES[granularity](start)}}
+        if end is not None:
+            query['_id']['$lte'] = end
+
+        return list(self.buckets[granularity].find(query).sort('_id', 1))
+
+    def default_top_ip_days(self):
+        """Số ngày top IP tính mặc định: count theo ngày chỉ giữ ip_ttl (None: toàn bộ thời gian)"""
+        return self.ip_ttl // 86400 if self.ip_ttl else None
+
+    def get_top_ips(self, limit=10, days=None):
+        """Top IP cộng dồn count theo ngày trong `days` ngày gần nhất (mặc định default_top_ip_days())"""
+        days = days or self.default_top_ip_days()
+
+        match = {'day': {'$exists': True}}
+        if days:
+            match['day'] = {'$gte': GRANULARITIES['day'](datetime.utcnow()) - timedelta(days=days - 1)}
+
+        return [
+            {'_id': doc['_id'], 'count': doc['count']}
+            for doc in self.ips.aggregate([
+                {'$match': match},
+                {'$group': {'_id': '$ip', 'count': {'$sum': '$count'}}},
+                {'$sort': {'count': -1}},
+                {'$limit': limit}
+            ])
+        ]
+
+    @staticmethod
+    def counts(doc, field):
+        """Map {key: count} đã decode của một field rollup, bỏ các key về 0"""
+        return {decode_key(key): count for key, count in (doc.get(field) or {}).items() if count > 0}
+
+    def has_data(self):
+        return self.totals.count_documents({'_id': TOTALS_ID}) > 0
+
+    def rebuild(self, attack_logs, batch_size=5000):
+        """Xóa và dựng lại toàn bộ rollup từ collection attack_logs (hoặc danh sách partition)"""
+        if not isinstance(attack_logs, (list, tuple)):
+            attack_logs = [attack_logs]
+
+        for collection in self.buckets.values():
+            collection.delete_many({})
+        self.totals.delete_many({})
+        self.ips.delete_many({})
+        self.unique.delete_many({})
+        self._unique_keys = {}
+
+        projection = {'timestamp': 1, 'attack_type': 1, 'endpoint': 1, 'ip_address': 1, 'geolocation.country': 1}
+        batch = []
+        processed = 0
+
+        for collection in attack_logs:
+            for entry in collection.find({}, projection).sort('_id', 1).batch_size(batch_size):
+                if not isinstance(entry.get('timestamp'), datetime):
+                    continue
+
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    self.record(batch)
+                    processed += len(batch)
+                    batch = []
+
+        if batch:
+            self.record(batch)
+            processed += len(batch)
+
+        return processed
@@ -0,0 +1,83 @@
+import hashlib
+import json
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.cache import TTLCache, MISSING
+
+# Mã lỗi MongoDB khi hai upsert cùng _id chạy song song (header set đã được process khác ghi)
+DUPLICATE_KEY_ERROR = 11000
+
+
+class HeaderSet:
+    """Model cho bộ headers dùng chung: mỗi header set chỉ lưu một lần, log giữ fingerprint"""
+
+    def __init__(self, db, cache_size=10000, cache_ttl=3600):
+        self.collection = db['header_sets']
+
+        # Fingerprint đã chắc chắn có trong database -> headers
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+
+    @staticmethod
+    def fingerprint(headers):
+        """Hash dạng canonical (sắp xếp theo tên header) của một header set"""
+        canonical = json.dumps(sorted(headers.items()), separators=(',', ':'), ensure_ascii=False)
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+    def is_known(self, fp):
+        """True nếu fingerprint chắc chắn đã có trong database (theo cache)"""
+        return self.cache.get(fp) is not MISSING
+
+    def store_many(self, header_sets):
+        """Upsert các header set {fingerprint: headers} bằng một bulk_write"""
+        if not header_sets:
+            return
+
+        now = datetime.utcnow()
+        try:
+            self.collection.bulk_write([
+                UpdateOne({'_id': fp}, {'$setOnInsert': {'headers': headers, 'created_at': now}}, upsert=True)
+                for fp, headers in header_sets.items()
+            ], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+
+        for fp, headers in header_sets.items():
+            self.cache.set(fp, headers)
+
+    def store(self, headers):
+        """Lưu header set nếu chưa có, trả về fingerprint"""
+        fp = self.fingerprint(headers)
+
+        if self.cache.get(fp) is not MISSING:
+            return fp
+
+        self.collection.update_one(
+            {'_id': fp},
+            {'$setOnInsert': {'headers': headers, 'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+        self.cache.set(fp, headers)
+
+        return fp
+
+    def get_many(self, fingerprints):
+        """Lấy headers theo danh sách fingerprint (qua cache)"""
+        result = {}
+        missing = []
+
+        for fp in set(fingerprints):
+            headers = self.cache.get(fp)
+            if headers is MISSING:
+                missing.append(fp)
+            else:
+                result[fp] = headers
+
+        if missing:
+            for doc in self.collection.find({'_id': {'$in': missing}}):
+                self.cache.set(doc['_id'], doc['headers'])
+                result[doc['_id']] = doc['headers']
+
+        return result
@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class PartitionScheme:
+    """Chia một collection theo thời gian: mỗi tháng/tuần một collection `{base}_{suffix}`
+
+    granularity='none' giữ một collection duy nhất (không chia partition).
+    """
+
+    def __init__(self, db, base='attack_logs', granularity='none', on_create=None, refresh_interval=5):
+        if granularity not in ('none', 'month', 'week'):
+            raise ValueError(f'Partition granularity khong hop le: {granularity}')
+
+        self.db = db
+        self.base = base
+        self.granularity = granularity
+        self.on_create = on_create
+        self.refresh_interval = refresh_interval
+
+        self._pattern = re.compile(rf'^{re.escape(base)}_(\d{{4}})(w?)(\d{{2}})$')
+        self._lock = threading.Lock()
+        self._names = set()
+        self._initialized = set()
+        self._refreshed_at = 0.0
+
+    @property
+    def enabled(self):
+        return self.granularity != 'none'
+
+    def name_for(self, timestamp):
+        """Tên partition chứa timestamp"""
+        if self.granularity == 'month':
+            return f'{self.base}_{timestamp.year:04d}{timestamp.month:02d}'
+        if self.granularity == 'week':
+            year, week, _ = timestamp.isocalendar()
+            return f'{self.base}_{year:04d}w{week:02d}'
+        return self.base
+
+    def range_for(self, name):
+        """Khoảng [start, end) của partition, None nếu tên không phải partition"""
+        match = self._pattern.match(name)
+        if match is None:
+            return None
+
+        year, is_week, number = int(match.group(1)), match.group(2), int(match.group(3))
+        if is_week:
+            start = datetime.fromisocalendar(year, number, 1)
+            return start, start + timedelta(days=7)
+
+        start = datetime(year, number, 1)
+        end = datetime(year + 1, 1, 1) if number == 12 else datetime(year, number + 1, 1)
+        return start, end
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+
+        names = {name for name in self.db.list_collection_names() if self.range_for(name) is not None}
+        with self._lock:
+            self._names = names | {name for name in self._names if name in self._initialized}
+            self._refreshed_at = now
+
+    def partitions(self, start=None, end=None, newest_first=True):
+        """Các partition có khoảng thời gian giao với [start, end], sắp theo thời gian"""
+        if not self.enabled:
+            return [self.base]
+
+        self._refresh()
+
+        with self._lock:
+            names = list(self._names)
+
+        selected = []
+        for name in names:
+            part_start, part_end = self.range_for(name)
+            if start is not None and part_end <= start:
+                continue
+            if end is not None and part_start > end:
+                continue
+            selected.append((part_start, name))
+
+        selected.sort(reverse=newest_first)
+        return [name for _, name in selected]
+
+    def collections_for(self, start=None, end=None, newest_first=True):
+        """Collection của các partition giao với khoảng thời gian (partition pruning)"""
+        return [self.db[name] for name in self.partitions(start, end, newest_first)]
+
+    def collection_for_write(self, timestamp):
+        """Collection để ghi event có timestamp này; partition mới được tạo index lần đầu dùng"""
+        name = self.name_for(timestamp)
+
+        if self.enabled and name not in self._initialized:
+            if self.on_create is not None:
+                self.on_create(self.db[name])
+            with self._lock:
+                self._initialized.add(name)
+                self._names.add(name)
+
+        return self.db[name]
+
+    def drop_before(self, cutoff):
+        """Drop các partition nằm hoàn toàn trước cutoff, trả về tên partition đã drop"""
+        if not self.enabled:
+            return []
+
+        self._refresh(force=True)
+
+        dropped = []
+        for name in self.partitions(newest_first=False):
+            if self.range_for(name)[1] > cutoff:
+                break
+
+            self.db[name].drop()
+            dropped.append(name)
+
+        with self._lock:
+            self._names -= set(dropped)
+            self._initialized -= set(dropped)
+
+        return dropped
+
+    def get_metrics(self):
+        return {
+            'granularity': self.granularity,
+            'partitions': self.partitions(newest_first=False) if self.enabled else [self.base]
+        }
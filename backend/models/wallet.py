@@ -1,18 +1,50 @@
 from datetime import datetime
+from bson import ObjectId
 from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
+from utils.fake_data import FakeDataGenerator
+
+# Field hiển thị trong danh sách ví (không gồm private key / seed phrase)
+SUMMARY_FIELDS = ('address', 'balance', 'currency', 'created_at', 'is_fake')
+WALLET_FIELDS = SUMMARY_FIELDS + ('private_key', 'seed_phrase', 'updated_at')
 
 class Wallet:
     """Model cho fake wallet"""
 
-    def __init__(self, db):
+    def __init__(self, db, health=None, create_indexes=True):
         self.collection = db['wallets']
-        self._create_indexes()
+        self.health = health
+
+        if create_indexes:
+            self._create_indexes()
 
     def _create_indexes(self):
         """Tạo indexes"""
         self.collection.create_index('address', unique=True)
         self.collection.create_index('created_at')
 
+    def is_online(self):
+        return self.health is None or self.health.is_online()
+
+    def _mark_offline(self, error):
+        if self.health is not None:
+            self.health.mark_offline(error)
+
+    @staticmethod
+    def _fake_wallet(address=None, projection=None):
+        """Fake wallet trả cho attacker khi MongoDB down (không chờ server selection timeout)"""
+        wallet = FakeDataGenerator.generate_fake_wallet()
+        wallet.update({
+            '_id': str(ObjectId()),
+            'address': address or wallet['address'],
+            'created_at': datetime.utcnow(),
+            'is_fake': True
+        })
+
+        if projection:
+            wallet = {key: value for key, value in wallet.items() if key == '_id' or key in projection}
+        return wallet
+
     def create(self, data):
         """Tạo wallet mới"""
         wallet_entry = {
@@ -25,30 +57,54 @@ class Wallet:
             'is_fake': True,
         }
 
+        # MongoDB đang down: honeypot vẫn trả fake wallet, chỉ không lưu lại
+        if self.health is not None and not self.health.is_online():
+            return None
+
         result = self.collection.insert_one(wallet_entry)
         return str(result.inserted_id)
 
     def get_by_address(self, address):
-        """Lấy wallet theo address"""
-        wallet = self.collection.find_one({'address': address})
+        """Lấy wallet theo address (MongoDB down: trả fake wallet cho address đó)"""
+        if not self.is_online():
+            return self._fake_wallet(address)
+
+        try:
+            wallet = self.collection.find_one({'address': address})
+        except ConnectionFailure as e:
+            self._mark_offline(e)
+            return self._fake_wallet(address)
 
         if wallet:
             wallet['_id'] = str(wallet['_id'])
 
         return wallet
 
-    def get_all(self, limit=100, skip=0):
-        """Lấy tất cả wallets"""
-        wallets = list(self.collection.find()
-                      .sort('created_at', -1)
-                      .skip(skip)
-                      .limit(limit))
+    def get_all(self, limit=100, skip=0, projection=None):
+        """Lấy tất cả wallets (projection: chỉ đọc các field cần thiết)
 
-        # Convert ObjectId to string
-        for wallet in wallets:
-            wallet['_id'] = str(wallet['_id'])
+        MongoDB down: trả danh sách fake wallet sinh ngay, honeypot không bị chặn theo timeout.
+        """
+        try:
+            if not self.is_online():
+                raise ConnectionFailure('MongoDB offline')
+
+            wallets = list(self.collection.find({}, projection)
+                          .sort('created_at', -1)
+                          .skip(skip)
+                          .limit(limit))
 
-        total = self.collection.count_documents({})
+            # Convert ObjectId to string
+            for wallet in wallets:
+                wallet['_id'] = str(wallet['_id'])
+
+            total = self.collection.count_documents({})
+
+        except ConnectionFailure as e:
+            if self.is_online():
+                self._mark_offline(e)
+            wallets = [self._fake_wallet(projection=projection) for _ in range(min(limit, 10))]
+            total = skip + len(wallets)
 
         return {
             'wallets': wallets,
@@ -57,6 +113,17 @@ class Wallet:
             'per_page': limit
         }
 
+    def delete(self, address):
+        """Xóa wallet theo address, MongoDB down thì giả vờ đã xóa"""
+        if not self.is_online():
+            return True
+
+        try:
+            return self.collection.delete_one({'address': address}).deleted_count > 0
+        except ConnectionFailure as e:
+            self._mark_offline(e)
+            return True
+
     def update_balance(self, address, new_balance):
         """Cập nhật balance của wallet"""
         result = self.collection.update_one(
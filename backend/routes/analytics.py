@@ -1,17 +1,41 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime
+from config import Config
+from utils.metrics import collect_metrics
+from utils.pagination import TOTAL_MODES
+from utils.projection import build_projection
+from utils.export import (
+    EXPORT_FORMATS,
+    COLUMNAR_FORMATS,
+    FORMAT_MEDIA,
+    CSV_PROJECTION,
+    RECORD_PROJECTION,
+    columnar_available,
+    stream_csv,
+    stream_ndjson,
+    stream_columnar,
+    encode_stream
+)
+from models.attack_log import LOG_FIELDS, SUMMARY_FIELDS
 
 analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
 
 # Global variables (sẽ được inject từ app.py)
 attack_log_model = None
 analyzer_service = None
+event_hub = None
+ip_profile_store = None
+top_ip_tracker = None
 
-def init_analytics_routes(attack_log, analyzer):
+def init_analytics_routes(attack_log, analyzer, hub=None, profiles=None, top_ips=None):
     """Initialize routes với dependencies"""
-    global attack_log_model, analyzer_service
+    global attack_log_model, analyzer_service, event_hub, ip_profile_store, top_ip_tracker
     attack_log_model = attack_log
     analyzer_service = analyzer
+    event_hub = hub
+    ip_profile_store = profiles
+    top_ip_tracker = top_ips
     print(f"[DEBUG] Analytics routes initialized - attack_log_model: {attack_log_model}, analyzer_service: {analyzer_service}")
 
 
@@ -25,6 +49,53 @@ def test():
     }), 200
 
 
+@analytics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Lấy chỉ số runtime (ingest queue, cache, worker nền)"""
+    return jsonify({
+        'success': True,
+        'data': collect_metrics()
+    }), 200
+
+
+@analytics_bp.route('/stream', methods=['GET'])
+def stream_attacks():
+    """Live feed (Server-Sent Events): event mới và counter deltas, tối đa STREAM_MAX_RATE frame/giây"""
+
+    if event_hub is None:
+        return jsonify({
+            'success': False,
+            'message': 'Live feed chưa được bật'
+        }), 503
+
+    subscriber = event_hub.subscribe()
+    if subscriber is None:
+        return jsonify({
+            'success': False,
+            'message': 'Quá nhiều client đang kết nối live feed'
+        }), 503
+
+    def generate():
+        try:
+            yield f"retry: {Config.STREAM_RETRY_MS}\n\n"
+
+            while True:
+                frame = subscriber.get(timeout=Config.STREAM_KEEPALIVE)
+                if frame is None:
+                    # Comment giữ kết nối qua proxy
+                    yield ": keepalive\n\n"
+                    continue
+
+                yield f"id: {frame['seq']}\nevent: attacks\ndata: {json.dumps(frame, default=str)}\n\n"
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @analytics_bp.route('/stats', methods=['GET'])
 def get_stats():
     """Lấy thống kê tổng quan"""
@@ -67,38 +138,43 @@ def get_attacks():
         skip = (page - 1) * per_page
 
         # Filter params
-        filters = {}
-
-        attack_type = request.args.get('attack_type')
-        if attack_type:
-            filters['attack_type'] = attack_type
-
-        ip_address = request.args.get('ip')
-        if ip_address:
-            filters['ip_address'] = ip_address
-
-        # Date range
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-
-        if start_date:
-            try:
-                filters['start_date'] = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            except ValueError:
-                pass
-
-        if end_date:
-            try:
-                filters['end_date'] = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            except ValueError:
-                pass
+        filters = _parse_log_filters(request.args)
+
+        # Cursor pagination (after/before) và chế độ tính total
+        after = request.args.get('after')
+        before = request.args.get('before')
+        total_mode = request.args.get('total', 'exact')
+        if total_mode not in TOTAL_MODES:
+            return jsonify({
+                'success': False,
+                'message': f"total phải là một trong: {', '.join(TOTAL_MODES)}"
+            }), 400
 
         # Get data
-        result = attack_log_model.get_all(
-            limit=per_page,
-            skip=skip,
-            filters=filters if filters else None
-        )
+        try:
+            # Mặc định chỉ đọc field của bảng log; headers/payload lấy qua /attacks/<id>
+            projection = build_projection(
+                view=request.args.get('view', 'summary'),
+                fields=request.args.get('fields'),
+                summary_fields=SUMMARY_FIELDS,
+                allowed_fields=LOG_FIELDS,
+                required_fields=('timestamp',)
+            )
+
+            result = attack_log_model.get_all(
+                limit=per_page,
+                skip=skip,
+                filters=filters if filters else None,
+                after=after,
+                before=before,
+                total=total_mode,
+                projection=projection
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
 
         # Convert datetime to ISO string
         for log in result['logs']:
@@ -117,9 +193,9 @@ def get_attacks():
         }), 500
 
 
-@analytics_bp.route('/top-ips', methods=['GET'])
-def get_top_ips():
-    """Lấy top IP addresses tấn công nhiều nhất"""
+@analytics_bp.route('/attacks/<log_id>', methods=['GET'])
+def get_attack_detail(log_id):
+    """Lấy chi tiết một attack log (đầy đủ headers, payload, query params)"""
 
     if attack_log_model is None:
         return jsonify({
@@ -127,15 +203,76 @@ def get_top_ips():
             'message': 'Database chưa được kết nối'
         }), 503
 
+    try:
+        log = attack_log_model.get_by_id(log_id)
+
+        if log is None:
+            return jsonify({
+                'success': False,
+                'message': 'Không tìm thấy attack log'
+            }), 404
+
+        if 'timestamp' in log:
+            log['timestamp'] = log['timestamp'].isoformat()
+
+        return jsonify({
+            'success': True,
+            'data': log
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Lỗi lấy chi tiết tấn công: {str(e)}'
+        }), 500
+
+
+@analytics_bp.route('/top-ips', methods=['GET'])
+def get_top_ips():
+    """Lấy top IP addresses tấn công nhiều nhất
+
+    days: số ngày gần nhất. Mặc định ROLLUP_IP_TTL_DAYS khi bật rollup (count IP theo ngày chỉ giữ
+    chừng đó ngày), toàn bộ log còn giữ khi tắt rollup; response trả về `days` đã dùng.
+    source=sketch: đọc từ sketch heavy hitters trong bộ nhớ, window = hour | day | all
+    """
+
     try:
         limit = int(request.args.get('limit', 10))
 
-        stats = attack_log_model.get_stats()
-        top_ips = stats['top_ips'][:limit]
+        if request.args.get('source') == 'sketch':
+            if top_ip_tracker is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'Heavy hitters sketch chưa được bật'
+                }), 503
+
+            try:
+                sketch = top_ip_tracker.top(window=request.args.get('window', 'all'), limit=limit)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+
+            return jsonify({
+                'success': True,
+                'data': sketch['items'],
+                'sketch': {key: value for key, value in sketch.items() if key != 'items'}
+            }), 200
+
+        if attack_log_model is None:
+            return jsonify({
+                'success': False,
+                'message': 'Database chưa được kết nối'
+            }), 503
+
+        days = attack_log_model.top_ip_days(request.args.get('days', type=int))
+        top_ips = attack_log_model.get_top_ips(limit=limit, days=days)
 
         return jsonify({
             'success': True,
-            'data': top_ips
+            'data': top_ips,
+            'days': days
         }), 200
 
     except Exception as e:
@@ -145,6 +282,67 @@ def get_top_ips():
         }), 500
 
 
+@analytics_bp.route('/unique-attackers', methods=['GET'])
+def get_unique_attackers():
+    """Số IP tấn công phân biệt trong N ngày, nhóm theo endpoint hoặc attack_type"""
+
+    if attack_log_model is None:
+        return jsonify({
+            'success': False,
+            'message': 'Database chưa được kết nối'
+        }), 503
+
+    try:
+        days = int(request.args.get('days', 1))
+        group_by = request.args.get('group_by') or None
+        limit = int(request.args.get('limit', 20))
+
+        if not 1 <= days <= 365:
+            return jsonify({
+                'success': False,
+                'message': 'days phải từ 1 đến 365'
+            }), 400
+
+        if group_by not in (None, 'endpoint', 'attack_type'):
+            return jsonify({
+                'success': False,
+                'message': 'group_by phải là endpoint hoặc attack_type'
+            }), 400
+
+        if not 1 <= limit <= 1000:
+            return jsonify({
+                'success': False,
+                'message': 'limit phải từ 1 đến 1000'
+            }), 400
+
+        result = attack_log_model.get_unique_attackers(days=days, group_by=group_by, limit=limit)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'days': days,
+                'group_by': group_by,
+                'estimated': result['estimated'],
+                'total': result['total'],
+                'series': [
+                    {'day': item['day'].strftime('%Y-%m-%d'), 'unique': item['unique']}
+                    for item in result['series']
+                ],
+                'groups': [
+                    {'key': key, 'unique': count}
+                    for key, count in sorted(result['groups'].items(), key=lambda item: -item[1])
+                ],
+                'group_count': result['group_count']
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Lỗi đếm IP phân biệt: {str(e)}'
+        }), 500
+
+
 @analytics_bp.route('/attack-types', methods=['GET'])
 def get_attack_types():
     """Lấy phân loại các loại tấn công"""
@@ -156,8 +354,7 @@ def get_attack_types():
         }), 503
 
     try:
-        stats = attack_log_model.get_stats()
-        attack_types = stats['attack_types']
+        attack_types = attack_log_model.get_attack_type_counts()
 
         return jsonify({
             'success': True,
@@ -218,6 +415,16 @@ def analyze_ip(ip_address):
         }), 503
 
     try:
+        # IP đang hoạt động: trả profile trong bộ nhớ gộp với snapshot của mọi worker (một find_one theo _id),
+        # không aggregate attack_logs. Truyền hours để phân tích lịch sử từ database
+        if ip_profile_store is not None and 'hours' not in request.args:
+            profile = ip_profile_store.get(ip_address)
+            if profile is not None:
+                return jsonify({
+                    'success': True,
+                    'data': analyzer_service.analyze_ip_profile(profile)
+                }), 200
+
         hours = int(request.args.get('hours', 24))
 
         analysis = analyzer_service.analyze_ip_behavior(ip_address, hours=hours)
@@ -272,20 +479,8 @@ def get_attack_tools():
         }), 503
 
     try:
-        # Lấy tất cả logs (giới hạn)
-        result = attack_log_model.get_all(limit=1000)
-
-        # Phân tích User-Agents
-        user_agents = [log.get('user_agent', 'Unknown') for log in result['logs']]
-
-        tool_counts = {}
-        for ua in user_agents:
-            tool_name = analyzer_service.identify_attack_tools(ua)
-            tool_counts[tool_name] = tool_counts.get(tool_name, 0) + 1
-
-        # Convert to list and sort
-        tools_list = [{'tool': tool, 'count': count} for tool, count in tool_counts.items()]
-        tools_list.sort(key=lambda x: x['count'], reverse=True)
+        # Group theo field tool (ghi lúc ingest) trên toàn bộ dữ liệu
+        tools_list = attack_log_model.get_tool_stats()
 
         return jsonify({
             'success': True,
@@ -301,7 +496,7 @@ def get_attack_tools():
 
 @analytics_bp.route('/export', methods=['GET'])
 def export_logs():
-    """Export logs ra CSV format"""
+    """Export logs (csv, ndjson, parquet, arrow) stream theo cursor, hỗ trợ các filter của /attacks"""
 
     if attack_log_model is None:
         return jsonify({
@@ -309,62 +504,82 @@ def export_logs():
             'message': 'Database chưa được kết nối'
         }), 503
 
-    try:
-        # Get filters
-        filters = {}
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f"format phải là một trong: {', '.join(EXPORT_FORMATS)}"
+        }), 400
 
-        attack_type = request.args.get('attack_type')
-        if attack_type:
-            filters['attack_type'] = attack_type
+    if export_format in COLUMNAR_FORMATS and not columnar_available():
+        return jsonify({
+            'success': False,
+            'message': 'Export parquet/arrow cần cài đặt pyarrow'
+        }), 501
 
-        # Get data
-        result = attack_log_model.get_all(
-            limit=10000,  # Max export
-            filters=filters if filters else None
-        )
+    filters = _parse_log_filters(request.args)
 
-        # Convert to CSV format
-        import csv
-        import io
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Header
-        writer.writerow([
-            'Timestamp',
-            'IP Address',
-            'Method',
-            'Endpoint',
-            'Attack Type',
-            'User Agent',
-            'Country'
-        ])
-
-        # Data
-        for log in result['logs']:
-            writer.writerow([
-                log['timestamp'].isoformat() if 'timestamp' in log else '',
-                log.get('ip_address', ''),
-                log.get('method', ''),
-                log.get('endpoint', ''),
-                log.get('attack_type', ''),
-                log.get('user_agent', ''),
-                log.get('geolocation', {}).get('country', '')
-            ])
+    # Parquet/arrow đã nén theo cột, gzip chỉ áp dụng cho định dạng text
+    compress = request.args.get('compress') == 'gzip' and export_format not in COLUMNAR_FORMATS
 
-        csv_data = output.getvalue()
-
-        return jsonify({
-            'success': True,
-            'data': {
-                'csv': csv_data,
-                'total_records': len(result['logs'])
-            }
-        }), 200
+    def generate():
+        logs = attack_log_model.iter_logs(
+            filters=filters if filters else None,
+            projection=CSV_PROJECTION if export_format == 'csv' else RECORD_PROJECTION,
+            batch_size=Config.EXPORT_BATCH_SIZE
+        )
 
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'message': f'Lỗi export: {str(e)}'
-        }), 500
+        try:
+            if export_format == 'csv':
+                yield from encode_stream(stream_csv(logs, chunk_bytes=Config.EXPORT_CHUNK_BYTES), compress=compress)
+            elif export_format == 'ndjson':
+                yield from encode_stream(stream_ndjson(logs, chunk_bytes=Config.EXPORT_CHUNK_BYTES), compress=compress)
+            else:
+                yield from stream_columnar(logs, export_format, batch_rows=Config.EXPORT_RECORD_BATCH_ROWS)
+        except Exception as e:
+            # Header 200 đã gửi đi: raise lại để server hủy response chunked,
+            # client thấy kết nối bị cắt thay vì một file thiếu dữ liệu nhưng kết thúc bình thường
+            print(f"[ERROR] Loi export: {str(e)}")
+            raise
+
+    mimetype, extension = FORMAT_MEDIA[export_format]
+    filename = f"attack-logs-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+def _parse_log_filters(args):
+    """Đọc filter attack_type, ip, start_date, end_date từ query string"""
+    filters = {}
+
+    attack_type = args.get('attack_type')
+    if attack_type:
+        filters['attack_type'] = attack_type
+
+    ip_address = args.get('ip')
+    if ip_address:
+        filters['ip_address'] = ip_address
+
+    # Date range
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+
+    if start_date:
+        try:
+            filters['start_date'] = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+
+    if end_date:
+        try:
+            filters['end_date'] = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+
+    return filters
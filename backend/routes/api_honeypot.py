@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from services.logger import AttackLogger
 from services.web3_service import Web3Service
-from models.wallet import Wallet
+from models.wallet import Wallet, SUMMARY_FIELDS, WALLET_FIELDS
+from utils.projection import build_projection
 
 honeypot_bp = Blueprint('honeypot', __name__, url_prefix='/api')
 
@@ -32,7 +33,22 @@ def list_wallets():
         limit = request.args.get('limit', 100, type=int)
         skip = request.args.get('skip', 0, type=int)
 
-        result = wallet_model.get_all(limit=limit, skip=skip)
+        # Mặc định trả đủ field (bait cho attacker); dashboard truyền view=summary và lấy chi tiết
+        # ví qua /wallet/<address>
+        try:
+            projection = build_projection(
+                view=request.args.get('view', 'full'),
+                fields=request.args.get('fields'),
+                summary_fields=SUMMARY_FIELDS,
+                allowed_fields=WALLET_FIELDS
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+
+        result = wallet_model.get_all(limit=limit, skip=skip, projection=projection)
 
         return jsonify({
             'success': True,
@@ -88,9 +104,7 @@ def delete_wallet(address):
         }), 503
 
     try:
-        result = wallet_model.collection.delete_one({'address': address})
-
-        if result.deleted_count > 0:
+        if wallet_model.delete(address):
             return jsonify({
                 'success': True,
                 'message': 'Đã xóa ví thành công'
@@ -6,15 +6,22 @@ settings_bp = Blueprint('settings', __name__, url_prefix='/api/settings')
 # Global variables
 db = None
 settings_collection = None
+db_health = None
 
-def init_settings_routes(database):
-    """Initialize routes with database"""
-    global db, settings_collection
+def init_settings_routes(database, health=None):
+    """Initialize routes with database (health: kiem tra MongoDB online o moi request)"""
+    global db, settings_collection, db_health
     db = database
+    db_health = health
     if db is not None:
         settings_collection = db['settings']
-        # Tao default settings neu chua co
-        _ensure_default_settings()
+        # Tao default settings neu chua co (MongoDB down luc khoi dong thi tao o request dau tien)
+        if _db_available():
+            _ensure_default_settings()
+
+
+def _db_available():
+    return settings_collection is not None and (db_health is None or db_health.is_online())
 
 
 def _ensure_default_settings():
@@ -51,7 +58,7 @@ def _ensure_default_settings():
 def get_settings():
     """Lay tat ca settings"""
 
-    if settings_collection is None:
+    if not _db_available():
         return jsonify({
             'success': False,
             'message': 'Database chua duoc ket noi'
@@ -86,7 +93,7 @@ def get_settings():
 def save_settings():
     """Luu settings"""
 
-    if settings_collection is None:
+    if not _db_available():
         return jsonify({
             'success': False,
             'message': 'Database chua duoc ket noi'
@@ -189,7 +196,7 @@ def _validate_settings(data):
 
         if 'default_format' in export_settings:
             format_val = export_settings['default_format']
-            if format_val not in ['csv', 'json', 'pdf']:
+            if format_val not in ['csv', 'json', 'pdf', 'ndjson', 'parquet', 'arrow']:
                 raise ValueError('Dinh dang xuat khong hop le')
             validated['export']['default_format'] = format_val
 
@@ -200,7 +207,7 @@ def _validate_settings(data):
 def get_database_settings():
     """Lay database settings"""
 
-    if settings_collection is None:
+    if not _db_available():
         return jsonify({
             'success': False,
             'message': 'Database chua duoc ket noi'
@@ -225,7 +232,7 @@ def get_database_settings():
 def get_honeypot_settings():
     """Lay honeypot settings"""
 
-    if settings_collection is None:
+    if not _db_available():
         return jsonify({
             'success': False,
             'message': 'Database chua duoc ket noi'
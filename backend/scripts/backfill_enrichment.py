@@ -0,0 +1,64 @@
+"""
+Script để backfill geolocation và tool cho attack logs lịch sử
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from config import Config
+from models.attack_log import AttackLog
+from services.analyzer import AttackAnalyzer
+from services.enrichment import EnrichmentWorker
+from utils.ip_tracker import IPTracker
+
+def backfill_enrichment(batch_size=500, workers=4):
+    """Làm giàu toàn bộ log còn geolocation 'Unknown' hoặc thiếu tool"""
+
+    print("[INFO] Dang backfill enrichment cho attack logs...")
+
+    try:
+        # Connect to MongoDB
+        mongo_client = MongoClient(Config.MONGODB_URI)
+        db = mongo_client[Config.MONGODB_DB]
+
+        # Test connection
+        mongo_client.server_info()
+        print(f"[OK] Ket noi MongoDB thanh cong")
+
+        attack_log_model = AttackLog(db)
+        worker = EnrichmentWorker(
+            attack_log_model,
+            IPTracker(),
+            AttackAnalyzer(attack_log_model),
+            batch_size=batch_size,
+            workers=workers
+        )
+
+        # Xử lý event đang pending trước, sau đó tới dữ liệu lịch sử
+        while worker.process_pending():
+            pass
+
+        while worker.backfill_batch():
+            print(f"  [OK] Da xu ly {worker.backfilled} logs...")
+
+        worker.stop()
+
+        print(f"\n[OK] Backfill hoan tat: {worker.enriched} pending, {worker.backfilled} lich su, "
+              f"{worker.lookups} lan tra cuu IP")
+
+    except Exception as e:
+        print(f"[ERROR] Loi: {str(e)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Backfill geolocation và tool cho attack logs')
+    parser.add_argument('--batch-size', type=int, default=500, help='Số log mỗi lô')
+    parser.add_argument('--workers', type=int, default=4, help='Số thread tra cứu geolocation')
+
+    args = parser.parse_args()
+
+    backfill_enrichment(args.batch_size, args.workers)
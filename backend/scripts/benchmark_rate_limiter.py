@@ -0,0 +1,40 @@
+"""
+Script benchmark rate limiter với nhiều IP phân biệt
+"""
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.rate_limiter import SlidingWindowRateLimiter
+
+def benchmark_rate_limiter(key_counts=(1000, 10000, 100000), checks=200000, max_requests=100):
+    """Đo chi phí mỗi lần check (µs) khi số IP phân biệt tăng dần"""
+
+    for key_count in key_counts:
+        limiter = SlidingWindowRateLimiter(max_keys=max(key_counts) * 2)
+        ips = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(key_count)]
+
+        # Làm nóng: mọi IP đã có state
+        now = time.time()
+        for ip in ips:
+            limiter.is_allowed(ip, max_requests, 60, now=now)
+
+        started = time.perf_counter()
+        for i in range(checks):
+            limiter.is_allowed(ips[i % key_count], max_requests, 60)
+        elapsed = time.perf_counter() - started
+
+        print(f"[INFO] {key_count:>7} IP: {elapsed / checks * 1e6:.2f} us/check, {len(limiter)} keys")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark rate limiter')
+    parser.add_argument('--checks', type=int, default=200000, help='Số lần check mỗi cấu hình')
+
+    args = parser.parse_args()
+
+    benchmark_rate_limiter(checks=args.checks)
@@ -0,0 +1,86 @@
+"""
+Script benchmark rule engine trên attack logs đã lưu
+"""
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from config import Config
+from models.attack_log import AttackLog
+from services.rule_engine import RuleEngine
+
+def benchmark_rules(limit=10000, repeat=3, rules_path=None):
+    """Đo tốc độ phân loại (events/s) trên các log gần nhất"""
+
+    rules_path = rules_path or Config.RULES_PATH
+
+    try:
+        # Connect to MongoDB
+        mongo_client = MongoClient(Config.MONGODB_URI)
+        db = mongo_client[Config.MONGODB_DB]
+
+        # Test connection
+        mongo_client.server_info()
+        print(f"[OK] Ket noi MongoDB thanh cong")
+
+        attack_log_model = AttackLog(db)
+        events = []
+        for collection in attack_log_model.partitions.collections_for():
+            events.extend(collection.find(
+                {},
+                {'endpoint': 1, 'method': 1, 'headers': 1, 'header_fp': 1, 'query_params': 1, 'payload': 1}
+            ).sort('timestamp', -1).limit(limit - len(events)))
+            if len(events) >= limit:
+                break
+        attack_log_model._rehydrate_headers(events)
+
+        if not events:
+            print("[WARNING] Khong co attack logs de benchmark")
+            return
+
+        started = time.perf_counter()
+        engine = RuleEngine(rules_path)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        print(f"[INFO] {len(engine.rules)} rules, {engine.get_metrics()['automaton_states']} states, "
+              f"compile {compile_ms:.1f} ms")
+        print(f"[INFO] Benchmark tren {len(events)} events x {repeat} lan")
+
+        best = 0
+        type_counts = {}
+
+        for run in range(repeat):
+            started = time.perf_counter()
+            for event in events:
+                result = engine.classify(event)
+                if run == 0:
+                    key = result['attack_type'] or 'unmatched'
+                    type_counts[key] = type_counts.get(key, 0) + 1
+            elapsed = time.perf_counter() - started
+
+            rate = len(events) / elapsed
+            best = max(best, rate)
+            print(f"  [RUN {run + 1}] {rate:,.0f} events/s ({elapsed * 1e6 / len(events):.1f} us/event)")
+
+        print(f"\n[OK] Toc do tot nhat: {best:,.0f} events/s")
+        for attack_type, count in sorted(type_counts.items(), key=lambda x: -x[1]):
+            print(f"  {attack_type}: {count}")
+
+    except Exception as e:
+        print(f"[ERROR] Loi: {str(e)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark rule engine trên attack logs')
+    parser.add_argument('--limit', type=int, default=10000, help='Số log gần nhất dùng để benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần chạy')
+    parser.add_argument('--rules', default=None, help='Đường dẫn rules file (mặc định Config.RULES_PATH)')
+
+    args = parser.parse_args()
+
+    benchmark_rules(args.limit, args.repeat, args.rules)
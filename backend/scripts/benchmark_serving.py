@@ -0,0 +1,101 @@
+"""
+Script đo throughput HTTP của server đang chạy (dev server hoặc gunicorn)
+
+Cách đo (1 CPU, 16 kết nối, 8 giây, FLASK_ENV=production, gunicorn mặc định 2 worker gthread x 32 thread):
+
+    python app.py                                          # dev server, FLASK_PORT=5055
+    gunicorn -c gunicorn.conf.py wsgi:application          # GUNICORN_BIND=127.0.0.1:5056
+    python scripts/benchmark_serving.py "http://127.0.0.1:5056/api/wallet/balance?address=0x742d35Cc6634C0532925a3b844Bc454e4438f44e"
+    python scripts/benchmark_serving.py http://127.0.0.1:5056/api/wallet/list
+
+Kết quả đo được (MongoDB KHÔNG chạy: môi trường build không có mongod):
+
+    route                      dev server                  gunicorn
+    /health                    705.5 req/s, p99 62.7 ms    822.6 req/s, p99 51.8 ms
+    /api/analytics/test        504.1 req/s, p99 91.1 ms    776.6 req/s, p99 81.6 ms
+    /api/wallet/balance        667.8 req/s, p99 71.1 ms    778.8 req/s, p99 69.6 ms
+    /api/wallet/list           518.6 req/s, p99 65.6 ms    621.3 req/s, p99 79.2 ms
+
+/api/wallet/balance đi hết đường ingest (capture request, ingest queue) nhưng batch được ghi vào spool
+trên đĩa thay cho insert_many; /api/wallet/list trả ví giả khi offline. Các số trên chỉ đo tầng HTTP,
+không phải throughput khi có MongoDB. Chưa đo với MongoDB: chạy lại các lệnh trên với MONGODB_URI trỏ
+tới một mongod (thêm /api/wallet/<address> của một ví có thật) và cập nhật bảng này.
+"""
+import sys
+import os
+import threading
+import time
+import http.client
+from urllib.parse import urlsplit
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _worker(url, deadline, latencies, errors, statuses):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            statuses.append(response.status)
+            if response.status >= 500:
+                errors.append(response.status)
+            # Server đóng kết nối (HTTP/1.0): mở lại cho request sau
+            if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                conn.close()
+        except Exception as e:
+            errors.append(str(e))
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+
+    conn.close()
+
+def benchmark_serving(url, concurrency=16, duration=10):
+    """Gửi request GET song song trong `duration` giây, in req/s và latency p50/p99"""
+
+    latencies, errors, statuses = [], [], []
+    deadline = time.perf_counter() + duration
+
+    threads = [
+        threading.Thread(target=_worker, args=(url, deadline, latencies, errors, statuses))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print(f"[ERROR] Khong co request thanh cong ({len(errors)} loi)")
+        return
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+
+    print(f"[INFO] {url} concurrency={concurrency} duration={duration}s")
+    print(f"[OK] {len(latencies) / elapsed:.1f} req/s, p50 {p50:.2f} ms, p99 {p99:.2f} ms, {len(errors)} loi")
+    # Response 3xx/4xx (vd. 429 rate limit) vẫn tính vào req/s, cần kiểm tra trước khi so sánh
+    non_2xx = sum(1 for status in statuses if status >= 300)
+    if non_2xx:
+        print(f"[WARNING] {non_2xx} response khong phai 2xx")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Đo throughput HTTP của server')
+    parser.add_argument('url', help='URL cần đo, vd. http://localhost:5000/health')
+    parser.add_argument('--concurrency', type=int, default=16, help='Số kết nối song song')
+    parser.add_argument('--duration', type=int, default=10, help='Thời gian đo (giây)')
+
+    args = parser.parse_args()
+
+    benchmark_serving(args.url, concurrency=args.concurrency, duration=args.duration)
@@ -0,0 +1,76 @@
+"""
+Script để chuyển headers inline của attack logs cũ sang collection header_sets
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient, UpdateOne
+from config import Config
+from models.header_set import HeaderSet
+from models.partition import PartitionScheme
+
+def compact_headers(batch_size=1000):
+    """Thay headers inline bằng header_fp cho toàn bộ log cũ"""
+
+    print("[INFO] Dang compact headers cua attack logs...")
+
+    try:
+        # Connect to MongoDB
+        mongo_client = MongoClient(Config.MONGODB_URI)
+        db = mongo_client[Config.MONGODB_DB]
+
+        # Test connection
+        mongo_client.server_info()
+        print(f"[OK] Ket noi MongoDB thanh cong")
+
+        header_sets = HeaderSet(db)
+        partitions = PartitionScheme(db, 'attack_logs', Config.ATTACK_LOG_PARTITION)
+        compacted = 0
+
+        for collection in partitions.collections_for(newest_first=False):
+            cursor = collection.find(
+                {'headers': {'$exists': True}},
+                {'headers': 1, 'user_agent': 1}
+            ).batch_size(batch_size)
+
+            operations = []
+
+            for log in cursor:
+                headers = log.get('headers') or {}
+                update = {
+                    '$set': {'header_fp': header_sets.store(headers)},
+                    '$unset': {'headers': ''}
+                }
+                if log.get('user_agent') == headers.get('User-Agent', 'Unknown'):
+                    update['$unset']['user_agent'] = ''
+
+                operations.append(UpdateOne({'_id': log['_id']}, update))
+
+                if len(operations) >= batch_size:
+                    collection.bulk_write(operations, ordered=False)
+                    compacted += len(operations)
+                    operations = []
+                    print(f"  [OK] Da compact {compacted} logs...")
+
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+                compacted += len(operations)
+
+        print(f"\n[OK] Compact hoan tat: {compacted} logs, "
+              f"{header_sets.collection.count_documents({})} header sets")
+
+    except Exception as e:
+        print(f"[ERROR] Loi: {str(e)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chuyển headers inline sang header_sets')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Số log mỗi lô')
+
+    args = parser.parse_args()
+
+    compact_headers(args.batch_size)
@@ -0,0 +1,88 @@
+"""
+Script để chuyển attack_logs (một collection) sang các partition theo thời gian
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from config import Config
+from models.attack_log import AttackLog, DUPLICATE_KEY_ERROR
+
+def partition_attack_logs(batch_size=5000, drop=False):
+    """Copy log từ collection gốc vào partition tương ứng, chạy lại an toàn (bỏ qua _id đã có)"""
+
+    if Config.ATTACK_LOG_PARTITION == 'none':
+        print("[ERROR] ATTACK_LOG_PARTITION=none, dat month hoac week truoc khi chuyen")
+        return
+
+    print(f"[INFO] Dang chuyen attack_logs sang partition theo {Config.ATTACK_LOG_PARTITION}...")
+
+    try:
+        # Connect to MongoDB
+        mongo_client = MongoClient(Config.MONGODB_URI)
+        db = mongo_client[Config.MONGODB_DB]
+
+        # Test connection
+        mongo_client.server_info()
+        print(f"[OK] Ket noi MongoDB thanh cong")
+
+        attack_log_model = AttackLog(db)
+        partitions = attack_log_model.partitions
+        source = attack_log_model.collection
+
+        copied = 0
+        batches = {}
+
+        def flush(name):
+            nonlocal copied
+            entries = batches.pop(name)
+            try:
+                partitions.collection_for_write(entries[0]['timestamp']).insert_many(entries, ordered=False)
+            except BulkWriteError as e:
+                if any(error.get('code') != DUPLICATE_KEY_ERROR for error in e.details.get('writeErrors', [])):
+                    raise
+            copied += len(entries)
+
+        for entry in source.find({'timestamp': {'$type': 'date'}}).sort('_id', 1).batch_size(batch_size):
+            name = partitions.name_for(entry['timestamp'])
+            batches.setdefault(name, []).append(entry)
+
+            if len(batches[name]) >= batch_size:
+                flush(name)
+                print(f"  [OK] Da chuyen {copied} logs...")
+
+        for name in list(batches):
+            flush(name)
+
+        print(f"\n[OK] Da chuyen {copied} logs vao {len(partitions.partitions())} partition")
+
+        # Log không có timestamp kiểu date không được chuyển, drop sẽ làm mất chúng
+        skipped = source.count_documents({'timestamp': {'$not': {'$type': 'date'}}})
+        if skipped:
+            print(f"[WARNING] {skipped} logs khong co timestamp hop le, khong duoc chuyen sang partition")
+
+        if drop and skipped:
+            print("[ERROR] Khong xoa collection attack_logs goc vi con logs chua chuyen, sua timestamp roi chay lai")
+        elif drop:
+            source.drop()
+            print("[OK] Da xoa collection attack_logs goc")
+        else:
+            print("[INFO] Collection goc van con, chay lai voi --drop sau khi kiem tra")
+
+    except Exception as e:
+        print(f"[ERROR] Loi: {str(e)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Chuyển attack_logs sang partition theo tháng/tuần')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Số log mỗi lô')
+    parser.add_argument('--drop', action='store_true', help='Xóa collection gốc sau khi chuyển')
+
+    args = parser.parse_args()
+
+    partition_attack_logs(batch_size=args.batch_size, drop=args.drop)
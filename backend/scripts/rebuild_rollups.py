@@ -0,0 +1,55 @@
+"""
+Script để dựng lại rollup thống kê từ attack_logs
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from config import Config
+from models.attack_rollup import AttackRollup
+from models.partition import PartitionScheme
+
+def rebuild_rollups(batch_size=5000):
+    """Xóa và dựng lại rollup phút/giờ/ngày, tổng và top IP"""
+
+    print("[INFO] Dang dung lai rollup thong ke...")
+    print("[WARNING] Nen dung honeypot khi chay: event ghi trong luc rebuild co the bi dem hai lan")
+
+    try:
+        # Connect to MongoDB
+        mongo_client = MongoClient(Config.MONGODB_URI)
+        db = mongo_client[Config.MONGODB_DB]
+
+        # Test connection
+        mongo_client.server_info()
+        print(f"[OK] Ket noi MongoDB thanh cong")
+
+        rollups = AttackRollup(
+            db,
+            minute_ttl=Config.ROLLUP_MINUTE_TTL_HOURS * 3600,
+            hour_ttl=Config.ROLLUP_HOUR_TTL_DAYS * 86400,
+            ip_top_n=Config.ROLLUP_IP_TOP_N,
+            ip_ttl=Config.ROLLUP_IP_TTL_DAYS * 86400,
+            hll_precision=Config.UNIQUE_HLL_PRECISION,
+            unique_max_keys=Config.UNIQUE_MAX_KEYS_PER_DAY
+        )
+        partitions = PartitionScheme(db, 'attack_logs', Config.ATTACK_LOG_PARTITION)
+        processed = rollups.rebuild(partitions.collections_for(newest_first=False), batch_size=batch_size)
+
+        print(f"\n[OK] Da dung lai rollup tu {processed} attack logs")
+
+    except Exception as e:
+        print(f"[ERROR] Loi: {str(e)}")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Dựng lại rollup thống kê từ attack_logs')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Số log mỗi lô')
+
+    args = parser.parse_args()
+
+    rebuild_rollups(batch_size=args.batch_size)
@@ -1,5 +1,12 @@
 from .logger import AttackLogger
 from .web3_service import Web3Service
 from .analyzer import AttackAnalyzer
+from .ingest_queue import IngestQueue
+from .enrichment import EnrichmentWorker
+from .rule_engine import RuleEngine
+from .event_hub import EventHub
+from .retention import RetentionWorker
+from .ip_profiles import IPProfileStore
+from .heavy_hitters import TopIPTracker
 
-__all__ = ['AttackLogger', 'Web3Service', 'AttackAnalyzer']
+__all__ = ['AttackLogger', 'Web3Service', 'AttackAnalyzer', 'IngestQueue', 'EnrichmentWorker', 'RuleEngine', 'EventHub', 'RetentionWorker', 'IPProfileStore', 'TopIPTracker']
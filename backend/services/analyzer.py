@@ -1,5 +1,9 @@
 from datetime import datetime, timedelta
-from collections import Counter
+from config import Config
+from utils.tool_matcher import tool_matcher
+
+# Độ rộng bucket (giây) cho request rate: 1 phút, 5 phút, 15 phút, 1 giờ, 6 giờ, 1 ngày
+RATE_BUCKETS = (60, 300, 900, 3600, 21600, 86400)
 
 class AttackAnalyzer:
     """Service để phân tích attack patterns"""
@@ -11,35 +15,23 @@ class AttackAnalyzer:
         """Phân tích hành vi của một IP trong X giờ"""
 
         start_time = datetime.utcnow() - timedelta(hours=hours)
+        bucket_seconds = self._rate_bucket_seconds(hours)
 
-        # Lấy tất cả logs của IP này
-        result = self.attack_log.get_all(
-            limit=1000,
-            filters={
-                'ip_address': ip_address,
-                'start_date': start_time
-            }
-        )
+        # Đếm toàn bộ event của IP phía MongoDB (không giới hạn số log)
+        activity = self.attack_log.get_ip_activity(ip_address, start_time, bucket_seconds=bucket_seconds)
 
-        logs = result['logs']
+        total_requests = activity['total']
 
-        if not logs:
+        if not total_requests:
             return {
                 'ip_address': ip_address,
                 'total_requests': 0,
                 'is_suspicious': False
             }
 
-        # Phân tích
-        total_requests = len(logs)
-        endpoints = [log['endpoint'] for log in logs]
-        attack_types = [log['attack_type'] for log in logs]
-        methods = [log['method'] for log in logs]
-
-        # Tính frequency
-        endpoint_counter = Counter(endpoints)
-        attack_type_counter = Counter(attack_types)
-        method_counter = Counter(methods)
+        endpoint_counter = activity['endpoints']
+        attack_type_counter = activity['attack_types']
+        method_counter = activity['methods']
 
         # Đánh giá suspicious
         is_suspicious = False
@@ -61,21 +53,74 @@ class AttackAnalyzer:
             is_suspicious = True
             reasons.append(f'Spam endpoint: {most_common_endpoint} ({endpoint_count} lần)')
 
+        rate = [
+            {'timestamp': bucket.isoformat(), 'count': count}
+            for bucket, count in sorted(activity['rate'].items())
+        ]
+
         return {
             'ip_address': ip_address,
             'total_requests': total_requests,
-            'unique_endpoints': len(endpoint_counter),
+            'unique_endpoints': activity['unique_endpoints'],
+            'unique_endpoints_approximate': activity['unique_endpoints_approximate'],
+            'endpoints': dict(endpoint_counter.most_common()),
             'attack_types': dict(attack_type_counter),
             'methods': dict(method_counter),
             'most_targeted_endpoint': most_common_endpoint,
+            'request_rate': {
+                'bucket_seconds': bucket_seconds,
+                'peak': max(item['count'] for item in rate),
+                'series': rate
+            },
             'is_suspicious': is_suspicious,
             'suspicious_reasons': reasons,
             'time_range_hours': hours
         }
 
+    @staticmethod
+    def analyze_ip_profile(profile):
+        """Đánh giá IP từ profile trong bộ nhớ (IPProfileStore.get)"""
+        window_minutes = profile['window_seconds'] // 60
+        reasons = []
+
+        # Quá nhiều requests trong window gần nhất
+        if profile['window_requests'] > 100:
+            reasons.append(f"Quá nhiều requests: {profile['window_requests']} trong {window_minutes} phút")
+
+        # Nhiều loại tấn công khác nhau
+        if len(profile['attack_types']) > 3:
+            reasons.append(f"Thử nhiều loại tấn công: {len(profile['attack_types'])}")
+
+        # Quét nhiều endpoint (ước lượng HyperLogLog)
+        if profile['unique_endpoints'] > 50:
+            reasons.append(f"Quét nhiều endpoint: ~{profile['unique_endpoints']}")
+
+        return {
+            **profile,
+            'first_seen': profile['first_seen'].isoformat(),
+            'last_seen': profile['last_seen'].isoformat(),
+            'source': 'memory',
+            'is_suspicious': bool(reasons),
+            'suspicious_reasons': reasons
+        }
+
+    @staticmethod
+    def _rate_bucket_seconds(hours):
+        """Chọn độ rộng bucket để series có tối đa ~60 điểm"""
+        for seconds in RATE_BUCKETS:
+            if hours * 3600 / seconds <= 60:
+                return seconds
+        return RATE_BUCKETS[-1]
+
     def get_attack_trends(self, days=7):
         """Phân tích xu hướng tấn công"""
+        return self.attack_log.cached(
+            ('trends', days),
+            lambda: self._get_attack_trends(days),
+            ttl=Config.STATS_CACHE_TIMELINE_TTL
+        )
 
+    def _get_attack_trends(self, days):
         timeline = self.attack_log.get_timeline(days=days)
 
         if not timeline:
@@ -113,33 +158,4 @@ class AttackAnalyzer:
 
     def identify_attack_tools(self, user_agent):
         """Nhận diện công cụ tấn công từ User-Agent"""
-
-        user_agent_lower = user_agent.lower()
-
-        known_tools = {
-            'python-requests': 'Python Requests Library',
-            'curl': 'cURL Command Line',
-            'postman': 'Postman API Client',
-            'insomnia': 'Insomnia API Client',
-            'axios': 'Axios (JavaScript)',
-            'httpie': 'HTTPie',
-            'wget': 'Wget',
-            'scrapy': 'Scrapy Web Scraper',
-            'selenium': 'Selenium Automation',
-            'nikto': 'Nikto Web Scanner',
-            'nmap': 'Nmap Network Scanner',
-            'sqlmap': 'SQLMap',
-            'burp': 'Burp Suite',
-            'metasploit': 'Metasploit Framework',
-            'w3af': 'W3AF Security Scanner'
-        }
-
-        for tool_key, tool_name in known_tools.items():
-            if tool_key in user_agent_lower:
-                return tool_name
-
-        # Nếu không match, check browser
-        if 'chrome' in user_agent_lower or 'firefox' in user_agent_lower or 'safari' in user_agent_lower:
-            return 'Web Browser'
-
-        return 'Unknown Tool'
+        return tool_matcher.identify(user_agent)
@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pymongo import UpdateMany
+
+# Document trong collection settings lưu vị trí backfill (dùng chung giữa các process nhận lease)
+STATE_ID = 'enrichment_state'
+
+
+class EnrichmentWorker:
+    """Worker nền làm giàu attack log (geolocation, tool) sau khi event đã được lưu
+
+    Nhiều process cùng chạy thì chỉ process có is_leader() (JobLease) xử lý: các lô đọc cùng event
+    pending, chạy song song sẽ cộng chuyển country vào rollup nhiều lần.
+    Vị trí backfill được lưu vào state_collection (settings) sau mỗi lô và đọc lại mỗi lần nhận lease,
+    để restart hay đổi leader không quét lại log lịch sử từ đầu (query "thiếu enrichment" không có index).
+    """
+
+    def __init__(self, attack_log_model, ip_tracker, analyzer, batch_size=500,
+                 workers=4, poll_interval=1.0, backfill=True, is_leader=None, state_collection=None):
+        self.attack_log = attack_log_model
+        self.ip_tracker = ip_tracker
+        self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.backfill_enabled = backfill
+        self.is_leader = is_leader or (lambda: True)
+        self.state = state_collection
+        self.leader = False
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrichment')
+        self._workers = workers
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Vị trí backfill hiện tại (theo _id tăng dần)
+        self._backfill_after = None
+        self.backfill_done = False
+
+        # Counters
+        self.enriched = 0
+        self.backfilled = 0
+        self.lookups = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_batch_ms = 0.0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='enrichment', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        self._pool.shutdown(wait=False)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            # MongoDB đang down (event nằm trong spool): chờ kết nối lại
+            if not self.attack_log.is_online():
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            # Process khác đang giữ lease enrichment
+            if not self.is_leader():
+                self.leader = False
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            # Vừa nhận lease: vị trí backfill có thể đã được process giữ lease trước đó cập nhật
+            if not self.leader:
+                self.leader = True
+                self._load_state()
+
+            try:
+                processed = self.process_pending()
+
+                # Rảnh thì backfill dữ liệu lịch sử
+                if not processed and self.backfill_enabled and not self.backfill_done:
+                    processed = self.backfill_batch()
+
+            except Exception as e:
+                print(f"[ERROR] Loi enrichment: {str(e)}")
+                self.errors += 1
+                processed = 0
+
+            if not processed:
+                self._stop_event.wait(self.poll_interval)
+
+    def process_pending(self):
+        """Xử lý một lô event đang chờ enrichment, trả về số event đã xử lý"""
+        events = self.attack_log.find_pending_enrichment(limit=self.batch_size)
+        if not events:
+            return 0
+
+        self._enrich(events)
+        self.enriched += len(events)
+        return len(events)
+
+    def backfill_batch(self):
+        """Làm giàu một lô log lịch sử còn geolocation 'Unknown' hoặc thiếu tool"""
+        events = self.attack_log.find_unenriched(after_id=self._backfill_after, limit=self.batch_size)
+        if not events:
+            self.backfill_done = True
+            self._save_state()
+            return 0
+
+        self._enrich(events)
+        self._backfill_after = events[-1]['_id']
+        self.backfilled += len(events)
+        self._save_state()
+        return len(events)
+
+    def _load_state(self):
+        """Khôi phục vị trí backfill đã lưu"""
+        if self.state is None:
+            return
+
+        try:
+            state = self.state.find_one({'_id': STATE_ID}) or {}
+        except Exception as e:
+            print(f"[WARNING] Khong doc duoc vi tri backfill enrichment: {str(e)}")
+            return
+
+        self._backfill_after = state.get('backfill_after')
+        self.backfill_done = state.get('backfill_done', False)
+
+    def _save_state(self):
+        if self.state is None:
+            return
+
+        self.state.update_one(
+            {'_id': STATE_ID},
+            {'$set': {
+                'backfill_after': self._backfill_after,
+                'backfill_done': self.backfill_done,
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    def _enrich(self, events):
+        started = time.perf_counter()
+
+        # Gom theo IP: mỗi IP chỉ tra cứu một lần cho cả lô
+        ids_by_ip = defaultdict(list)
+        ids_by_user_agent = defaultdict(list)
+
+        for event in events:
+            ids_by_ip[event.get('ip_address')].append(event['_id'])
+            if 'tool' not in event:
+                ids_by_user_agent[event.get('user_agent') or 'Unknown'].append(event['_id'])
+
+        ips = list(ids_by_ip.keys())
+        locations = list(self._pool.map(self.ip_tracker.get_geolocation, ips))
+        self.lookups += len(ips)
+
+        # Country cũ -> mới của từng event để cập nhật rollup
+        location_by_ip = dict(zip(ips, locations))
+        country_changes = [
+            (
+                event.get('timestamp'),
+                (event.get('geolocation') or {}).get('country'),
+                (location_by_ip[event.get('ip_address')] or {}).get('country')
+            )
+            for event in events
+        ]
+
+        now = datetime.utcnow()
+        operations = []
+
+        for ip, location in zip(ips, locations):
+            operations.append(UpdateMany(
+                {'_id': {'$in': ids_by_ip[ip]}},
+                {
+                    '$set': {'geolocation': location, 'enriched_at': now},
+                    '$unset': {'enrichment_pending': ''}
+                }
+            ))
+
+        for user_agent, ids in ids_by_user_agent.items():
+            operations.append(UpdateMany(
+                {'_id': {'$in': ids}},
+                {'$set': {'tool': self.analyzer.identify_attack_tools(user_agent)}}
+            ))
+
+        # Khoảng thời gian của lô để chỉ ghi vào các partition liên quan
+        timestamps = [event['timestamp'] for event in events if event.get('timestamp')]
+        time_range = (min(timestamps), max(timestamps)) if len(timestamps) == len(events) else None
+
+        self.attack_log.apply_enrichment(operations, country_changes, time_range)
+
+        self.batches += 1
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def get_metrics(self):
+        return {
+            'pending': self.attack_log.count_pending_enrichment() if self.attack_log.is_online() else None,
+            'enriched': self.enriched,
+            'backfilled': self.backfilled,
+            'backfill_done': self.backfill_done,
+            'backfill_after': str(self._backfill_after) if self._backfill_after else None,
+            'unique_ip_lookups': self.lookups,
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_batch_ms': self.last_batch_ms,
+            'workers': self._workers,
+            'leader': self.is_leader(),
+            'running': self._thread is not None and self._thread.is_alive()
+        }
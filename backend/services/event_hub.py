@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+
+class Subscriber:
+    """Một client đang nghe stream, có buffer frame giới hạn"""
+
+    def __init__(self, buffer_size):
+        self.frames = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def get(self, timeout=None):
+        """Lấy frame tiếp theo, trả về None nếu hết timeout"""
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    """Hub publish/subscribe trong process: gom event mới và phát frame tới các subscriber tối đa max_rate lần/giây"""
+
+    def __init__(self, max_rate=2, buffer_size=32, max_events_per_frame=20, max_subscribers=100):
+        self.interval = 1.0 / max_rate
+        self.buffer_size = buffer_size
+        self.max_events_per_frame = max_events_per_frame
+        self.max_subscribers = max_subscribers
+
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Event chờ phát ở frame tiếp theo: chỉ giữ max_events_per_frame event mới nhất
+        self._pending_events = deque(maxlen=max_events_per_frame)
+        self._pending_total = 0
+        self._pending_types = Counter()
+
+        # Counters
+        self.seq = 0
+        self.published = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def publish(self, summary):
+        """Ghi nhận một event mới (không chặn, không I/O)"""
+        with self._lock:
+            self.published += 1
+
+            # Không có ai nghe thì bỏ qua
+            if not self._subscribers:
+                return
+
+            self._pending_total += 1
+            self._pending_types[summary.get('attack_type')] += 1
+            self._pending_events.append(summary)
+
+    def subscribe(self):
+        """Đăng ký subscriber mới, trả về None khi đã đủ số lượng tối đa"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+
+            subscriber = Subscriber(self.buffer_size)
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+            if not self._subscribers:
+                self._reset_pending()
+
+    def _reset_pending(self):
+        self._pending_events = deque(maxlen=self.max_events_per_frame)
+        self._pending_total = 0
+        self._pending_types = Counter()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Phát các event đã gom thành một frame (events mới nhất + counter deltas)"""
+        with self._lock:
+            if not self._pending_total:
+                return
+
+            self.seq += 1
+            frame = {
+                'seq': self.seq,
+                'events': list(reversed(self._pending_events)),
+                'deltas': {
+                    'total': self._pending_total,
+                    'attack_types': dict(self._pending_types)
+                },
+                'sent_at': time.time()
+            }
+            self._reset_pending()
+            subscribers = list(self._subscribers)
+
+        sent = dropped = 0
+        for subscriber in subscribers:
+            try:
+                subscriber.frames.put_nowait(frame)
+                sent += 1
+            except queue.Full:
+                # Client chậm: bỏ frame, client thấy seq bị nhảy thì tải lại số liệu
+                subscriber.dropped += 1
+                dropped += 1
+
+        with self._lock:
+            self.frames_sent += sent
+            self.frames_dropped += dropped
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'seq': self.seq,
+                'frames_sent': self.frames_sent,
+                'frames_dropped': self.frames_dropped,
+                'max_rate': round(1.0 / self.interval, 2),
+                'running': self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,318 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from utils.space_saving import SpaceSaving
+
+# Sliding window = nhiều sketch con: hour = 12 x 5 phút, day = 24 x 1 giờ
+WINDOWS = {
+    'hour': (300, 12),
+    'day': (3600, 24),
+}
+ALL_TIME = 'all'
+
+
+class WindowedSketch:
+    """Sliding window gồm các sketch con theo chu kỳ slot_seconds, sketch con hết hạn bị bỏ"""
+
+    def __init__(self, slot_seconds, slots, capacity):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.capacity = capacity
+        self._sketches = {}
+        self._latest = None
+
+    def update(self, key, now):
+        # Event đến trễ (đồng hồ lùi) được tính vào slot mới nhất: sketch của slot cũ không đổi nữa
+        epoch = int(now // self.slot_seconds)
+        if self._latest is not None and epoch < self._latest:
+            epoch = self._latest
+        self._latest = epoch
+
+        sketch = self._sketches.get(epoch)
+        if sketch is None:
+            sketch = self._sketches[epoch] = SpaceSaving(self.capacity)
+            self._expire(epoch)
+        sketch.update(key)
+
+    def _expire(self, epoch):
+        for old in [old for old in self._sketches if old <= epoch - self.slots]:
+            del self._sketches[old]
+
+    def sketches(self, now):
+        """Các sketch con trong window tính tới now (gọi khi giữ lock)
+
+        Chỉ slot mới nhất còn được cập nhật nên chỉ slot đó được copy, các slot cũ dùng chung được
+        và có thể merge ngoài lock.
+        """
+        oldest = int(now // self.slot_seconds) - self.slots
+        return [
+            sketch.copy() if epoch == self._latest else sketch
+            for epoch, sketch in self._sketches.items() if epoch > oldest
+        ]
+
+    def to_dict(self):
+        return {
+            'slot_seconds': self.slot_seconds,
+            'slots': [{'epoch': epoch, 'sketch': sketch.to_dict()} for epoch, sketch in self._sketches.items()]
+        }
+
+    def load(self, data, now):
+        """Gộp các slot từ checkpoint vào (slot đã có thì merge)"""
+        if data.get('slot_seconds') != self.slot_seconds:
+            return
+
+        for slot in data.get('slots', []):
+            if slot['sketch']['capacity'] != self.capacity:
+                continue
+            # Merge vào sketch mới thay vì sửa sketch cũ (có thể đang được merge ngoài lock)
+            sketch = SpaceSaving.from_dict(slot['sketch'])
+            if slot['epoch'] in self._sketches:
+                sketch.merge(self._sketches[slot['epoch']])
+            self._sketches[slot['epoch']] = sketch
+
+        if self._sketches:
+            self._latest = max(max(self._sketches), self._latest or 0)
+        self._expire(int(now // self.slot_seconds))
+
+
+def merge_sketches(sketches, capacity):
+    merged = SpaceSaving(capacity)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+class TopIPTracker:
+    """Top IP tấn công theo thời gian thực bằng sketch Space-Saving (giờ qua, ngày qua, toàn thời gian)
+
+    Mỗi worker có sketch và checkpoint riêng (instance mặc định hostname:pid). Top-k gộp sketch
+    của worker hiện tại với checkpoint của các worker khác còn sống; checkpoint của worker đã dừng
+    (released hoặc quá stale_after giây không cập nhật) được một worker nhận về và gộp vào sketch của nó.
+    """
+
+    def __init__(self, collection=None, capacity=1000, checkpoint_interval=60, result_ttl=1.0,
+                 is_online=None, instance=None, stale_after=None):
+        self.collection = collection
+        self.capacity = capacity
+        self.checkpoint_interval = checkpoint_interval
+        self.result_ttl = result_ttl
+        self.is_online = is_online or (lambda: True)
+        self.instance = instance or f'{socket.gethostname()}:{os.getpid()}'
+        self.stale_after = stale_after if stale_after is not None else 3 * checkpoint_interval
+
+        self._windows = {name: WindowedSketch(slot, slots, capacity) for name, (slot, slots) in WINDOWS.items()}
+        self._all = SpaceSaving(capacity)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Kết quả xếp hạng được giữ result_ttl giây: đọc top-k không phải merge/sắp xếp lại
+        self._results = {}
+
+        # Checkpoint của worker khác, đọc lại sau mỗi checkpoint_interval giây: (loaded_at, {window: [sketch]})
+        self._peers = None
+
+        # Counters
+        self.recorded = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+        self.last_checkpoint_ms = 0.0
+        self.claimed = 0
+        self.peer_instances = 0
+
+    def start(self):
+        if self.collection is None or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        if self.is_online():
+            try:
+                self.restore()
+            except Exception as e:
+                print(f"[WARNING] Khong khoi phuc duoc heavy hitters: {str(e)}")
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='heavy-hitters', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        # Checkpoint cuối đánh dấu released để worker khác nhận ngay, không chờ stale_after
+        if self.collection is not None and self.is_online():
+            try:
+                self.checkpoint(released=True)
+            except Exception as e:
+                print(f"[WARNING] Khong checkpoint duoc heavy hitters: {str(e)}")
+
+    def record(self, ip_address, now=None):
+        now = time.time() if now is None else now
+
+        with self._lock:
+            for window in self._windows.values():
+                window.update(ip_address, now)
+            self._all.update(ip_address)
+            self.recorded += 1
+
+    def _ranked(self, window, now):
+        """(total, toàn bộ item đã sắp xếp) của window, giữ result_ttl giây
+
+        Chỉ lấy sketch khi giữ lock, merge/sắp xếp làm ngoài lock để không chặn record() trên đường ingest.
+        """
+        with self._lock:
+            cached = self._results.get(window)
+            if cached is not None and now - cached[0] < self.result_ttl:
+                return cached[1], cached[2]
+
+            sketches = [self._all.copy()] if window == ALL_TIME else self._windows[window].sketches(now)
+
+        sketches += self._peer_sketches(now).get(window, [])
+        sketch = merge_sketches(sketches, self.capacity)
+        ranked = sketch.top(self.capacity)
+
+        with self._lock:
+            self._results[window] = (now, sketch.total, ranked)
+        return sketch.total, ranked
+
+    def top(self, window=ALL_TIME, limit=10, now=None):
+        """Top IP của window: count ước lượng, sai số tối đa và cận dưới đảm bảo"""
+        if window != ALL_TIME and window not in self._windows:
+            raise ValueError(f'Window khong hop le: {window}')
+
+        now = time.time() if now is None else now
+        total, ranked = self._ranked(window, now)
+
+        return {
+            'window': window,
+            'total': total,
+            'capacity': self.capacity,
+            # Mọi IP có count thật lớn hơn ngưỡng này chắc chắn có trong danh sách đầy đủ của sketch
+            'max_error': total // self.capacity,
+            'items': [
+                {'_id': ip, 'count': count, 'error': error, 'guaranteed': count - error}
+                for ip, count, error in ranked[:limit]
+            ]
+        }
+
+    def _peer_sketches(self, now):
+        """Sketch từ checkpoint của các worker khác còn sống, đọc lại sau mỗi checkpoint_interval giây"""
+        peers = self._peers
+        if peers is not None and now - peers[0] < self.checkpoint_interval:
+            return peers[1]
+
+        if self.collection is None or not self.is_online():
+            return {}
+
+        sketches = {}
+        instances = set()
+        try:
+            cursor = self.collection.find({
+                'instance': {'$ne': self.instance},
+                'released': {'$ne': True},
+                'updated_at': {'$gte': datetime.utcnow() - timedelta(seconds=self.stale_after)}
+            })
+            for doc in cursor:
+                window = doc.get('window')
+                instances.add(doc.get('instance'))
+                if window == ALL_TIME:
+                    if doc['sketch']['capacity'] == self.capacity:
+                        sketches.setdefault(ALL_TIME, []).append(SpaceSaving.from_dict(doc['sketch']))
+                elif window in WINDOWS:
+                    peer = WindowedSketch(*WINDOWS[window], self.capacity)
+                    peer.load(doc, now)
+                    sketches.setdefault(window, []).extend(peer.sketches(now))
+        except Exception as e:
+            print(f"[WARNING] Khong doc duoc checkpoint heavy hitters cua worker khac: {str(e)}")
+            return peers[1] if peers is not None else {}
+
+        self._peers = (now, sketches)
+        self.peer_instances = len(instances)
+        return sketches
+
+    def _run(self):
+        while not self._stop_event.wait(self.checkpoint_interval):
+            if not self.is_online():
+                continue
+
+            try:
+                self.checkpoint()
+                self.claim()
+            except Exception as e:
+                print(f"[ERROR] Loi checkpoint heavy hitters: {str(e)}")
+                self.checkpoint_errors += 1
+
+    def checkpoint(self, released=False):
+        """Lưu dạng serialize của các sketch của worker này vào MongoDB"""
+        started = time.perf_counter()
+
+        with self._lock:
+            docs = {name: window.to_dict() for name, window in self._windows.items()}
+            docs[ALL_TIME] = {'sketch': self._all.to_dict()}
+
+        now = datetime.utcnow()
+        for name, doc in docs.items():
+            self.collection.replace_one(
+                {'_id': f'{self.instance}:{name}'},
+                {**doc, 'instance': self.instance, 'window': name, 'released': released, 'updated_at': now},
+                upsert=True
+            )
+
+        self.checkpoints += 1
+        self.last_checkpoint_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def claim(self):
+        """Nhận checkpoint của worker đã dừng và gộp vào sketch của worker này
+
+        find_one_and_delete bảo đảm mỗi checkpoint chỉ được một worker nhận (không đếm trùng).
+        """
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        query = {
+            'instance': {'$ne': self.instance},
+            '$or': [{'released': True}, {'updated_at': {'$lt': stale}}]
+        }
+        now = time.time()
+        claimed = 0
+
+        while True:
+            doc = self.collection.find_one_and_delete(query)
+            if doc is None:
+                break
+
+            with self._lock:
+                if doc.get('window') == ALL_TIME:
+                    if doc['sketch']['capacity'] == self.capacity:
+                        # Sketch mới thay cho _all: bản copy đang được merge ngoài lock không bị sửa
+                        merged = SpaceSaving.from_dict(doc['sketch'])
+                        merged.merge(self._all)
+                        self._all = merged
+                elif doc.get('window') in self._windows:
+                    self._windows[doc['window']].load(doc, now)
+                self._results = {}
+            claimed += 1
+
+        self.claimed += claimed
+        return claimed
+
+    def restore(self):
+        """Nạp lại sketch sau khi restart: nhận checkpoint của các worker đã dừng"""
+        return self.claim()
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'instance': self.instance,
+                'recorded': self.recorded,
+                'capacity': self.capacity,
+                'tracked_all_time': len(self._all),
+                'checkpoints': self.checkpoints,
+                'checkpoint_errors': self.checkpoint_errors,
+                'last_checkpoint_ms': self.last_checkpoint_ms,
+                'claimed': self.claimed,
+                'peer_instances': self.peer_instances,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,169 @@
+import queue
+import threading
+import time
+
+
+class IngestQueue:
+    """Hàng đợi write-behind: gom attack log trong bộ nhớ và ghi theo lô bằng insert_many"""
+
+    def __init__(self, flush_fn, max_size=10000, batch_size=500, flush_interval=0.2, overflow_fn=None):
+        self.flush_fn = flush_fn
+        self.overflow_fn = overflow_fn
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.spilled = 0
+        self.overflow = 0
+        self.high_watermark = 0
+        self.last_flush_ms = 0.0
+        self.last_flush_at = None
+
+    def start(self):
+        """Khởi động thread ghi nền"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ingest-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Dừng thread và flush toàn bộ event còn trong queue"""
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        # Flush phần còn lại (nếu thread đã thoát trước khi drain hết)
+        remaining = self._drain(block=False)
+        while remaining:
+            self._flush(remaining)
+            remaining = self._drain(block=False)
+
+    def enqueue(self, document):
+        """Đưa một event vào queue, không chặn request"""
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            with self._stats_lock:
+                self.overflow += 1
+
+            # Queue đầy: chuyển cho overflow_fn (spool), không có thì ghi đồng bộ để tạo backpressure
+            if self.overflow_fn is not None:
+                self.overflow_fn([document])
+            else:
+                self._flush([document])
+            return
+
+        with self._stats_lock:
+            self.enqueued += 1
+            depth = self._queue.qsize()
+            if depth > self.high_watermark:
+                self.high_watermark = depth
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._flush(batch)
+
+        # Drain khi shutdown
+        batch = self._drain(block=False)
+        while batch:
+            self._flush(batch)
+            batch = self._drain(block=False)
+
+    def _drain(self, block=True):
+        """Lấy tối đa batch_size event, chờ tối đa flush_interval kể từ event đầu tiên"""
+        batch = []
+
+        if block:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                return batch
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            print(f"[ERROR] Loi ghi batch {len(batch)} attack logs: {str(e)}")
+            self._spill_failed(batch)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.last_flush_ms = round(elapsed_ms, 3)
+            self.last_flush_at = time.time()
+
+    def _spill_failed(self, batch):
+        """Lô ghi lỗi được chuyển cho overflow_fn (spool) thay vì bỏ, chỉ đếm failed khi cả hai đều lỗi"""
+        if self.overflow_fn is not None:
+            try:
+                self.overflow_fn(batch)
+                with self._stats_lock:
+                    self.spilled += len(batch)
+                return
+            except Exception as e:
+                print(f"[ERROR] Khong chuyen duoc batch {len(batch)} attack logs vao spool: {str(e)}")
+
+        with self._stats_lock:
+            self.failed += len(batch)
+
+    def get_metrics(self):
+        """Chỉ số hiện tại của queue"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_size': self.max_size,
+                'high_watermark': self.high_watermark,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'batches': self.batches,
+                'avg_batch_size': round(self.written / self.batches, 2) if self.batches else 0,
+                'failed': self.failed,
+                'spilled': self.spilled,
+                'overflow': self.overflow,
+                'last_flush_ms': self.last_flush_ms,
+                'batch_size': self.batch_size,
+                'flush_interval_ms': int(self.flush_interval * 1000),
+                'running': self._thread is not None and self._thread.is_alive()
+            }
@@ -0,0 +1,486 @@
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from models.attack_rollup import encode_key, decode_key
+from utils.hyperloglog import HyperLogLog
+
+# Số ô của sliding window (window 1 giờ -> mỗi ô 5 phút)
+WINDOW_SLOTS = 12
+
+
+def window_count(slot_counts, slot_epochs, now, slot_width):
+    """Số request trong window gần nhất (độ phân giải một ô) từ ring buffer"""
+    oldest = int(now // slot_width) - WINDOW_SLOTS
+    return sum(count for count, epoch in zip(slot_counts, slot_epochs) if epoch > oldest)
+
+
+def _timestamp(value):
+    """datetime UTC (naive) lưu trong MongoDB -> epoch giây"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class IPProfile:
+    """Profile hành vi của một IP, cập nhật O(1) mỗi event
+
+    unsaved_total / unsaved_types / unsaved_slots là phần tăng từ lần snapshot trước (ghi bằng $inc),
+    stale_slots là các ô window cũ đã thấy trong document, được $unset ở snapshot sau.
+    """
+
+    __slots__ = ('first_seen', 'last_seen', 'total', 'attack_types', 'endpoints',
+                 'slot_counts', 'slot_epochs', 'unsaved_total', 'unsaved_types', 'unsaved_slots',
+                 'stale_slots')
+
+    def __init__(self, now, hll_precision):
+        self.first_seen = now
+        self.last_seen = now
+        self.total = 0
+        self.attack_types = Counter()
+        self.endpoints = HyperLogLog(hll_precision)
+        self.slot_counts = array('q', bytes(8 * WINDOW_SLOTS))
+        self.slot_epochs = array('q', bytes(8 * WINDOW_SLOTS))
+        self.unsaved_total = 0
+        self.unsaved_types = Counter()
+        self.unsaved_slots = Counter()
+        self.stale_slots = set()
+
+    def record(self, now, endpoint, attack_type, slot_width):
+        self.last_seen = now
+        self.total += 1
+        self.attack_types[attack_type] += 1
+        self.unsaved_total += 1
+        self.unsaved_types[attack_type] += 1
+        self.endpoints.add(endpoint or '')
+
+        # Ring buffer: ô được tái sử dụng khi sang chu kỳ mới
+        epoch = int(now // slot_width)
+        index = epoch % WINDOW_SLOTS
+        if self.slot_epochs[index] != epoch:
+            self.slot_epochs[index] = epoch
+            self.slot_counts[index] = 0
+        self.slot_counts[index] += 1
+        self.unsaved_slots[epoch] += 1
+
+    def window_count(self, now, slot_width):
+        """Số request trong window gần nhất (độ phân giải một ô)"""
+        return window_count(self.slot_counts, self.slot_epochs, now, slot_width)
+
+
+def merge_states(older, newer):
+    """Gộp hai phần thay đổi chưa ghi của cùng một IP"""
+    return {
+        **newer,
+        'first_seen': min(older['first_seen'], newer['first_seen']),
+        'last_seen': max(older['last_seen'], newer['last_seen']),
+        'total': older['total'] + newer['total'],
+        'attack_types': older['attack_types'] + newer['attack_types'],
+        'slots': older['slots'] + newer['slots'],
+        'stale': older['stale'] | newer['stale'],
+        'registers': bytes(map(max, older['registers'], newer['registers']))
+    }
+
+
+class IPProfileStore:
+    """Profile hành vi theo IP trong bộ nhớ, giới hạn bằng LRU và snapshot định kỳ vào MongoDB
+
+    Mỗi worker chỉ thấy event của chính nó, nên get() gộp phần chưa ghi trong bộ nhớ với document
+    đã snapshot (của mọi worker). Window được lưu theo ô (window_slots.<epoch>, $inc) để cộng được
+    giữa các worker; ô ngoài window được $unset khi snapshot (window liền trước, hoặc ô cũ mà get()/load()
+    đã đọc thấy). Khi khởi động, profile của các IP hoạt động trong window gần nhất được nạp lại.
+    """
+
+    def __init__(self, collection=None, max_ips=10000, window_seconds=3600, hll_precision=10,
+                 snapshot_interval=60, is_online=None, max_evicted=None):
+        self.collection = collection
+        self.max_ips = max_ips
+        # Profile bị loại khỏi LRU chờ snapshot (tăng khi MongoDB offline), giới hạn để bộ nhớ không tăng mãi
+        self.max_evicted = max_evicted or max_ips
+        self.window_seconds = window_seconds
+        self.slot_width = window_seconds / WINDOW_SLOTS
+        self.hll_precision = hll_precision
+        self.snapshot_interval = snapshot_interval
+        self.is_online = is_online or (lambda: True)
+
+        self._profiles = OrderedDict()
+        self._dirty = set()
+        self._evicted = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._loaded = False
+
+        # Counters
+        self.recorded = 0
+        self.loaded = 0
+        self.stored_reads = 0
+        self.stored_read_errors = 0
+        self.evictions = 0
+        self.evicted_dropped = 0
+        self.snapshots = 0
+        self.snapshot_errors = 0
+        self.last_snapshot_ms = 0.0
+        self.last_snapshot_size = 0
+
+    def start(self):
+        if self.collection is None or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        self._load_if_online()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ip-profiles', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        # Ghi nốt profile đã thay đổi trước khi thoát
+        if self.collection is not None and self.is_online():
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"[WARNING] Khong snapshot duoc ip profiles: {str(e)}")
+
+    def record(self, ip_address, endpoint, attack_type, now=None):
+        """Cập nhật profile của IP với một event mới"""
+        now = time.time() if now is None else now
+
+        with self._lock:
+            profile = self._profiles.get(ip_address)
+            if profile is None:
+                profile = IPProfile(now, self.hll_precision)
+                self._profiles[ip_address] = profile
+                self._evict()
+            else:
+                self._profiles.move_to_end(ip_address)
+
+            profile.record(now, endpoint, attack_type, self.slot_width)
+            self._dirty.add(ip_address)
+            self.recorded += 1
+
+    def _evict(self):
+        """Bỏ các IP lạnh nhất khi vượt max_ips (profile chưa snapshot được giữ lại để ghi lần sau)"""
+        while len(self._profiles) > self.max_ips:
+            ip_address, profile = self._profiles.popitem(last=False)
+            if ip_address in self._dirty:
+                self._dirty.discard(ip_address)
+                if self.collection is not None:
+                    self._hold_evicted(ip_address, self._capture(profile))
+            self.evictions += 1
+
+    def _hold_evicted(self, ip_address, state):
+        """Giữ trạng thái profile bị loại chờ snapshot; vượt max_evicted thì bỏ cái cũ nhất (có đếm)"""
+        if ip_address in self._evicted:
+            state = merge_states(self._evicted[ip_address], state)
+        self._evicted[ip_address] = state
+        self._evicted.move_to_end(ip_address)
+
+        while len(self._evicted) > self.max_evicted:
+            self._evicted.popitem(last=False)
+            self.evicted_dropped += 1
+
+    def get(self, ip_address, now=None):
+        """Profile hiện tại của IP (dict), None nếu IP không có trong bộ nhớ
+
+        Có MongoDB thì gộp document đã snapshot với phần chưa ghi ('stored': True). Không đọc được
+        document thì trả profile trong bộ nhớ ('stored': False), có thể thiếu event của worker khác.
+        """
+        now = time.time() if now is None else now
+
+        with self._lock:
+            profile = self._profiles.get(ip_address)
+            if profile is None:
+                return None
+
+            local = {
+                'ip_address': ip_address,
+                'first_seen': datetime.utcfromtimestamp(profile.first_seen),
+                'last_seen': datetime.utcfromtimestamp(profile.last_seen),
+                'total_requests': profile.total,
+                'window_requests': profile.window_count(now, self.slot_width),
+                'window_seconds': self.window_seconds,
+                'unique_endpoints': profile.endpoints.count(),
+                'attack_types': dict(profile.attack_types),
+                'stored': False
+            }
+            if self.collection is None:
+                return local
+
+            pending = self._pending(profile)
+            if ip_address in self._evicted:
+                pending = merge_states(self._evicted[ip_address], pending)
+
+        if not self.is_online():
+            return local
+
+        try:
+            document = self.collection.find_one({'_id': ip_address})
+            self.stored_reads += 1
+        except Exception as e:
+            print(f"[WARNING] Khong doc duoc ip profile {ip_address}: {str(e)}")
+            self.stored_read_errors += 1
+            return local
+
+        if document is None:
+            # Chưa snapshot lần nào: mọi event của worker này đều còn trong bộ nhớ
+            return {**local, 'stored': True}
+
+        stale = self._stale_slots(document, now)
+        if stale:
+            with self._lock:
+                profile = self._profiles.get(ip_address)
+                if profile is not None:
+                    profile.stale_slots.update(stale)
+
+        return self._merge_document(ip_address, document, pending, now)
+
+    def _stale_slots(self, document, now):
+        """Các ô window trong document đã ra khỏi window (IP từng nghỉ lâu hơn một window)"""
+        oldest = int(now // self.slot_width) - WINDOW_SLOTS
+        return {int(epoch) for epoch in document.get('window_slots', {}) if int(epoch) <= oldest}
+
+    def _merge_document(self, ip_address, document, pending, now):
+        """Gộp document đã lưu với phần chưa ghi của worker này"""
+        registers = self._document_registers(document, pending['registers'])
+        oldest = int(now // self.slot_width) - WINDOW_SLOTS
+
+        attack_types = Counter({decode_key(key): count for key, count in document.get('attack_types', {}).items()})
+        attack_types.update(pending['attack_types'])
+
+        return {
+            'ip_address': ip_address,
+            'first_seen': min(document['first_seen'], datetime.utcfromtimestamp(pending['first_seen'])),
+            'last_seen': max(document['last_seen'], datetime.utcfromtimestamp(pending['last_seen'])),
+            'total_requests': document.get('total', 0) + pending['total'],
+            'window_requests': sum(count for epoch, count in document.get('window_slots', {}).items()
+                                   if int(epoch) > oldest)
+                               + sum(count for epoch, count in pending['slots'].items() if epoch > oldest),
+            'window_seconds': self.window_seconds,
+            'unique_endpoints': HyperLogLog.from_bytes(bytes(registers), self.hll_precision).count(),
+            'attack_types': dict(attack_types),
+            'stored': True
+        }
+
+    def _document_registers(self, document, registers=None):
+        """Register HLL của document (gộp $max với `registers` nếu có)"""
+        merged = bytearray(registers or bytes(2 ** self.hll_precision))
+        if document.get('hll_precision', self.hll_precision) == self.hll_precision:
+            for index, rank in document.get('endpoint_registers', {}).items():
+                index = int(index)
+                merged[index] = max(merged[index], rank)
+        return merged
+
+    def _load_if_online(self):
+        if self._loaded or self.collection is None or not self.is_online():
+            return
+
+        try:
+            self.load()
+        except Exception as e:
+            print(f"[WARNING] Khong nap duoc ip profiles: {str(e)}")
+
+    def load(self, now=None):
+        """Nạp profile của các IP hoạt động trong window gần nhất từ snapshot, trả về số profile đã nạp
+
+        Phần đã nạp không đánh dấu dirty (đã có trong MongoDB), chỉ event mới được snapshot lại.
+        """
+        now = time.time() if now is None else now
+
+        self.collection.create_index('last_seen')
+        documents = list(
+            self.collection.find({'last_seen': {'$gte': datetime.utcfromtimestamp(now - self.window_seconds)}})
+            .sort('last_seen', -1)
+            .limit(self.max_ips)
+        )
+
+        loaded = 0
+        with self._lock:
+            # Cũ nhất trước để IP hoạt động gần nhất đứng cuối LRU
+            for document in reversed(documents):
+                if document['_id'] in self._profiles:
+                    continue
+                self._profiles[document['_id']] = self._from_document(document, now)
+                loaded += 1
+            self._evict()
+
+            self._loaded = True
+            self.loaded += loaded
+
+        return loaded
+
+    def _from_document(self, document, now):
+        profile = IPProfile(_timestamp(document['first_seen']), self.hll_precision)
+        profile.last_seen = _timestamp(document['last_seen'])
+        profile.total = document.get('total', 0)
+        profile.attack_types = Counter({decode_key(key): count
+                                        for key, count in document.get('attack_types', {}).items()})
+        profile.endpoints = HyperLogLog.from_bytes(bytes(self._document_registers(document)), self.hll_precision)
+        profile.stale_slots = self._stale_slots(document, now)
+
+        oldest = int(now // self.slot_width) - WINDOW_SLOTS
+        for epoch, count in document.get('window_slots', {}).items():
+            epoch = int(epoch)
+            if epoch > oldest:
+                profile.slot_epochs[epoch % WINDOW_SLOTS] = epoch
+                profile.slot_counts[epoch % WINDOW_SLOTS] = count
+        return profile
+
+    def _pending(self, profile):
+        """Bản sao phần chưa ghi của profile (không reset), gọi khi đang giữ lock"""
+        return {
+            'first_seen': profile.first_seen,
+            'last_seen': profile.last_seen,
+            'total': profile.unsaved_total,
+            'attack_types': Counter(profile.unsaved_types),
+            'slots': Counter(profile.unsaved_slots),
+            'registers': profile.endpoints.to_bytes()
+        }
+
+    def _capture(self, profile):
+        """Lấy phần thay đổi của profile khi đang giữ lock: chỉ copy số và bytes register, không tính HLL"""
+        state = {
+            'first_seen': profile.first_seen,
+            'last_seen': profile.last_seen,
+            'total': profile.unsaved_total,
+            'attack_types': profile.unsaved_types,
+            'slots': profile.unsaved_slots,
+            'stale': profile.stale_slots,
+            'registers': profile.endpoints.to_bytes()
+        }
+        profile.unsaved_total = 0
+        profile.unsaved_types = Counter()
+        profile.unsaved_slots = Counter()
+        profile.stale_slots = set()
+        return state
+
+    def _restore(self, ip_address, state):
+        """Trả phần thay đổi chưa ghi được về profile (hoặc hàng chờ evicted), gọi khi đang giữ lock"""
+        profile = self._profiles.get(ip_address)
+        if profile is None:
+            self._hold_evicted(ip_address, state)
+            return
+
+        # Profile có thể đã được tạo lại sau khi bị loại: giữ first_seen cũ và register của phần chưa ghi
+        profile.first_seen = min(profile.first_seen, state['first_seen'])
+        profile.endpoints.merge(HyperLogLog.from_bytes(state['registers'], self.hll_precision))
+        profile.unsaved_total += state['total']
+        profile.unsaved_types.update(state['attack_types'])
+        profile.unsaved_slots.update(state['slots'])
+        profile.stale_slots |= state['stale']
+        self._dirty.add(ip_address)
+
+    def _to_update(self, state, now):
+        """Update merge vào document đã lưu (ước lượng HLL được tính ngoài lock)
+
+        Profile của cùng IP từ worker khác hoặc từ trước khi bị loại khỏi LRU được gộp thay vì ghi đè:
+        $min/$max cho first_seen/last_seen, $inc phần tăng (kể cả từng ô window), $max từng register HLL.
+        Các ô của window trước đó và ô cũ đã đọc thấy được $unset để document không lớn dần.
+        """
+        registers = state['registers']
+        epoch = int(now // self.slot_width)
+        slots = {f'window_slots.{slot}': count for slot, count in state['slots'].items() if slot > epoch - WINDOW_SLOTS}
+        stale = set(range(epoch - 2 * WINDOW_SLOTS, epoch - WINDOW_SLOTS + 1))
+        stale.update(slot for slot in state['stale'] if slot <= epoch - WINDOW_SLOTS)
+        return {
+            '$min': {'first_seen': datetime.utcfromtimestamp(state['first_seen'])},
+            '$max': {
+                'last_seen': datetime.utcfromtimestamp(state['last_seen']),
+                # Ước lượng cục bộ lớn nhất (cận dưới); ước lượng của union tính từ endpoint_registers
+                'unique_endpoints': HyperLogLog.from_bytes(registers, self.hll_precision).count(),
+                **{f'endpoint_registers.{index}': rank for index, rank in enumerate(registers) if rank}
+            },
+            '$inc': {
+                'total': state['total'],
+                **{f'attack_types.{encode_key(key)}': count for key, count in state['attack_types'].items()},
+                **slots
+            },
+            '$unset': {f'window_slots.{slot}': '' for slot in sorted(stale)},
+            '$set': {
+                'hll_precision': self.hll_precision,
+                'updated_at': datetime.utcnow()
+            }
+        }
+
+    def _run(self):
+        while not self._stop_event.wait(self.snapshot_interval):
+            if not self.is_online():
+                continue
+
+            # MongoDB offline lúc khởi động: nạp profile khi kết nối lại
+            self._load_if_online()
+
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"[ERROR] Loi snapshot ip profiles: {str(e)}")
+                self.snapshot_errors += 1
+
+    def snapshot(self, now=None):
+        """Ghi các profile đã thay đổi từ lần snapshot trước vào MongoDB"""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+
+        # Chỉ giữ lock lúc copy số và register; tính HLL, dựng document và ghi MongoDB ngoài lock
+        # để không chặn ingest
+        with self._lock:
+            states = dict(self._evicted)
+            for ip_address in self._dirty:
+                state = self._capture(self._profiles[ip_address])
+                # IP bị loại rồi quay lại trước snapshot: gộp phần của cả hai
+                states[ip_address] = merge_states(states[ip_address], state) if ip_address in states else state
+            self._dirty = set()
+            self._evicted = OrderedDict()
+
+        if states:
+            ip_addresses = list(states)
+            try:
+                self.collection.bulk_write([
+                    UpdateOne({'_id': ip_address}, self._to_update(states[ip_address], now), upsert=True)
+                    for ip_address in ip_addresses
+                ], ordered=False)
+            except Exception as e:
+                # Ghi lỗi: trả phần thay đổi về để lần sau ghi tiếp. BulkWriteError cho biết update nào lỗi
+                # (các update khác đã áp dụng, không được $inc lại); lỗi khác thì ghi lại tất cả
+                if isinstance(e, BulkWriteError):
+                    failed = [ip_addresses[error['index']] for error in e.details.get('writeErrors', [])]
+                else:
+                    failed = ip_addresses
+
+                with self._lock:
+                    for ip_address in failed:
+                        self._restore(ip_address, states[ip_address])
+                raise
+
+        self.snapshots += 1
+        self.last_snapshot_size = len(states)
+        self.last_snapshot_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(states)
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'profiles': len(self._profiles),
+                'max_ips': self.max_ips,
+                'dirty': len(self._dirty) + len(self._evicted),
+                'evicted_pending': len(self._evicted),
+                'recorded': self.recorded,
+                'evictions': self.evictions,
+                'evicted_dropped': self.evicted_dropped,
+                'loaded': self.loaded,
+                'stored_reads': self.stored_reads,
+                'stored_read_errors': self.stored_read_errors,
+                'snapshots': self.snapshots,
+                'snapshot_errors': self.snapshot_errors,
+                'last_snapshot_size': self.last_snapshot_size,
+                'last_snapshot_ms': self.last_snapshot_ms,
+                'window_seconds': self.window_seconds,
+                'hll_precision': self.hll_precision,
+                'running': self._thread is not None and self._thread.is_alive()
+            }
@@ -1,13 +1,25 @@
+from datetime import datetime
 from flask import request
+from config import Config
+from middleware.error_handler import APIError
 from models.attack_log import AttackLog
+from services.rule_engine import RuleEngine
+from utils.capture import CapturePolicy
+from utils.client_ip import get_client_ip
 from utils.ip_tracker import IPTracker
+from utils.tool_matcher import tool_matcher
 
 class AttackLogger:
     """Service để ghi log tấn công"""
 
-    def __init__(self, attack_log_model: AttackLog):
+    def __init__(self, attack_log_model: AttackLog, event_hub=None, ip_profiles=None, top_ips=None):
         self.attack_log = attack_log_model
+        self.event_hub = event_hub
+        self.ip_profiles = ip_profiles
+        self.top_ips = top_ips
         self.ip_tracker = IPTracker()
+        self.capture_policy = CapturePolicy.from_config(Config)
+        self.rule_engine = RuleEngine(Config.RULES_PATH)
 
     def log_request(self, attack_type='unknown', additional_data=None):
         """Ghi log một request"""
@@ -15,69 +27,88 @@ class AttackLogger:
         # Lấy IP address
         ip_address = self._get_client_ip()
 
-        # Lấy geolocation
-        geolocation = self.ip_tracker.get_geolocation(ip_address)
+        # Trích xuất request theo giới hạn của capture policy
+        captured = self.capture_policy.capture(request)
+
+        # Body vượt CAPTURE_MAX_BODY_BYTES không được giữ lại cho route: ghi log rồi trả 413
+        body_too_large = captured['capture'] is not None and 'body_sha256' in captured['capture']
 
         # Tạo log data
         log_data = {
             'ip_address': ip_address,
             'method': request.method,
             'endpoint': request.path,
-            'headers': dict(request.headers),
-            'query_params': dict(request.args),
+            'headers': captured['headers'],
+            'query_params': captured['query_params'],
             'attack_type': attack_type,
-            'user_agent': request.headers.get('User-Agent', 'Unknown'),
-            'geolocation': geolocation,
-            'response_status': 200
+            'user_agent': captured['headers'].get('User-Agent', 'Unknown'),
+            'response_status': 413 if body_too_large else 200
         }
 
+        # Nhận diện công cụ ngay khi ingest (memo theo User-Agent)
+        log_data['tool'] = tool_matcher.identify(log_data['user_agent'])
+
+        # Geolocation: làm giàu ở worker nền (deferred) hoặc ngay trong request (inline)
+        if Config.ENRICHMENT_MODE == 'deferred':
+            log_data['enrichment_pending'] = True
+        else:
+            log_data['geolocation'] = self.ip_tracker.get_geolocation(ip_address)
+
         # Thêm payload nếu có
-        if request.is_json:
-            log_data['payload'] = request.get_json()
-        elif request.form:
-            log_data['payload'] = dict(request.form)
+        if captured['payload'] is not None:
+            log_data['payload'] = captured['payload']
+
+        # Đánh dấu các trường bị cắt bớt
+        if captured['capture']:
+            log_data['capture'] = captured['capture']
 
         # Merge additional data
         if additional_data:
             log_data.update(additional_data)
 
+        # Phân loại theo rules file (mỗi field chỉ quét một lần)
+        self._apply_rules(log_data)
+
         # Lưu vào database
         log_id = self.attack_log.create(log_data)
 
+        # Cập nhật profile hành vi của IP trong bộ nhớ
+        if self.ip_profiles is not None:
+            self.ip_profiles.record(ip_address, log_data['endpoint'], log_data['attack_type'])
+
+        # Sketch heavy hitters cho top IP thời gian thực
+        if self.top_ips is not None:
+            self.top_ips.record(ip_address)
+
+        # Đẩy tóm tắt event cho live feed của dashboard
+        if self.event_hub is not None:
+            self.event_hub.publish({
+                '_id': log_id,
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'ip_address': ip_address,
+                'method': log_data['method'],
+                'endpoint': log_data['endpoint'],
+                'attack_type': log_data['attack_type'],
+                'tool': log_data['tool']
+            })
+
+        if body_too_large:
+            raise APIError('Request body quá lớn', status_code=413)
+
         return log_id
 
     def _get_client_ip(self):
         """Lấy IP address của client (xử lý proxy)"""
-        if request.headers.get('X-Forwarded-For'):
-            # Client đằng sau proxy
-            ip = request.headers.get('X-Forwarded-For').split(',')[0].strip()
-        elif request.headers.get('X-Real-IP'):
-            ip = request.headers.get('X-Real-IP')
-        else:
-            ip = request.remote_addr
-
-        return ip
-
-    def analyze_attack_type(self):
-        """Phân tích loại tấn công dựa trên request"""
-        path = request.path
-        method = request.method
-        payload = request.get_json() if request.is_json else {}
-
-        # Brute force detection
-        if 'private_key' in str(payload) or 'seed' in str(payload):
-            return 'brute_force'
-
-        # API exploit
-        if method in ['PUT', 'DELETE', 'PATCH']:
-            return 'api_exploit'
+        return get_client_ip(request)
 
-        # Transaction test
-        if 'transfer' in path or 'transaction' in path:
-            return 'transaction_test'
+    def _apply_rules(self, log_data):
+        """Gắn attack types / rule ids khớp; attack_type của route chỉ bị thay khi cấu hình cho phép"""
+        classification = self.rule_engine.classify(log_data)
+        if not classification['rule_ids']:
+            return
 
-        # Scan
-        if method == 'GET' and 'balance' in path:
-            return 'balance_scan'
+        log_data['attack_types'] = classification['attack_types']
+        log_data['rule_ids'] = classification['rule_ids']
 
-        return 'unknown'
+        if Config.RULES_OVERRIDE_ROUTE_TYPE or log_data.get('attack_type') in (None, 'unknown'):
+            log_data['attack_type'] = classification['attack_type']
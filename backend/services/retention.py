@@ -0,0 +1,254 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import WriteConcern
+
+# Giá trị mặc định của settings.database.log_retention_days
+DEFAULT_RETENTION_DAYS = 90
+
+STATE_ID = 'retention_state'
+
+
+def parse_window(value):
+    """Parse maintenance window 'HH:MM-HH:MM' (UTC) thành (phút bắt đầu, phút kết thúc), None nếu rỗng"""
+    if not value:
+        return None
+
+    try:
+        start, end = value.split('-')
+        minutes = []
+        for part in (start, end):
+            hour, minute = part.strip().split(':')
+            hour, minute = int(hour), int(minute)
+            if not (0 <= hour < 24 and 0 <= minute < 60):
+                raise ValueError
+            minutes.append(hour * 60 + minute)
+    except ValueError:
+        raise ValueError(f'Maintenance window khong hop le: {value} (dung HH:MM-HH:MM)')
+
+    return tuple(minutes)
+
+
+def in_window(window, now):
+    """now có nằm trong window không (window có thể qua nửa đêm, vd. 22:00-04:00)"""
+    if window is None:
+        return True
+
+    start, end = window
+    minute = now.hour * 60 + now.minute
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def parse_write_concern(value):
+    """'majority' / số node, rỗng thì dùng write concern mặc định của client"""
+    if not value:
+        return None
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class RetentionWorker:
+    """Worker nền xóa attack log hết hạn theo settings.database.log_retention_days
+
+    Xóa theo lô nhỏ (timestamp, _id) tăng dần, nghỉ giữa các lô để giới hạn tốc độ,
+    lưu checkpoint vào collection settings để chạy tiếp sau khi restart.
+    Khi bật partition thì drop nguyên partition hết hạn.
+    Nhiều process cùng chạy thì chỉ process có is_leader() (JobLease) xóa, checkpoint được đọc lại mỗi lần nhận lease.
+    """
+
+    def __init__(self, attack_log_model, settings_collection, batch_size=1000, batch_interval=0.5,
+                 max_rate=2000, poll_interval=300, window=None, write_concern=None, is_leader=None):
+        self.attack_log = attack_log_model
+        self.settings = settings_collection
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.max_rate = max_rate
+        self.poll_interval = poll_interval
+        self.window = parse_window(window)
+        self.write_concern = parse_write_concern(write_concern)
+        self.is_leader = is_leader or (lambda: True)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._checkpoint = None
+        self._run_started = None
+        self.leader = False
+
+        # Counters
+        self.retention_days = None
+        self.cutoff = None
+        self.deleted = 0
+        self.run_deleted = 0
+        self.batches = 0
+        self.errors = 0
+        self.backoffs = 0
+        self.last_batch_ms = 0.0
+        self.last_run_finished = None
+        self.status = 'idle'
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self.attack_log.is_online():
+                self.status = 'offline'
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            # Process khác đang giữ lease retention (checkpoint retention_state dùng chung)
+            if not self.is_leader():
+                self.leader = False
+                self.status = 'standby'
+                self._stop_event.wait(min(self.poll_interval, 60))
+                continue
+
+            # Vừa nhận lease: checkpoint có thể đã được process giữ lease trước đó cập nhật
+            if not self.leader:
+                self.leader = True
+                self._load_state()
+
+            if not in_window(self.window, datetime.utcnow()):
+                self.status = 'outside_window'
+                self._stop_event.wait(min(self.poll_interval, 60))
+                continue
+
+            try:
+                delay = self.run_batch()
+            except Exception as e:
+                print(f"[ERROR] Loi retention: {str(e)}")
+                self.errors += 1
+                delay = self.poll_interval
+
+            self._stop_event.wait(delay)
+
+    def _ingest_busy(self):
+        """Ingest queue đang dồn quá nửa: nhường I/O cho đường ghi"""
+        writer = self.attack_log.writer
+        return writer is not None and writer.qsize() > writer.max_size // 2
+
+    def get_retention_days(self):
+        """Đọc setting hiện tại (thay đổi qua /api/settings có hiệu lực ở lô tiếp theo)"""
+        doc = self.settings.find_one({'_id': 'app_settings'}, {'database.log_retention_days': 1}) or {}
+        days = (doc.get('database') or {}).get('log_retention_days')
+        return days if isinstance(days, int) and days > 0 else DEFAULT_RETENTION_DAYS
+
+    def run_batch(self):
+        """Xóa một lô log hết hạn, trả về số giây cần chờ trước lô tiếp theo"""
+        if self._ingest_busy():
+            self.status = 'ingest_backlog'
+            self.backoffs += 1
+            return min(self.poll_interval, 5)
+
+        self.retention_days = self.get_retention_days()
+        self.cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+
+        if self.attack_log.partitions.enabled:
+            self.deleted += self.attack_log.drop_expired_partitions(self.cutoff)
+            self.status = 'idle'
+            self.last_run_finished = time.time()
+            return self.poll_interval
+
+        started = time.perf_counter()
+        entries = self.attack_log.find_expired(self.cutoff, after=self._checkpoint, limit=self.batch_size)
+
+        if not entries:
+            # Hết log hết hạn: kết thúc lượt, lượt sau quét lại từ đầu
+            self._finish_run()
+            return self.poll_interval
+
+        if self._run_started is None:
+            self._run_started = datetime.utcnow()
+
+        self.status = 'deleting'
+        deleted = self.attack_log.delete_batch(entries, write_concern=self.write_concern)
+        elapsed = time.perf_counter() - started
+
+        self._checkpoint = (entries[-1]['timestamp'], entries[-1]['_id'])
+        self.deleted += deleted
+        self.run_deleted += deleted
+        self.batches += 1
+        self.last_batch_ms = round(elapsed * 1000, 3)
+        self._save_state()
+
+        # Giới hạn tốc độ: nghỉ tối thiểu batch_interval và không vượt quá max_rate log/giây
+        delay = self.batch_interval
+        if self.max_rate:
+            delay = max(delay, len(entries) / self.max_rate - elapsed)
+        return delay
+
+    def _finish_run(self):
+        if self._run_started is not None:
+            print(f"[OK] Retention da xoa {self.run_deleted} logs cu hon {self.retention_days} ngay")
+
+        self._checkpoint = None
+        self._run_started = None
+        self.run_deleted = 0
+        self.status = 'idle'
+        self.last_run_finished = time.time()
+        self._save_state()
+
+    def _load_state(self):
+        """Khôi phục checkpoint của lượt đang dở"""
+        try:
+            state = self.settings.find_one({'_id': STATE_ID}) or {}
+        except Exception as e:
+            print(f"[WARNING] Khong doc duoc checkpoint retention: {str(e)}")
+            return
+
+        if state.get('checkpoint_timestamp') is not None:
+            self._checkpoint = (state['checkpoint_timestamp'], state['checkpoint_id'])
+            self._run_started = state.get('run_started_at')
+            self.run_deleted = state.get('run_deleted', 0)
+        else:
+            self._checkpoint = None
+            self._run_started = None
+            self.run_deleted = 0
+
+    def _save_state(self):
+        checkpoint_timestamp, checkpoint_id = self._checkpoint or (None, None)
+        self.settings.update_one(
+            {'_id': STATE_ID},
+            {'$set': {
+                'checkpoint_timestamp': checkpoint_timestamp,
+                'checkpoint_id': checkpoint_id,
+                'run_started_at': self._run_started,
+                'run_deleted': self.run_deleted,
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    def get_metrics(self):
+        elapsed = (datetime.utcnow() - self._run_started).total_seconds() if self._run_started else 0
+        return {
+            'status': self.status,
+            'retention_days': self.retention_days,
+            'cutoff': self.cutoff.isoformat() if self.cutoff else None,
+            'checkpoint': self._checkpoint[0].isoformat() if self._checkpoint else None,
+            'deleted': self.deleted,
+            'run_deleted': self.run_deleted,
+            'run_docs_per_sec': round(self.run_deleted / elapsed, 2) if elapsed > 0 else 0,
+            'batches': self.batches,
+            'last_batch_ms': self.last_batch_ms,
+            'backoffs': self.backoffs,
+            'errors': self.errors,
+            'max_rate': self.max_rate,
+            'window': self.window is not None,
+            'leader': self.leader,
+            'last_run_finished': self.last_run_finished,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
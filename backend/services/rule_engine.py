@@ -0,0 +1,108 @@
+import json
+from utils.aho_corasick import AhoCorasick
+
+FIELDS = ('path', 'method', 'headers', 'query', 'payload')
+
+
+class RuleEngine:
+    """Engine phân loại tấn công: mọi pattern của rules file được compile vào một automaton"""
+
+    def __init__(self, rules_path):
+        self.rules_path = rules_path
+        self.rules = []
+        self._matcher = None
+        self.load()
+
+    def load(self):
+        """Đọc rules file và compile lại automaton"""
+        with open(self.rules_path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        rules = []
+        matcher = AhoCorasick()
+
+        for rule in data.get('rules', []):
+            patterns = rule.get('patterns', {})
+            unknown = set(patterns) - set(FIELDS)
+            if unknown:
+                raise ValueError(f"Rule {rule.get('id')}: field khong hop le {sorted(unknown)}")
+
+            index = len(rules)
+            rules.append({
+                'id': rule['id'],
+                'attack_type': rule['attack_type'],
+                'priority': rule.get('priority', 0),
+                'match': rule.get('match', 'any'),
+                'fields': frozenset(patterns)
+            })
+
+            for field, field_patterns in patterns.items():
+                for pattern in field_patterns:
+                    matcher.add(pattern.lower(), (index, field))
+
+        matcher.build()
+
+        self.rules = rules
+        self._matcher = matcher
+
+    @staticmethod
+    def fields_from_event(event):
+        """Chuẩn hóa (lowercase) các field của một event thành text để quét"""
+        headers = event.get('headers') or {}
+        query = event.get('query_params') or {}
+        payload = event.get('payload')
+
+        if payload is None or payload == {}:
+            payload_text = ''
+        elif isinstance(payload, str):
+            payload_text = payload
+        else:
+            payload_text = json.dumps(payload, ensure_ascii=False, default=str)
+
+        return {
+            'path': (event.get('endpoint') or '').lower(),
+            'method': (event.get('method') or '').lower(),
+            'headers': '\n'.join(f'{k}: {v}' for k, v in headers.items()).lower(),
+            'query': '&'.join(f'{k}={v}' for k, v in query.items()).lower(),
+            'payload': payload_text.lower()
+        }
+
+    def classify(self, event):
+        """Quét mỗi field một lần, trả về các attack type và rule id khớp (ưu tiên cao trước)"""
+        texts = self.fields_from_event(event)
+        hits = {}
+
+        for field, text in texts.items():
+            if not text:
+                continue
+
+            for index, pattern_field in self._matcher.iter_matches(text):
+                if pattern_field == field:
+                    hits.setdefault(index, set()).add(field)
+
+        matched = []
+        for index, fields in hits.items():
+            rule = self.rules[index]
+            if rule['match'] == 'all' and not rule['fields'] <= fields:
+                continue
+            matched.append(rule)
+
+        matched.sort(key=lambda rule: -rule['priority'])
+
+        attack_types = []
+        for rule in matched:
+            if rule['attack_type'] not in attack_types:
+                attack_types.append(rule['attack_type'])
+
+        return {
+            'attack_type': attack_types[0] if attack_types else None,
+            'attack_types': attack_types,
+            'rule_ids': [rule['id'] for rule in matched]
+        }
+
+    def get_metrics(self):
+        return {
+            'rules_path': self.rules_path,
+            'rules': len(self.rules),
+            'automaton_states': len(self._matcher)
+        }
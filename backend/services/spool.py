@@ -0,0 +1,356 @@
+import os
+import struct
+import threading
+import time
+import zlib
+import bson
+from pymongo.errors import ConnectionFailure
+
+# Mỗi record: độ dài payload + CRC32 của payload, sau đó là document BSON
+_RECORD_HEADER = struct.Struct('>II')
+
+_ACTIVE_SUFFIX = '.open'
+_SEALED_SUFFIX = '.wal'
+_REPLAY_SUFFIX = '.replay'
+# Event MongoDB từ chối khi ghi/replay (lỗi dữ liệu), giữ lại để xử lý tay
+_FAILED_SUFFIX = '.failed'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EventSpool:
+    """Spool append-only trên đĩa cho attack events khi MongoDB không ghi được"""
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync_interval=0.05, fsync_batch=256):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._seq = 0
+        self._file = None
+        self._size = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+        # Counters
+        self.appended = 0
+        self.fsyncs = 0
+        self.segments_sealed = 0
+        self.dead_lettered = 0
+
+        self._recover_orphans()
+
+    def _segment_name(self, seq):
+        return os.path.join(self.directory, f'{int(time.time() * 1000):013d}-{self._pid}-{seq:06d}')
+
+    def _recover_orphans(self):
+        """Seal segment đang mở / trả lại segment đang replay của process đã chết"""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+
+            if name.endswith(_ACTIVE_SUFFIX):
+                pid = int(name.split('-')[1])
+                if pid != self._pid and not _pid_alive(pid):
+                    os.replace(path, path[:-len(_ACTIVE_SUFFIX)] + _SEALED_SUFFIX)
+
+            elif name.endswith(_REPLAY_SUFFIX):
+                pid = int(name.rsplit('.', 2)[1])
+                if pid != self._pid and not _pid_alive(pid):
+                    os.replace(path, path.rsplit('.', 2)[0])
+
+    def append(self, documents):
+        """Ghi thêm các document vào segment hiện tại"""
+        if not documents:
+            return
+
+        buffer = self._encode(documents)
+
+        with self._lock:
+            if self._file is None:
+                self._seq += 1
+                self._file = open(self._segment_name(self._seq) + _ACTIVE_SUFFIX, 'ab')
+                self._size = 0
+
+            self._file.write(buffer)
+            self._size += len(buffer)
+            self._unsynced += len(documents)
+            self.appended += len(documents)
+
+            # fsync theo lô: đủ số record hoặc đủ thời gian
+            if self._unsynced >= self.fsync_batch or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync_locked()
+
+            if self._size >= self.segment_bytes:
+                self._seal_locked()
+
+    @staticmethod
+    def _encode(documents):
+        buffer = bytearray()
+        for document in documents:
+            payload = bson.encode(document)
+            buffer += _RECORD_HEADER.pack(len(payload), zlib.crc32(payload))
+            buffer += payload
+        return buffer
+
+    def sync(self):
+        """fsync phần dữ liệu chưa được đồng bộ xuống đĩa"""
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._fsync_locked()
+
+    def seal(self):
+        """Đóng segment hiện tại để replayer có thể xử lý"""
+        with self._lock:
+            self._seal_locked()
+
+    def _fsync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        self.fsyncs += 1
+
+    def _seal_locked(self):
+        if self._file is None:
+            return
+
+        self._fsync_locked()
+        path = self._file.name
+        self._file.close()
+        self._file = None
+        os.replace(path, path[:-len(_ACTIVE_SUFFIX)] + _SEALED_SUFFIX)
+        self.segments_sealed += 1
+
+    def has_pending(self):
+        with self._lock:
+            if self._file is not None:
+                return True
+        return bool(self.sealed_segments())
+
+    def sealed_segments(self):
+        """Danh sách segment đã seal, cũ nhất trước"""
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(_SEALED_SUFFIX))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def claim(self, path):
+        """Đổi tên segment để chỉ một process replay nó, trả về path mới hoặc None"""
+        claimed = f'{path}.{self._pid}{_REPLAY_SUFFIX}'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def release(self, claimed_path):
+        """Trả segment về trạng thái chờ replay (khi replay lỗi)"""
+        os.replace(claimed_path, claimed_path.rsplit('.', 2)[0])
+
+    def dead_letter(self, claimed_path, documents):
+        """Ghi các event không replay được vào file .failed cạnh segment (cùng định dạng record)"""
+        segment = claimed_path.rsplit('.', 2)[0]
+        return self._append_failed(segment[:-len(_SEALED_SUFFIX)] + _FAILED_SUFFIX, documents)
+
+    def reject(self, documents):
+        """Ghi các event MongoDB từ chối lúc ghi trực tiếp (không qua segment) vào file .failed của process"""
+        return self._append_failed(os.path.join(self.directory, f'rejected-{self._pid}{_FAILED_SUFFIX}'), documents)
+
+    def _append_failed(self, failed_path, documents):
+        data = self._encode(documents)
+
+        with self._lock:
+            with open(failed_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.dead_lettered += len(documents)
+
+        return failed_path
+
+    def failed_segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(_FAILED_SUFFIX))
+        return [os.path.join(self.directory, n) for n in names]
+
+    @staticmethod
+    def read_segment(path):
+        """Đọc các document trong segment, dừng ở record bị cắt hoặc sai checksum
+
+        Trả về (documents, số bytes hỏng ở cuối).
+        """
+        documents = []
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+
+            documents.append(bson.decode(payload))
+            offset = start + length
+
+        return documents, len(data) - offset
+
+    def get_metrics(self):
+        segments = self.sealed_segments()
+        with self._lock:
+            active_bytes = self._size if self._file is not None else 0
+            unsynced = self._unsynced
+
+        return {
+            'directory': self.directory,
+            'appended': self.appended,
+            'unsynced_records': unsynced,
+            'fsyncs': self.fsyncs,
+            'active_segment_bytes': active_bytes,
+            'pending_segments': len(segments),
+            'pending_bytes': sum(os.path.getsize(p) for p in segments),
+            'failed_segments': len(self.failed_segments()),
+            'dead_lettered': self.dead_lettered
+        }
+
+
+class SpoolReplayer:
+    """Thread nền: kiểm tra MongoDB và replay spool vào attack_logs khi kết nối lại"""
+
+    def __init__(self, spool, attack_log_model, health, ping_fn, interval=5, batch_size=1000, on_recover=None):
+        self.spool = spool
+        self.attack_log = attack_log_model
+        self.health = health
+        self.ping_fn = ping_fn
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_recover = on_recover or []
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._recovered_once = health.is_online()
+
+        # Counters
+        self.replayed = 0
+        self.duplicates = 0
+        self.segments_replayed = 0
+        self.corrupt_bytes = 0
+        self.dead_lettered = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='spool-replayer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop_event.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        # Đảm bảo event trong spool đã nằm trên đĩa
+        self.spool.seal()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.spool.sync()
+                self.tick()
+            except Exception as e:
+                print(f"[ERROR] Loi replay spool: {str(e)}")
+                self.errors += 1
+
+            self._stop_event.wait(self.interval)
+
+    def tick(self):
+        """Một vòng: ping database nếu cần, replay spool khi database online"""
+        if not self.health.is_online() or self.spool.has_pending():
+            try:
+                self.ping_fn()
+            except Exception as e:
+                self.health.mark_offline(e)
+                return
+
+            self.health.mark_online()
+
+            if not self._recovered_once:
+                for callback in self.on_recover:
+                    callback()
+                self._recovered_once = True
+
+        if self.spool.has_pending():
+            self.spool.seal()
+            self.replay()
+
+    def replay(self):
+        """Replay các segment đã seal; an toàn khi chạy lại vì _id sinh phía client"""
+        for path in self.spool.sealed_segments():
+            if self._stop_event.is_set():
+                break
+
+            claimed = self.spool.claim(path)
+            if claimed is None:
+                continue
+
+            documents, corrupt = self.spool.read_segment(claimed)
+            if corrupt:
+                print(f"[WARNING] Segment {os.path.basename(path)} co {corrupt} bytes hong o cuoi")
+                self.corrupt_bytes += corrupt
+
+            for start in range(0, len(documents), self.batch_size):
+                batch = documents[start:start + self.batch_size]
+                rejected = []
+
+                try:
+                    inserted = self.attack_log.insert_many(batch, rejected=rejected)
+                except ConnectionFailure as e:
+                    # Chỉ lỗi kết nối mới là database down: trả segment lại, replay sau
+                    self.spool.release(claimed)
+                    self.health.mark_offline(e)
+                    raise
+                except Exception as e:
+                    print(f"[ERROR] Khong replay duoc {len(batch)} event: {str(e)}")
+                    inserted, rejected = 0, batch
+
+                # Lỗi dữ liệu: chuyển event sang dead-letter và đi tiếp, không replay lại mãi
+                if rejected:
+                    failed_path = self.spool.dead_letter(claimed, rejected)
+                    print(f"[WARNING] {len(rejected)} event bi tu choi, chuyen sang {os.path.basename(failed_path)}")
+                    self.dead_lettered += len(rejected)
+
+                self.replayed += inserted
+                self.duplicates += len(batch) - inserted - len(rejected)
+
+            os.remove(claimed)
+            self.segments_replayed += 1
+
+    def get_metrics(self):
+        metrics = self.spool.get_metrics()
+        metrics.update({
+            'replayed': self.replayed,
+            'duplicates_skipped': self.duplicates,
+            'segments_replayed': self.segments_replayed,
+            'corrupt_bytes': self.corrupt_bytes,
+            'dead_lettered': self.dead_lettered,
+            'errors': self.errors,
+            'running': self._thread is not None and self._thread.is_alive()
+        })
+        return metrics
@@ -0,0 +1,96 @@
+"""
+Tests cho phân tích hành vi IP (AttackAnalyzer.analyze_ip_behavior)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from models.partition import PartitionScheme
+from services.analyzer import AttackAnalyzer
+
+def _attack_log():
+    """AttackLog trên mongomock, partition theo tháng"""
+    mongomock = pytest.importorskip('mongomock')
+    from models.attack_log import AttackLog
+
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    attack_log.partitions = PartitionScheme(
+        attack_log.partitions.db, granularity='month', on_create=attack_log._create_collection_indexes
+    )
+    return attack_log
+
+def _log(ip, timestamp, endpoint, attack_type='balance_scan', method='GET'):
+    return {'_id': ObjectId(), 'timestamp': timestamp, 'ip_address': ip, 'endpoint': endpoint,
+            'attack_type': attack_type, 'method': method}
+
+def test_rate_bucket_seconds():
+    """Test chọn bucket để series có tối đa ~60 điểm"""
+    assert AttackAnalyzer._rate_bucket_seconds(1) == 60
+    assert AttackAnalyzer._rate_bucket_seconds(2) == 300
+    assert AttackAnalyzer._rate_bucket_seconds(24) == 3600
+    assert AttackAnalyzer._rate_bucket_seconds(24 * 7) == 21600
+    assert AttackAnalyzer._rate_bucket_seconds(24 * 365) == 86400
+
+def test_analyze_ip_behavior_merges_partitions():
+    """Test kết quả $facet của các partition được cộng dồn (tháng này + tháng trước)"""
+    attack_log = _attack_log()
+    now = datetime.utcnow().replace(microsecond=0)
+    this_month = now.replace(day=1, hour=0, minute=0, second=0)
+    last_month = this_month - timedelta(hours=6)
+
+    attack_log.insert_many(
+        [_log('6.6.6.6', last_month, '/api/wallet/balance') for _ in range(3)] +
+        [_log('6.6.6.6', now, '/api/wallet/balance') for _ in range(2)] +
+        [_log('6.6.6.6', now, '/api/wallet/import', 'seed_phrase_theft', 'POST')] +
+        [_log('1.1.1.1', now, '/api/wallet/balance')]
+    )
+    assert len(attack_log.partitions.partitions()) == 2
+
+    hours = int((now - last_month).total_seconds() // 3600) + 1
+    result = AttackAnalyzer(attack_log).analyze_ip_behavior('6.6.6.6', hours=hours)
+
+    assert result['total_requests'] == 6
+    assert result['endpoints'] == {'/api/wallet/balance': 5, '/api/wallet/import': 1}
+    # /api/wallet/balance có ở cả hai partition nhưng chỉ được đếm một lần
+    assert result['unique_endpoints'] == 2
+    assert result['unique_endpoints_approximate'] is False
+    assert result['attack_types'] == {'balance_scan': 5, 'seed_phrase_theft': 1}
+    assert result['methods'] == {'GET': 5, 'POST': 1}
+    assert result['most_targeted_endpoint'] == '/api/wallet/balance'
+
+    series = result['request_rate']['series']
+    assert sum(item['count'] for item in series) == 6
+    assert result['request_rate']['peak'] == 3
+    assert not result['is_suspicious']
+
+def test_analyze_ip_behavior_without_events():
+    """Test IP không có event trả về kết quả rỗng, không lỗi"""
+    result = AttackAnalyzer(_attack_log()).analyze_ip_behavior('9.9.9.9', hours=24)
+
+    assert result == {'ip_address': '9.9.9.9', 'total_requests': 0, 'is_suspicious': False}
+
+def test_ip_activity_unique_endpoints_over_limit_is_lower_bound():
+    """Test danh sách endpoint bị cắt ở endpoint_limit: unique_endpoints là cận dưới, có đánh dấu"""
+    attack_log = _attack_log()
+    now = datetime.utcnow().replace(microsecond=0)
+    last_month = now.replace(day=1, hour=0, minute=0, second=0) - timedelta(hours=6)
+
+    attack_log.insert_many(
+        [_log('6.6.6.6', last_month, f'/api/scan/{i}') for i in range(5)] +
+        [_log('6.6.6.6', now, f'/api/scan/{i}') for i in range(3, 7)]
+    )
+
+    activity = attack_log.get_ip_activity('6.6.6.6', last_month - timedelta(hours=1), endpoint_limit=10)
+    assert activity['unique_endpoints'] == 7
+    assert activity['unique_endpoints_approximate'] is False
+
+    activity = attack_log.get_ip_activity('6.6.6.6', last_month - timedelta(hours=1), endpoint_limit=2)
+    assert activity['unique_endpoints'] == 5
+    assert activity['unique_endpoints_approximate'] is True
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
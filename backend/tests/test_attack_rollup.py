@@ -0,0 +1,95 @@
+"""
+Tests cho AttackRollup (rollup thống kê cập nhật lúc ingest)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+from models.attack_rollup import AttackRollup, UNIQUE_OTHER
+
+def _event(ip, timestamp, endpoint='/api/wallet/balance', attack_type='balance_scan'):
+    return {'timestamp': timestamp, 'ip_address': ip, 'endpoint': endpoint, 'attack_type': attack_type}
+
+def test_top_ips_are_trimmed_per_day():
+    """Test IP xoay vòng không làm attack_rollups_ips tăng mãi, top IP vẫn đúng"""
+    rollups = AttackRollup(mongomock.MongoClient()['test'], ip_top_n=50)
+    now = datetime.utcnow()
+
+    for batch in range(40):
+        events = [_event(f'10.{batch}.{i}.1', now) for i in range(20)]
+        events += [_event('6.6.6.6', now)] * 3 + [_event('6.6.6.6', now - timedelta(days=1))]
+        rollups.record(events)
+
+    # 800 IP xoay vòng + 1 IP lặp lại, mỗi ngày giữ tối đa ~2 x ip_top_n
+    assert rollups.ips.count_documents({}) <= 2 * 50 + 1
+    assert rollups.get_top_ips(1) == [{'_id': '6.6.6.6', 'count': 160}]
+
+    rollups.record([_event('6.6.6.6', now)], sign=-1)
+    assert rollups.get_top_ips(1)[0]['count'] == 159
+
+def test_subtract_prunes_only_touched_buckets():
+    """Test trừ về 0 chỉ xóa bucket/IP của lô vừa trừ, không đụng document khác"""
+    rollups = AttackRollup(mongomock.MongoClient()['test'], ip_ttl=7 * 86400)
+    now = datetime.utcnow()
+    events = [_event('6.6.6.6', now), _event('7.7.7.7', now - timedelta(days=2))]
+    rollups.record(events)
+
+    # Document đã về 0 từ trước (không thuộc lô này) được giữ nguyên
+    rollups.buckets['day'].insert_one({'_id': now - timedelta(days=5), 'total': 0})
+
+    rollups.record(events[:1], sign=-1)
+    assert rollups.ips.count_documents({}) == 1
+    assert rollups.buckets['day'].count_documents({'total': {'$lte': 0}}) == 1
+    assert rollups.get_top_ips(10) == [{'_id': '7.7.7.7', 'count': 1}]
+
+    # Mặc định top IP tính trong ip_ttl ngày, days giới hạn khoảng ngắn hơn
+    assert rollups.default_top_ip_days() == 7
+    assert rollups.get_top_ips(10, days=1) == []
+
+def test_unique_ips_estimate():
+    """Test HLL theo ngày ước lượng số IP phân biệt (union nhiều ngày, nhóm theo attack_type)"""
+    rollups = AttackRollup(mongomock.MongoClient()['test'])
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    events = [_event(f'10.{i // 256 % 256}.{i % 256}.1', today + timedelta(hours=1),
+                     attack_type='sqli' if i % 2 else 'xss') for i in range(5000)]
+    # Ngày hôm trước: 1000 IP đã có + 1000 IP mới
+    events += [_event(f'10.{i // 256 % 256}.{i % 256}.1', today - timedelta(hours=12)) for i in range(4000, 6000)]
+    # Chỉ ghi register HLL (record() còn upsert count theo IP, rất chậm trên mongomock)
+    for start in range(0, len(events), 1000):
+        rollups._record_unique(events[start:start + 1000])
+
+    result = rollups.get_unique(today - timedelta(days=1), today, group_by='attack_type')
+    assert abs(result['total'] - 6000) <= 6000 * 0.05
+    assert [item['day'] for item in result['series']] == [today - timedelta(days=1), today]
+    assert abs(result['series'][1]['unique'] - 5000) <= 5000 * 0.05
+    for attack_type, expected in (('sqli', 2500), ('xss', 2500), ('balance_scan', 2000)):
+        assert abs(result['groups'][attack_type] - expected) <= expected * 0.08
+
+def test_unique_endpoint_keys_are_capped():
+    """Test fuzzing endpoint không tạo vô hạn HLL: vượt giới hạn gộp vào '__other__', chỉ trả top-N nhóm"""
+    db = mongomock.MongoClient()['test']
+    rollups = AttackRollup(db, unique_max_keys=10)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    events = [_event(f'10.0.{i % 50}.1', today, endpoint=f'/fuzz/{i}') for i in range(200)]
+    events += [_event(f'10.1.{i}.1', today, endpoint='/fuzz/0') for i in range(100)]
+    rollups.record(events)
+
+    assert db['attack_rollups_unique'].count_documents({'dim': 'endpoint'}) == 11
+
+    # Process khác (cache rỗng) vẫn thấy giới hạn đã đầy
+    AttackRollup(db, unique_max_keys=10, create_indexes=False).record([_event('10.2.0.1', today, endpoint='/new')])
+    assert db['attack_rollups_unique'].count_documents({'dim': 'endpoint'}) == 11
+
+    result = rollups.get_unique(today, today, group_by='endpoint', limit=2)
+    assert result['group_count'] == 11
+    assert list(result['groups']) == ['/fuzz/0', UNIQUE_OTHER]
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,123 @@
+"""
+Tests cho TTLCache, SingleFlight và ResultCache
+"""
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import shared_table
+from utils.cache import TTLCache, SingleFlight, ResultCache, MISSING
+from utils.shared_table import SharedCounterTable
+
+def test_ttl_cache_hit_miss_and_expiry():
+    """Test hit/miss và entry hết hạn"""
+    cache = TTLCache(max_size=10, ttl=60)
+
+    assert cache.get('a') is MISSING
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+
+    # Giá trị None (negative cache) vẫn là một hit
+    cache.set('b', None, ttl=0.01)
+    assert cache.get('b') is None
+    time.sleep(0.02)
+    assert cache.get('b') is MISSING
+
+    metrics = cache.get_metrics()
+    assert metrics['hits'] == 2
+    assert metrics['misses'] == 2
+    assert metrics['expirations'] == 1
+
+def test_ttl_cache_lru_eviction():
+    """Test evict entry ít dùng nhất khi vượt max_size"""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.get_metrics()['evictions'] == 1
+
+def test_singleflight_coalesces_concurrent_calls():
+    """Test các lời gọi đồng thời cùng key chỉ chạy upstream một lần"""
+    flight = SingleFlight()
+    calls = []
+    gate = threading.Event()
+
+    def slow_lookup():
+        calls.append(1)
+        gate.wait(1)
+        return 'result'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do('1.2.3.4', slow_lookup)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert results == ['result'] * 8
+    assert len(calls) == 1
+    assert flight.get_metrics()['coalesced'] == 7
+
+def test_result_cache_invalidated_by_writes_after_staleness_bound():
+    """Test kết quả được dùng lại khi không có event mới, tính lại khi có event mới và quá max_staleness"""
+    cache = ResultCache(ttl=60, max_staleness=0.05)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute('stats', compute) == 1
+    assert cache.get_or_compute('stats', compute) == 1
+
+    # Có event mới nhưng còn trong giới hạn staleness
+    cache.notify_write()
+    assert cache.get_or_compute('stats', compute) == 1
+
+    time.sleep(0.06)
+    assert cache.get_or_compute('stats', compute) == 2
+
+    metrics = cache.get_metrics()
+    assert metrics['recomputes'] == 2
+    assert metrics['stale_invalidations'] == 1
+
+def test_result_cache_shared_version_invalidates_other_workers(tmp_path):
+    """Test event ghi qua một worker làm kết quả cache của worker khác (cùng bảng mmap) cũ đi"""
+    import pytest
+    if shared_table.fcntl is None:
+        pytest.skip('Can fcntl (POSIX)')
+
+    path = str(tmp_path / 'stats_version')
+    writer = ResultCache(ttl=60, max_staleness=0.05, shared_version=SharedCounterTable(path, slots=8, ways=8))
+    reader = ResultCache(ttl=60, max_staleness=0.05, shared_version=SharedCounterTable(path, slots=8, ways=8))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert reader.get_or_compute('stats', compute) == 1
+
+    writer.notify_write(3)
+    assert reader.get_or_compute('stats', compute) == 1
+
+    time.sleep(0.06)
+    assert reader.get_or_compute('stats', compute) == 2
+    assert reader.get_or_compute('stats', compute) == 2
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,101 @@
+"""
+Tests cho CapturePolicy
+"""
+import sys
+import os
+import hashlib
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request
+from utils.capture import CapturePolicy
+
+app = Flask(__name__)
+
+def test_small_json_body_is_kept_and_still_readable():
+    """Test body nhỏ được lưu nguyên và route vẫn đọc được get_json()"""
+    policy = CapturePolicy()
+    body = {'seed_phrase': 'abandon ' * 11 + 'about'}
+
+    with app.test_request_context('/api/wallet/import', method='POST', json=body):
+        captured = policy.capture(request)
+
+        assert captured['payload'] == body
+        assert captured['capture'] is None
+        assert request.get_json() == body
+
+def test_oversized_body_keeps_prefix_and_hash():
+    """Test body vượt giới hạn chỉ giữ phần đầu và sha256 của toàn bộ body"""
+    policy = CapturePolicy(max_body_bytes=1024, max_string=1024, chunk_size=256)
+    raw = json.dumps({'data': 'x' * 10000}).encode()
+
+    with app.test_request_context('/api/transfer', method='POST', data=raw,
+                                  content_type='application/json'):
+        captured = policy.capture(request)
+
+    assert len(captured['payload']) == 1024
+    assert captured['capture']['truncated'] is True
+    assert captured['capture']['truncated_fields'] == ['payload']
+    assert captured['capture']['body_bytes'] == len(raw)
+    assert captured['capture']['body_sha256'] == hashlib.sha256(raw).hexdigest()
+
+def test_depth_keys_and_mongo_unsafe_keys():
+    """Test giới hạn độ sâu, số key và key không hợp lệ với MongoDB"""
+    policy = CapturePolicy(max_depth=3, max_keys=5)
+    nested = {'a': {'b': {'c': {'d': {'e': 1}}}}}
+    wide = {f'k{i}': i for i in range(20)}
+
+    with app.test_request_context('/api/transfer', method='POST',
+                                  json={'nested': nested, 'wide': wide, '$ne': {'x.y': 1}}):
+        captured = policy.capture(request)
+
+    payload = captured['payload']
+    assert payload['nested']['a']['b'] == {'c': '...[truncated]'}
+    assert len(payload['wide']) == 5
+    assert '＄ne' in payload
+    assert payload['＄ne'] == {'x．y': 1}
+    assert captured['capture']['truncated_fields'] == ['payload']
+
+def test_headers_and_query_params_are_capped():
+    """Test giới hạn số lượng và độ dài headers / query params"""
+    policy = CapturePolicy(max_headers=3, max_header_bytes=10, max_query_params=2)
+    headers = {f'X-H{i}': 'v' for i in range(10)}
+    headers['User-Agent'] = 'a' * 100
+
+    with app.test_request_context('/api/wallet/balance?a=1&b=2&c=3', headers=headers):
+        captured = policy.capture(request)
+
+    assert len(captured['headers']) == 3
+    assert len(captured['query_params']) == 2
+    assert captured['capture']['truncated_fields'] == ['headers', 'query_params']
+
+def test_oversized_body_is_logged_and_rejected_with_413():
+    """Test route honeypot trả 413 (không phải 500 do get_json() lỗi) khi body vượt giới hạn, event vẫn được ghi"""
+    import pytest
+    mongomock = pytest.importorskip('mongomock')
+    from middleware.error_handler import register_error_handlers
+    from models.attack_log import AttackLog
+    from routes import api_honeypot
+    from services.logger import AttackLogger
+
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    logger = AttackLogger(attack_log)
+    logger.capture_policy = CapturePolicy(max_body_bytes=256)
+
+    honeypot = Flask(__name__)
+    honeypot.register_blueprint(api_honeypot.honeypot_bp)
+    register_error_handlers(honeypot)
+    api_honeypot.init_honeypot_routes(logger, object(), object())
+    client = honeypot.test_client()
+
+    response = client.post('/api/wallet/import', json={'seed_phrase': 'abandon ' * 200})
+    assert response.status_code == 413
+    assert response.get_json()['success'] is False
+
+    log = attack_log.collection.find_one({'endpoint': '/api/wallet/import'})
+    assert log['response_status'] == 413
+    assert log['capture']['truncated_fields'] == ['payload']
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,86 @@
+"""
+Tests cho EnrichmentWorker (làm giàu geolocation/tool sau khi ghi, backfill log lịch sử)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from services.enrichment import EnrichmentWorker, STATE_ID
+
+class _Tracker:
+    """IP tracker giả: đếm số lần tra cứu theo IP"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_geolocation(self, ip):
+        self.calls.append(ip)
+        return {'country': 'VN', 'city': 'Hanoi'}
+
+class _Analyzer:
+    def identify_attack_tools(self, user_agent):
+        return 'curl' if 'curl' in user_agent else 'Unknown Tool'
+
+def _setup():
+    """AttackLog trên mongomock và collection settings"""
+    mongomock = pytest.importorskip('mongomock')
+    from models.attack_log import AttackLog
+
+    db = mongomock.MongoClient()['test']
+    return AttackLog(db), db['settings']
+
+def _log(ip, minutes_ago=0, **fields):
+    return {'_id': ObjectId(), 'timestamp': datetime.utcnow() - timedelta(minutes=minutes_ago),
+            'ip_address': ip, 'endpoint': '/api/wallet/balance', 'attack_type': 'balance_scan',
+            'user_agent': 'curl/8.0', **fields}
+
+def test_pending_events_are_enriched_once_per_ip():
+    """Test lô pending chỉ tra cứu mỗi IP một lần, xóa cờ enrichment_pending và gắn tool"""
+    attack_log, _ = _setup()
+    attack_log.insert_many([_log('10.0.0.1', i, enrichment_pending=True) for i in range(4)] +
+                           [_log('10.0.0.2', enrichment_pending=True)])
+    tracker = _Tracker()
+    worker = EnrichmentWorker(attack_log, tracker, _Analyzer(), workers=1)
+
+    assert worker.process_pending() == 5
+    assert sorted(tracker.calls) == ['10.0.0.1', '10.0.0.2']
+    assert attack_log.count_pending_enrichment() == 0
+    assert worker.process_pending() == 0
+
+    log = attack_log.collection.find_one({'ip_address': '10.0.0.2'})
+    assert log['geolocation']['country'] == 'VN'
+    assert log['tool'] == 'curl'
+    worker.stop()
+
+def test_backfill_resumes_from_saved_position_after_restart():
+    """Test vị trí backfill được lưu mỗi lô: process mới (restart/đổi lease) chạy tiếp, không quét lại từ đầu"""
+    attack_log, settings = _setup()
+    logs = [_log(f'10.0.1.{i}', 10 - i, geolocation={'country': 'Unknown'}) for i in range(5)]
+    attack_log.insert_many(logs)
+
+    first = EnrichmentWorker(attack_log, _Tracker(), _Analyzer(), batch_size=2, workers=1, state_collection=settings)
+    assert first.backfill_batch() == 2
+    first.stop()
+    assert settings.find_one({'_id': STATE_ID})['backfill_after'] == logs[1]['_id']
+
+    tracker = _Tracker()
+    second = EnrichmentWorker(attack_log, tracker, _Analyzer(), batch_size=2, workers=1, state_collection=settings)
+    second._load_state()
+    while second.backfill_batch():
+        pass
+    second.stop()
+
+    assert sorted(tracker.calls) == [f'10.0.1.{i}' for i in range(2, 5)]
+    assert settings.find_one({'_id': STATE_ID})['backfill_done'] is True
+
+    third = EnrichmentWorker(attack_log, _Tracker(), _Analyzer(), workers=1, state_collection=settings)
+    third._load_state()
+    assert third.backfill_done is True
+    third.stop()
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,42 @@
+"""
+Tests cho EventHub
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.event_hub import EventHub
+
+def test_event_hub_coalesces_events_into_frame():
+    """Test nhiều event giữa hai lần flush được gộp thành một frame với counter deltas"""
+    hub = EventHub(max_events_per_frame=2)
+    subscriber = hub.subscribe()
+
+    for attack_type in ['xss', 'xss', 'sql_injection']:
+        hub.publish({'attack_type': attack_type})
+    hub.flush()
+
+    frame = subscriber.get(timeout=0)
+    assert frame['seq'] == 1
+    # Giữ các event mới nhất, mới nhất trước
+    assert frame['events'] == [{'attack_type': 'sql_injection'}, {'attack_type': 'xss'}]
+    assert frame['deltas'] == {'total': 3, 'attack_types': {'xss': 2, 'sql_injection': 1}}
+    assert subscriber.get(timeout=0) is None
+
+def test_slow_subscriber_drops_frames_without_blocking():
+    """Test buffer đầy thì bỏ frame của client chậm, client khác vẫn nhận đủ"""
+    hub = EventHub(buffer_size=1)
+    slow = hub.subscribe()
+    fast = hub.subscribe()
+
+    for _ in range(3):
+        hub.publish({'attack_type': 'xss'})
+        hub.flush()
+        assert fast.get(timeout=0) is not None
+
+    assert slow.dropped == 2
+    assert slow.get(timeout=0)['seq'] == 1
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
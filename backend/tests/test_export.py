@@ -0,0 +1,66 @@
+"""
+Tests cho streaming export
+"""
+import sys
+import os
+import gzip
+from datetime import datetime
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.export import stream_csv, stream_ndjson, stream_columnar, encode_stream, columnar_available
+
+def _logs(count):
+    for i in range(count):
+        yield {
+            'timestamp': datetime(2026, 1, 1, 0, 0, i % 60),
+            'ip_address': f'10.0.0.{i % 255}',
+            'method': 'GET',
+            'endpoint': '/api/wallet/balance',
+            'attack_type': 'balance_scan',
+            'user_agent': 'curl/8.4.0, "quoted"',
+            'geolocation': {'country': 'VN'}
+        }
+
+def test_stream_csv_yields_bounded_chunks():
+    """Test CSV được chia chunk theo kích thước, ghép lại đủ header + mọi dòng"""
+    chunks = list(stream_csv(_logs(500), chunk_bytes=1024))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < 1024 + 200 for chunk in chunks)
+
+    lines = ''.join(chunks).splitlines()
+    assert lines[0].startswith('Timestamp,IP Address')
+    assert len(lines) == 501
+    assert '"curl/8.4.0, ""quoted"""' in lines[1]
+
+def test_gzip_stream_round_trip():
+    """Test nén gzip on-the-fly giải nén lại đúng nội dung"""
+    chunks = list(stream_csv(_logs(100), chunk_bytes=512))
+    compressed = b''.join(encode_stream(iter(chunks), compress=True))
+
+    assert gzip.decompress(compressed).decode('utf-8') == ''.join(chunks)
+
+def test_ndjson_records_are_flat():
+    """Test mỗi dòng NDJSON là một bản ghi phẳng có geolocation"""
+    import json
+    lines = ''.join(stream_ndjson(_logs(3))).splitlines()
+
+    record = json.loads(lines[0])
+    assert len(lines) == 3
+    assert record['timestamp'] == '2026-01-01T00:00:00Z'
+    assert record['country'] == 'VN'
+    assert record['latitude'] is None
+
+@pytest.mark.skipif(not columnar_available(), reason='pyarrow chua duoc cai dat')
+def test_parquet_written_in_fixed_size_row_groups():
+    """Test parquet được ghi theo record batch cố định và đọc lại đủ dòng"""
+    import io
+    import pyarrow.parquet as pq
+
+    data = b''.join(stream_columnar(_logs(25), 'parquet', batch_rows=10))
+    parquet_file = pq.ParquetFile(io.BytesIO(data))
+
+    assert parquet_file.metadata.num_rows == 25
+    assert parquet_file.num_row_groups == 3
+    assert str(parquet_file.schema_arrow.field('timestamp').type) == 'timestamp[ms, tz=UTC]'
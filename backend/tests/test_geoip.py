@@ -0,0 +1,90 @@
+"""
+Tests cho GeoIP database offline
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.geoip import GeoIPDatabase
+
+CSV_HEADER = 'start_ip,end_ip,country,country_code,region,city,latitude,longitude,timezone,isp\n'
+
+def _write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(CSV_HEADER)
+        for row in rows:
+            f.write(row + '\n')
+
+def _make_db(tmp_path, rows):
+    csv_path = str(tmp_path / 'geoip.csv')
+    _write_csv(csv_path, rows)
+    return GeoIPDatabase(csv_path), csv_path
+
+def test_lookup_ipv4_ranges(tmp_path):
+    """Test tra cứu IPv4 trong và ngoài range"""
+    db, _ = _make_db(tmp_path, [
+        '8.8.8.0,8.8.8.255,United States,US,California,Mountain View,37.4,-122.1,America/Los_Angeles,Google',
+        '1.0.0.0,1.0.0.255,Australia,AU,Queensland,Brisbane,-27.4,153.0,Australia/Brisbane,Cloudflare',
+    ])
+
+    location = db.lookup('8.8.8.8')
+    assert location['country'] == 'United States'
+    assert location['city'] == 'Mountain View'
+    assert location['latitude'] == 37.4
+
+    assert db.lookup('1.0.0.0')['country_code'] == 'AU'
+    assert db.lookup('1.0.0.255')['country_code'] == 'AU'
+    assert db.lookup('1.0.1.0') is None
+    assert db.lookup('0.0.0.1') is None
+
+def test_lookup_ipv6_and_mapped(tmp_path):
+    """Test tra cứu IPv6 và IPv4-mapped IPv6"""
+    db, _ = _make_db(tmp_path, [
+        '2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,United States,US,,,0,0,,Google',
+        '8.8.8.0,8.8.8.255,United States,US,California,Mountain View,37.4,-122.1,America/Los_Angeles,Google',
+    ])
+
+    assert db.lookup('2001:4860:4860::8888')['isp'] == 'Google'
+    assert db.lookup('2001:4861::1') is None
+    assert db.lookup('::ffff:8.8.8.8')['city'] == 'Mountain View'
+    assert db.lookup('not-an-ip') is None
+
+def test_reload_on_file_change(tmp_path):
+    """Test reload khi file CSV thay đổi"""
+    db, csv_path = _make_db(tmp_path, [
+        '8.8.8.0,8.8.8.255,United States,US,,,0,0,,Google',
+    ])
+    db.reload_check_interval = 0
+
+    _write_csv(csv_path, ['8.8.8.0,8.8.8.255,Vietnam,VN,,,0,0,,Test'])
+    future = time.time() + 10
+    os.utime(csv_path, (future, future))
+
+    db.lookup('8.8.8.8')
+    for _ in range(100):
+        if db.lookup('8.8.8.8')['country'] == 'Vietnam':
+            break
+        time.sleep(0.01)
+
+    assert db.lookup('8.8.8.8')['country'] == 'Vietnam'
+
+def test_reload_closes_old_table(tmp_path):
+    """Test reload đóng mmap của bảng cũ và không để lại file tạm"""
+    db, csv_path = _make_db(tmp_path, [
+        '8.8.8.0,8.8.8.255,United States,US,,,0,0,,Google',
+    ])
+    old_table = db._table
+
+    _write_csv(csv_path, ['8.8.8.0,8.8.8.255,Vietnam,VN,,,0,0,,Test'])
+    future = time.time() + 10
+    os.utime(csv_path, (future, future))
+    db.load()
+
+    assert old_table.mm.closed
+    assert db.lookup('8.8.8.8')['country'] == 'Vietnam'
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,69 @@
+"""
+Tests cho header set dedup (upsert theo lô cùng attack logs)
+"""
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+from models.attack_log import AttackLog, PENDING_HEADERS_FIELD
+
+class _Writer:
+    def __init__(self):
+        self.batch = []
+
+    def enqueue(self, document):
+        self.batch.append(document)
+
+def _attack_log():
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    attack_log.rollups = None
+    attack_log.attach_writer(_Writer())
+    return attack_log
+
+def test_create_does_not_touch_header_sets():
+    """Test request chỉ tính fingerprint, header set được ghi cùng lô"""
+    attack_log = _attack_log()
+    headers = {'User-Agent': 'sqlmap/1.7', 'Accept': '*/*'}
+
+    for _ in range(3):
+        attack_log.create({'ip_address': '1.2.3.4', 'headers': headers, 'user_agent': 'sqlmap/1.7'})
+
+    assert attack_log.header_sets.collection.count_documents({}) == 0
+
+    batch = attack_log.writer.batch
+    assert all(entry[PENDING_HEADERS_FIELD] == headers for entry in batch)
+    assert len({entry['header_fp'] for entry in batch}) == 1
+
+    assert attack_log.insert_many(batch) == 3
+    assert attack_log.header_sets.collection.count_documents({}) == 1
+    assert all(PENDING_HEADERS_FIELD not in log for log in attack_log.collection.find())
+
+    # Fingerprint đã biết: event sau không mang headers nữa
+    attack_log.create({'ip_address': '1.2.3.4', 'headers': headers})
+    assert PENDING_HEADERS_FIELD not in attack_log.writer.batch[-1]
+
+    logs = attack_log._rehydrate_headers(list(attack_log.collection.find()))
+    assert all(log['headers'] == headers and log['user_agent'] == 'sqlmap/1.7' for log in logs)
+
+def test_failed_header_write_keeps_headers_for_spool():
+    """Test lỗi ghi header set giữ nguyên headers trong event (để spool)"""
+    attack_log = _attack_log()
+    attack_log.create({'ip_address': '1.2.3.4', 'headers': {'Accept': '*/*'}})
+    batch = attack_log.writer.batch
+
+    def fail(pending):
+        raise RuntimeError('down')
+    attack_log.header_sets.store_many = fail
+
+    with pytest.raises(RuntimeError):
+        attack_log.insert_many(batch)
+
+    assert batch[0][PENDING_HEADERS_FIELD] == {'Accept': '*/*'}
+    assert attack_log.collection.count_documents({}) == 0
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,181 @@
+"""
+Tests cho HyperLogLog và profile IP trong bộ nhớ
+"""
+import sys
+import os
+import time
+from datetime import datetime
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.hyperloglog import HyperLogLog
+from services.ip_profiles import IPProfileStore
+
+def test_hyperloglog_estimate():
+    """Test ước lượng nằm trong sai số chuẩn và phần tử lặp không làm tăng count"""
+    hll = HyperLogLog(precision=10)
+    for i in range(20000):
+        hll.add(f'/endpoint/{i}')
+        hll.add(f'/endpoint/{i}')
+
+    assert abs(hll.count() - 20000) < 20000 * 0.1
+
+    small = HyperLogLog(precision=10)
+    for i in range(10):
+        small.add(i)
+    assert small.count() == 10
+
+def test_hyperloglog_merge_and_bytes():
+    """Test merge hai sketch và serialize registers"""
+    a, b = HyperLogLog(8), HyperLogLog(8)
+    for i in range(500):
+        a.add(i)
+        b.add(i + 250)
+
+    restored = HyperLogLog.from_bytes(a.to_bytes(), 8)
+    restored.merge(b)
+    assert abs(restored.count() - 750) < 750 * 0.2
+
+def test_profile_window_and_lru():
+    """Test sliding window bỏ event cũ và IP lạnh bị loại khi vượt max_ips"""
+    store = IPProfileStore(max_ips=2, window_seconds=60)
+
+    store.record('1.1.1.1', '/a', 'sqli', now=1000)
+    store.record('1.1.1.1', '/b', 'xss', now=1050)
+    profile = store.get('1.1.1.1', now=1050)
+    assert profile['total_requests'] == 2
+    assert profile['window_requests'] == 2
+    assert profile['unique_endpoints'] == 2
+    assert store.get('1.1.1.1', now=1200)['window_requests'] == 0
+
+    store.record('2.2.2.2', '/a', 'sqli', now=1060)
+    store.record('1.1.1.1', '/a', 'sqli', now=1061)
+    store.record('3.3.3.3', '/a', 'sqli', now=1062)
+    assert store.get('2.2.2.2') is None
+    assert store.get('1.1.1.1') is not None
+
+def test_evicted_profiles_are_bounded_while_offline():
+    """Test profile bị loại chờ snapshot có giới hạn khi MongoDB offline, phần bị bỏ được đếm"""
+    store = IPProfileStore(collection=object(), max_ips=100, is_online=lambda: False)
+
+    for i in range(20000):
+        store.record(f'10.{i // 65536}.{i // 256 % 256}.{i % 256}', '/a', 'sqli', now=1000)
+
+    metrics = store.get_metrics()
+    assert metrics['profiles'] == 100
+    assert metrics['evicted_pending'] == 100
+    assert metrics['evicted_dropped'] == 20000 - 200
+
+def test_snapshot_merges_into_stored_profile():
+    """Test snapshot gộp vào document đã lưu: IP bị loại rồi quay lại và hai worker cùng ghi một IP"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.ip_profiles
+
+    store = IPProfileStore(collection=collection, max_ips=1)
+    store.record('1.1.1.1', '/a', 'sqli', now=1000)
+    store.record('1.1.1.1', '/b', 'sqli', now=1010)
+    store.snapshot()
+
+    # Bị loại khỏi LRU rồi quay lại với profile mới (total=1)
+    store.record('2.2.2.2', '/a', 'xss', now=1020)
+    store.record('1.1.1.1', '/c', 'xss', now=1030)
+    store.snapshot()
+
+    other = IPProfileStore(collection=collection)
+    other.record('1.1.1.1', '/d', 'sqli', now=900)
+    other.snapshot()
+
+    doc = collection.find_one({'_id': '1.1.1.1'})
+    assert doc['total'] == 4
+    assert doc['attack_types'] == {'sqli': 3, 'xss': 1}
+    assert doc['first_seen'] == datetime.utcfromtimestamp(900)
+    assert doc['last_seen'] == datetime.utcfromtimestamp(1030)
+
+    registers = bytearray(2 ** doc['hll_precision'])
+    for index, rank in doc['endpoint_registers'].items():
+        registers[int(index)] = rank
+    assert round(HyperLogLog.from_bytes(bytes(registers), doc['hll_precision']).count()) == 4
+
+def test_get_merges_snapshots_of_other_workers():
+    """Test get() gộp document đã snapshot của worker khác với phần chưa ghi trong bộ nhớ"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.ip_profiles
+    now = 1_000_000
+
+    worker_a = IPProfileStore(collection=collection, window_seconds=600)
+    worker_b = IPProfileStore(collection=collection, window_seconds=600)
+
+    worker_a.record('1.1.1.1', '/a', 'sqli', now=now - 900)
+    worker_a.record('1.1.1.1', '/b', 'sqli', now=now - 10)
+    worker_a.snapshot(now=now)
+
+    worker_b.record('1.1.1.1', '/c', 'xss', now=now - 5)
+
+    profile = worker_b.get('1.1.1.1', now=now)
+    assert profile['stored'] is True
+    assert profile['total_requests'] == 3
+    assert profile['window_requests'] == 2
+    assert profile['unique_endpoints'] == 3
+    assert profile['attack_types'] == {'sqli': 2, 'xss': 1}
+    assert profile['first_seen'] == datetime.utcfromtimestamp(now - 900)
+
+    # Không đọc được snapshot: chỉ còn phần trong bộ nhớ
+    worker_b.is_online = lambda: False
+    profile = worker_b.get('1.1.1.1', now=now)
+    assert profile['stored'] is False
+    assert profile['total_requests'] == 1
+
+def test_snapshot_drops_window_slots_outside_window():
+    """Test ô window ngoài window bị $unset khi snapshot để document không lớn dần"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.ip_profiles
+    store = IPProfileStore(collection=collection, window_seconds=120)
+
+    store.record('1.1.1.1', '/a', 'sqli', now=1000)
+    store.snapshot(now=1000)
+    assert collection.find_one({'_id': '1.1.1.1'})['window_slots'] == {str(1000 // 10): 1}
+
+    # IP nghỉ hơn một window: ô cũ nằm ngoài khoảng $unset mặc định, được dọn sau khi get() đọc thấy
+    store.record('1.1.1.1', '/a', 'sqli', now=1300)
+    store.snapshot(now=1300)
+    assert store.get('1.1.1.1', now=1300)['window_requests'] == 1
+
+    store.record('1.1.1.1', '/a', 'sqli', now=1301)
+    store.snapshot(now=1301)
+    assert collection.find_one({'_id': '1.1.1.1'})['window_slots'] == {str(1300 // 10): 2}
+
+def test_load_restores_recent_profiles_at_startup():
+    """Test profile của IP hoạt động trong window được nạp lại khi khởi động, IP cũ thì không"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.ip_profiles
+    now = time.time()
+
+    before = IPProfileStore(collection=collection, window_seconds=600)
+    before.record('1.1.1.1', '/a', 'sqli', now=now - 60)
+    before.record('1.1.1.1', '/b', 'xss', now=now - 30)
+    before.record('9.9.9.9', '/a', 'sqli', now=now - 3600)
+    before.snapshot(now=now)
+
+    online = [True]
+    after = IPProfileStore(collection=collection, window_seconds=600, is_online=lambda: online[0])
+    assert after.load(now=now) == 1
+    assert after.get('9.9.9.9') is None
+
+    # MongoDB offline sau khi nạp: profile trong bộ nhớ đã có lịch sử của snapshot
+    online[0] = False
+    profile = after.get('1.1.1.1', now=now)
+    assert profile['total_requests'] == 2
+    assert profile['window_requests'] == 2
+    assert profile['unique_endpoints'] == 2
+    assert profile['attack_types'] == {'sqli': 1, 'xss': 1}
+
+    # Phần đã nạp không bị ghi lại (không $inc hai lần)
+    online[0] = True
+    after.record('1.1.1.1', '/c', 'sqli', now=now)
+    after.snapshot(now=now)
+    assert collection.find_one({'_id': '1.1.1.1'})['total'] == 3
+    assert after.get('1.1.1.1', now=now)['total_requests'] == 3
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,137 @@
+"""
+Tests cho IngestQueue (write-behind theo lô) và đường ghi lô của AttackLog
+"""
+import sys
+import os
+import threading
+import time
+from datetime import datetime
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from pymongo.errors import WTimeoutError
+from services.ingest_queue import IngestQueue
+from services.spool import EventSpool
+
+class _Recorder:
+    """flush_fn giả: lưu các lô đã ghi, có thể giả lập lỗi"""
+
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self.flushed = threading.Event()
+
+    def __call__(self, batch):
+        if self.error is not None:
+            raise self.error
+        self.batches.append(list(batch))
+        self.flushed.set()
+
+def test_flush_on_batch_size():
+    """Test queue gom event thành lô tối đa batch_size"""
+    recorder = _Recorder()
+    ingest = IngestQueue(recorder, batch_size=4, flush_interval=5)
+
+    for i in range(10):
+        ingest.enqueue({'n': i})
+    ingest.stop()
+
+    assert [len(batch) for batch in recorder.batches] == [4, 4, 2]
+    metrics = ingest.get_metrics()
+    assert metrics['enqueued'] == 10
+    assert metrics['written'] == 10
+    assert metrics['batches'] == 3
+    assert metrics['high_watermark'] == 10
+
+def test_flush_on_interval():
+    """Test lô chưa đủ batch_size vẫn được ghi sau flush_interval"""
+    recorder = _Recorder()
+    ingest = IngestQueue(recorder, batch_size=100, flush_interval=0.05)
+    ingest.start()
+
+    started = time.monotonic()
+    ingest.enqueue({'n': 1})
+    ingest.enqueue({'n': 2})
+    assert recorder.flushed.wait(2)
+    ingest.stop()
+
+    assert time.monotonic() - started < 1
+    assert recorder.batches == [[{'n': 1}, {'n': 2}]]
+
+def test_overflow_goes_to_spill():
+    """Test queue đầy: event được chuyển cho overflow_fn, không chặn request"""
+    recorder = _Recorder()
+    spilled = []
+    ingest = IngestQueue(recorder, max_size=2, overflow_fn=spilled.extend)
+
+    for i in range(5):
+        ingest.enqueue({'n': i})
+
+    assert spilled == [{'n': 2}, {'n': 3}, {'n': 4}]
+    assert ingest.get_metrics()['overflow'] == 3
+    ingest.stop()
+    assert recorder.batches == [[{'n': 0}, {'n': 1}]]
+
+def test_failed_batch_is_spilled_not_dropped():
+    """Test lô ghi lỗi được chuyển vào spool, chỉ đếm failed khi spool cũng lỗi"""
+    spilled = []
+    ingest = IngestQueue(_Recorder(error=RuntimeError('boom')), overflow_fn=spilled.extend)
+    ingest.enqueue({'n': 1})
+    ingest.stop()
+
+    assert spilled == [{'n': 1}]
+    assert ingest.get_metrics()['spilled'] == 1
+    assert ingest.get_metrics()['failed'] == 0
+
+    def broken_spill(batch):
+        raise OSError('disk full')
+
+    ingest = IngestQueue(_Recorder(error=RuntimeError('boom')), overflow_fn=broken_spill)
+    ingest.enqueue({'n': 1})
+    ingest.stop()
+    assert ingest.get_metrics()['failed'] == 1
+
+def _attack_log(tmp_path):
+    mongomock = pytest.importorskip('mongomock')
+    from models.attack_log import AttackLog
+
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    attack_log.attach_spool(EventSpool(str(tmp_path)))
+    return attack_log
+
+def _events(count):
+    return [{'_id': ObjectId(), 'timestamp': datetime.utcnow(), 'ip_address': f'10.0.0.{i}',
+             'endpoint': '/api/transfer', 'attack_type': 'transfer'} for i in range(count)]
+
+def test_write_batch_dead_letters_rejected_events(tmp_path):
+    """Test event MongoDB từ chối vào dead-letter, phần còn lại của lô vẫn được ghi"""
+    attack_log = _attack_log(tmp_path)
+    events = _events(3)
+
+    def insert_partition(entries):
+        return entries[1:], entries[:1], RuntimeError('document failed validation')
+    attack_log._insert_partition = insert_partition
+
+    assert attack_log.write_batch(events) == 2
+    assert attack_log.spool.dead_lettered == 1
+    documents, _ = EventSpool.read_segment(attack_log.spool.failed_segments()[0])
+    assert [document['_id'] for document in documents] == [events[0]['_id']]
+
+def test_write_batch_spools_batch_on_other_errors(tmp_path):
+    """Test lỗi khác của cả lô (write concern timeout) chuyển cả lô vào spool thay vì bỏ"""
+    attack_log = _attack_log(tmp_path)
+    events = _events(3)
+
+    def insert_partition(entries):
+        raise WTimeoutError('waiting for replication timed out')
+    attack_log._insert_partition = insert_partition
+
+    assert attack_log.write_batch(events) == 0
+    attack_log.spool.seal()
+    documents, _ = EventSpool.read_segment(attack_log.spool.sealed_segments()[0])
+    assert [document['_id'] for document in documents] == [event['_id'] for event in events]
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,55 @@
+"""
+Tests cho JobLease (chỉ một worker chạy job nền)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+from utils.job_lease import JobLease
+
+def test_only_one_worker_holds_lease():
+    """Test chỉ một worker giữ lease, worker khác nhận khi lease được trả hoặc hết hạn"""
+    collection = mongomock.MongoClient().db.job_leases
+    a = JobLease(collection, 'retention', ttl=30, owner='a')
+    b = JobLease(collection, 'retention', ttl=30, owner='b')
+
+    assert a.is_held()
+    assert not b.is_held()
+
+    # Trả lease khi dừng: b nhận ở lần kiểm tra sau
+    a.release()
+    b._check_at = 0
+    assert b.is_held()
+    assert collection.find_one({'_id': 'retention'})['owner'] == 'b'
+
+    # b chết (không gia hạn): lease hết hạn thì a nhận lại
+    collection.update_one({'_id': 'retention'}, {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=1)}})
+    a._check_at = 0
+    assert a.is_held()
+    b._check_at = 0
+    assert not b.is_held()
+    assert b.get_metrics()['lost'] == 1
+
+def test_lease_expires_locally_when_renewal_fails():
+    """Test không gia hạn được (MongoDB lỗi) quá ttl thì worker tự coi như mất lease"""
+    class _FailingCollection:
+        def update_one(self, *args, **kwargs):
+            raise RuntimeError('down')
+
+    lease = JobLease(mongomock.MongoClient().db.job_leases, 'enrichment', ttl=30, owner='a')
+    assert lease.is_held()
+
+    lease.collection = _FailingCollection()
+    lease._check_at = 0
+    assert lease.is_held()
+
+    lease._valid_until = 0
+    assert not lease.is_held()
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,62 @@
+"""
+Tests cho wallet/settings khi MongoDB down và khi kết nối lại
+"""
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+from flask import Flask
+from models.wallet import Wallet, SUMMARY_FIELDS
+from routes import api_honeypot
+from routes import settings as settings_routes
+from utils.db_health import DatabaseHealth
+
+def test_wallet_serves_fake_data_while_offline():
+    """Test wallet list/detail/delete trả fake response ngay khi MongoDB down, không query"""
+    health = DatabaseHealth(online=False)
+    wallet = Wallet(mongomock.MongoClient().db, health=health, create_indexes=False)
+    wallet.collection = None
+
+    result = wallet.get_all(limit=5, projection={field: 1 for field in SUMMARY_FIELDS})
+    assert len(result['wallets']) == 5
+    assert all('private_key' not in item for item in result['wallets'])
+    assert len(wallet.get_all(limit=5)['wallets'][0]['private_key']) > 0
+
+    assert wallet.get_by_address('0xabc')['address'] == '0xabc'
+    assert wallet.delete('0xabc') is True
+
+def test_wallet_list_defaults_to_full_view_for_attackers():
+    """Test /api/wallet/list mặc định trả đủ field bait, dashboard dùng view=summary"""
+    wallet = Wallet(mongomock.MongoClient().db, health=DatabaseHealth(online=False), create_indexes=False)
+    app = Flask(__name__)
+    app.register_blueprint(api_honeypot.honeypot_bp)
+    api_honeypot.init_honeypot_routes(None, None, wallet)
+    client = app.test_client()
+
+    wallets = client.get('/api/wallet/list?limit=3').get_json()['data']['wallets']
+    assert all(item['private_key'] and item['seed_phrase'] for item in wallets)
+
+    wallets = client.get('/api/wallet/list?limit=3&view=summary').get_json()['data']['wallets']
+    assert all('private_key' not in item for item in wallets)
+
+def test_settings_recover_after_mongodb_comes_back():
+    """Test /api/settings trả 503 khi MongoDB down lúc khởi động, hoạt động lại khi kết nối lại"""
+    health = DatabaseHealth(online=False)
+    app = Flask(__name__)
+    app.register_blueprint(settings_routes.settings_bp)
+    settings_routes.init_settings_routes(mongomock.MongoClient().db, health=health)
+    client = app.test_client()
+
+    assert client.get('/api/settings').status_code == 503
+
+    health.mark_online()
+    response = client.get('/api/settings')
+    assert response.status_code == 200
+    assert response.get_json()['data']['database']['log_retention_days'] == 90
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,86 @@
+"""
+Tests cho cursor pagination
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from utils.pagination import encode_cursor, decode_cursor
+
+def _attack_log(count):
+    """AttackLog trên mongomock với `count` log, một số log trùng timestamp"""
+    mongomock = pytest.importorskip('mongomock')
+    from models.attack_log import AttackLog
+
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    start = datetime(2026, 1, 1)
+    attack_log.insert_many([
+        {
+            '_id': ObjectId(),
+            'timestamp': start + timedelta(minutes=i // 2),
+            'ip_address': f'10.0.0.{i}',
+            'endpoint': '/api/wallet/balance',
+            'attack_type': 'balance_scan' if i % 3 else 'sql_injection'
+        }
+        for i in range(count)
+    ])
+    return attack_log
+
+def test_cursor_round_trip():
+    """Test cursor mã hóa và giải mã lại đúng (timestamp, _id)"""
+    timestamp = datetime(2026, 1, 2, 3, 4, 5, 678000)
+    object_id = ObjectId()
+
+    assert decode_cursor(encode_cursor(timestamp, object_id)) == (timestamp, object_id)
+
+def test_invalid_cursor_raises_value_error():
+    """Test cursor sai định dạng báo ValueError"""
+    for cursor in ['garbage', encode_cursor(datetime(2026, 1, 1), 'x' * 24)]:
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+def test_get_all_walks_pages_with_after_and_before():
+    """Test đi hết các trang bằng after, quay lại bằng before, thứ tự luôn giảm dần và không trùng/thiếu"""
+    attack_log = _attack_log(25)
+    expected = [str(doc['_id']) for doc in attack_log.collection.find().sort([('timestamp', -1), ('_id', -1)])]
+
+    pages = [attack_log.get_all(limit=10)]
+    while pages[-1]['next_cursor']:
+        pages.append(attack_log.get_all(limit=10, after=pages[-1]['next_cursor']))
+
+    assert [len(page['logs']) for page in pages] == [10, 10, 5]
+    assert [log['_id'] for page in pages for log in page['logs']] == expected
+
+    # Trang đầu không có prev_cursor, trang sau có; trang cuối không có next_cursor
+    assert pages[0]['prev_cursor'] is None and pages[0]['page'] == 1
+    assert pages[1]['prev_cursor'] is not None and 'page' not in pages[1]
+    assert pages[2]['next_cursor'] is None
+
+    # before trả về trang liền trước, đã đảo lại theo thứ tự giảm dần
+    previous = attack_log.get_all(limit=10, before=pages[2]['prev_cursor'])
+    assert [log['_id'] for log in previous['logs']] == expected[10:20]
+    assert previous['prev_cursor'] is not None
+    assert previous['next_cursor'] is not None
+
+    first = attack_log.get_all(limit=10, before=previous['prev_cursor'])
+    assert [log['_id'] for log in first['logs']] == expected[:10]
+    assert first['prev_cursor'] is None
+
+def test_get_all_total_modes():
+    """Test total theo chế độ exact / estimated / none"""
+    attack_log = _attack_log(25)
+
+    assert attack_log.get_all(limit=5)['total'] == 25
+    assert attack_log.get_all(limit=5, total='estimated')['total'] == 25
+    assert attack_log.get_all(limit=5, total='none')['total'] is None
+
+    filters = {'attack_type': 'sql_injection'}
+    assert attack_log.get_all(limit=5, filters=filters)['total'] == 9
+    assert attack_log.get_all(limit=5, filters=filters, total='estimated')['total'] == 9
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,82 @@
+"""
+Tests cho partition attack_logs theo thời gian
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.partition import PartitionScheme
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        return name
+
+    def list_collection_names(self):
+        return ['attack_logs', 'attack_logs_202601', 'attack_logs_202602', 'attack_logs_202603', 'wallets']
+
+def test_name_and_range():
+    """Test tên partition tháng/tuần và khoảng thời gian tương ứng"""
+    monthly = PartitionScheme(FakeDB(), granularity='month')
+    assert monthly.name_for(datetime(2026, 12, 31, 23, 59)) == 'attack_logs_202612'
+    assert monthly.range_for('attack_logs_202612') == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+    assert monthly.range_for('attack_logs') is None
+
+    weekly = PartitionScheme(FakeDB(), granularity='week')
+    name = weekly.name_for(datetime(2026, 1, 1))
+    assert name == 'attack_logs_2026w01'
+    start, end = weekly.range_for(name)
+    assert start <= datetime(2026, 1, 1) < end
+
+def test_partition_pruning():
+    """Test chỉ chọn các partition giao với khoảng thời gian query"""
+    monthly = PartitionScheme(FakeDB(), granularity='month')
+
+    assert monthly.partitions() == ['attack_logs_202603', 'attack_logs_202602', 'attack_logs_202601']
+    assert monthly.partitions(start=datetime(2026, 2, 10), end=datetime(2026, 2, 20)) == ['attack_logs_202602']
+    assert monthly.partitions(start=datetime(2026, 2, 1), newest_first=False) == ['attack_logs_202602', 'attack_logs_202603']
+
+def test_disabled_uses_base_collection():
+    """Test granularity none giữ một collection duy nhất"""
+    scheme = PartitionScheme(FakeDB())
+    assert scheme.name_for(datetime(2026, 1, 1)) == 'attack_logs'
+    assert scheme.partitions(start=datetime(2026, 1, 1)) == ['attack_logs']
+
+def test_drop_expired_partitions_subtracts_rollups_from_day_buckets():
+    """Test drop partition trừ rollup theo bucket ngày, partition còn lại giữ nguyên"""
+    mongomock = pytest.importorskip('mongomock')
+    from bson import ObjectId
+    from models.attack_log import AttackLog
+
+    attack_log = AttackLog(mongomock.MongoClient()['test'])
+    attack_log.partitions = PartitionScheme(attack_log.partitions.db, granularity='month')
+
+    def log(timestamp, attack_type):
+        return {'_id': ObjectId(), 'timestamp': timestamp, 'ip_address': f'10.0.0.{timestamp.month}',
+                'endpoint': '/api/wallet/balance', 'attack_type': attack_type}
+
+    # Tháng trước và tháng này (mongomock áp dụng TTL index của count IP theo ngày)
+    now = datetime.utcnow()
+    this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = this_month - timedelta(days=1)
+
+    attack_log.insert_many(
+        [log(last_month - timedelta(hours=hour), 'balance_scan') for hour in (1, 2, 3)] +
+        [log(now, 'sql_injection')]
+    )
+
+    assert attack_log.drop_expired_partitions(this_month) == 3
+    assert attack_log.partitions.partitions() == [attack_log.partitions.name_for(now)]
+
+    rollups = attack_log.rollups
+    totals = rollups.get_totals()
+    assert totals['total'] == 1
+    assert totals['attack_types']['balance_scan'] == 0
+    assert totals['attack_types']['sql_injection'] == 1
+    assert rollups.buckets['day'].count_documents({}) == 1
+    assert rollups.get_top_ips(10) == [{'_id': f'10.0.0.{now.month}', 'count': 1}]
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
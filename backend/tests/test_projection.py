@@ -0,0 +1,35 @@
+"""
+Tests cho build_projection
+"""
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.projection import build_projection
+
+ALLOWED = ('timestamp', 'ip_address', 'geolocation')
+
+def test_child_path_dropped_when_parent_selected():
+    """Test field con bị bỏ khi field cha đã được chọn (tránh path collision)"""
+    projection = build_projection(
+        fields='geolocation.country,geolocation,ip_address',
+        allowed_fields=ALLOWED,
+        required_fields=('timestamp',)
+    )
+
+    assert projection == {'geolocation': 1, 'ip_address': 1, 'timestamp': 1}
+
+def test_summary_and_invalid_fields():
+    """Test view summary và field không hợp lệ"""
+    assert build_projection(summary_fields=('ip_address', 'geolocation.country')) == {
+        'ip_address': 1, 'geolocation.country': 1
+    }
+    assert build_projection(view='full') is None
+
+    with pytest.raises(ValueError):
+        build_projection(fields='password', allowed_fields=ALLOWED)
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,39 @@
+"""
+Tests cho sliding window rate limiter
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.rate_limiter import SlidingWindowRateLimiter
+
+def test_limit_and_sliding_window():
+    """Test chặn khi vượt giới hạn và window trước được tính theo tỷ lệ thời gian còn lại"""
+    limiter = SlidingWindowRateLimiter(shards=4)
+
+    assert all(limiter.is_allowed('1.1.1.1', 10, 60, now=0) for _ in range(10))
+    assert not limiter.is_allowed('1.1.1.1', 10, 60, now=30)
+    assert limiter.is_allowed('2.2.2.2', 10, 60, now=30)
+
+    # Giữa window kế tiếp: còn 50% của 10 request trước -> được thêm 5
+    allowed = sum(limiter.is_allowed('1.1.1.1', 10, 60, now=90) for _ in range(10))
+    assert allowed == 5
+
+    # Sau hai window không hoạt động thì reset
+    assert limiter.is_allowed('1.1.1.1', 10, 60, now=300)
+
+def test_bounded_keys_and_sweeper():
+    """Test số key bị giới hạn và sweeper dọn key không hoạt động"""
+    limiter = SlidingWindowRateLimiter(shards=2, max_keys=100)
+    for i in range(1000):
+        limiter.is_allowed(f'10.0.{i // 256}.{i % 256}', 5, 60, now=0)
+
+    keys = len(limiter)
+    assert keys <= 100
+    assert limiter.cleanup(now=60) == 0
+    assert limiter.cleanup(now=120) == keys
+    assert len(limiter) == 0
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,143 @@
+"""
+Tests cho retention worker (maintenance window, xóa theo lô, checkpoint, giới hạn tốc độ)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from services.retention import parse_window, in_window, RetentionWorker, STATE_ID
+
+def _setup(expired=25, recent=5):
+    """AttackLog trên mongomock với `expired` log quá 90 ngày và `recent` log mới"""
+    mongomock = pytest.importorskip('mongomock')
+    from models.attack_log import AttackLog
+
+    db = mongomock.MongoClient()['test']
+    attack_log = AttackLog(db)
+    now = datetime.utcnow()
+
+    attack_log.insert_many([
+        {'_id': ObjectId(), 'timestamp': now - timedelta(days=100, minutes=i), 'ip_address': '10.0.0.1',
+         'endpoint': '/api/wallet/balance', 'attack_type': 'balance_scan'}
+        for i in range(expired)
+    ] + [
+        {'_id': ObjectId(), 'timestamp': now - timedelta(minutes=i), 'ip_address': '10.0.0.2',
+         'endpoint': '/api/wallet/balance', 'attack_type': 'balance_scan'}
+        for i in range(recent)
+    ])
+    return attack_log, db['settings']
+
+class _BusyWriter:
+    max_size = 100
+
+    def qsize(self):
+        return 80
+
+def test_window_same_day():
+    """Test window trong cùng một ngày"""
+    window = parse_window('02:00-05:30')
+
+    assert window == (120, 330)
+    assert in_window(window, datetime(2026, 1, 1, 2, 0))
+    assert in_window(window, datetime(2026, 1, 1, 5, 29))
+    assert not in_window(window, datetime(2026, 1, 1, 5, 30))
+
+def test_window_over_midnight():
+    """Test window qua nửa đêm và window rỗng (chạy mọi lúc)"""
+    window = parse_window('22:00-04:00')
+
+    assert in_window(window, datetime(2026, 1, 1, 23, 0))
+    assert in_window(window, datetime(2026, 1, 1, 3, 59))
+    assert not in_window(window, datetime(2026, 1, 1, 12, 0))
+    assert in_window(parse_window(''), datetime(2026, 1, 1, 12, 0))
+
+def test_invalid_window():
+    """Test window sai định dạng bị từ chối"""
+    with pytest.raises(ValueError):
+        parse_window('25:00-03:00')
+    with pytest.raises(ValueError):
+        parse_window('nightly')
+
+def test_run_batch_resumes_from_checkpoint():
+    """Test xóa theo lô, lưu checkpoint và worker mới chạy tiếp từ checkpoint"""
+    attack_log, settings = _setup()
+
+    worker = RetentionWorker(attack_log, settings, batch_size=10, batch_interval=0, max_rate=0)
+    worker.run_batch()
+    worker.run_batch()
+    assert worker.deleted == 20
+
+    state = settings.find_one({'_id': STATE_ID})
+    assert state['run_deleted'] == 20
+    assert state['checkpoint_id'] is not None
+
+    # Restart: worker mới khôi phục checkpoint của lượt đang dở
+    resumed = RetentionWorker(attack_log, settings, batch_size=10, batch_interval=0, max_rate=0)
+    resumed._load_state()
+    assert resumed._checkpoint == worker._checkpoint
+    resumed.run_batch()
+    assert resumed.run_deleted == 25
+
+    # Hết log hết hạn: kết thúc lượt, checkpoint được xóa
+    assert resumed.run_batch() == resumed.poll_interval
+    assert settings.find_one({'_id': STATE_ID})['checkpoint_id'] is None
+
+    assert attack_log.collection.count_documents({}) == 5
+    assert attack_log.rollups.get_totals()['total'] == 5
+
+def test_run_batch_respects_max_rate():
+    """Test thời gian nghỉ giữa các lô không để tốc độ xóa vượt max_rate"""
+    attack_log, settings = _setup()
+
+    worker = RetentionWorker(attack_log, settings, batch_size=10, batch_interval=0, max_rate=20)
+    delay = worker.run_batch()
+
+    assert worker.deleted == 10
+    assert 0 < delay <= 0.5
+    assert delay + worker.last_batch_ms / 1000 == pytest.approx(0.5, abs=0.01)
+
+def test_run_batch_backs_off_when_ingest_is_busy():
+    """Test ingest queue dồn quá nửa thì retention nhường, không xóa gì"""
+    attack_log, settings = _setup()
+    attack_log.attach_writer(_BusyWriter())
+
+    worker = RetentionWorker(attack_log, settings, batch_size=10, poll_interval=300)
+
+    assert worker.run_batch() == 5
+    assert worker.backoffs == 1
+    assert worker.status == 'ingest_backlog'
+    assert attack_log.collection.count_documents({}) == 30
+
+def test_delete_batch_skips_logs_deleted_elsewhere():
+    """Test log đã bị xóa song song không bị trừ rollup lần nữa"""
+    attack_log, _ = _setup(expired=10, recent=0)
+    entries = attack_log.find_expired(datetime.utcnow() - timedelta(days=90), limit=10)
+
+    # Nơi khác đã xóa (và trừ rollup cho) 4 log đầu
+    attack_log._record_rollups(entries[:4], sign=-1)
+    attack_log.collection.delete_many({'_id': {'$in': [entry['_id'] for entry in entries[:4]]}})
+
+    assert attack_log.delete_batch(entries) == 6
+    assert attack_log.rollups.get_totals()['total'] == 0
+    assert attack_log.rollups.buckets['day'].count_documents({}) == 0
+
+def test_delete_batch_rebuilds_days_when_concurrent_delete_did_not_subtract():
+    """Test lô bị xóa một phần ở nơi khác mà không trừ rollup: bucket các ngày trong lô được dựng lại đúng"""
+    attack_log, _ = _setup(expired=10, recent=0)
+    now = datetime.utcnow()
+    attack_log.insert_many([{'_id': ObjectId(), 'timestamp': now - timedelta(days=100), 'ip_address': '10.0.0.3',
+                             'endpoint': '/api/transfer', 'attack_type': 'transfer'}])
+    entries = attack_log.find_expired(now - timedelta(days=90), limit=10)
+
+    attack_log.collection.delete_many({'_id': {'$in': [entry['_id'] for entry in entries[:4]]}})
+
+    assert attack_log.delete_batch(entries) == 6
+    assert attack_log.rollups.get_totals()['total'] == 1
+    assert sum(doc['total'] for doc in attack_log.rollups.buckets['day'].find()) == 1
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,60 @@
+"""
+Tests cho Aho-Corasick và RuleEngine
+"""
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.aho_corasick import AhoCorasick
+from services.rule_engine import RuleEngine
+
+def test_aho_corasick_overlapping_patterns():
+    """Test tìm pattern chồng lấn và pattern là hậu tố của pattern khác"""
+    matcher = AhoCorasick()
+    for pattern in ['he', 'she', 'his', 'hers']:
+        matcher.add(pattern, pattern)
+
+    assert sorted(matcher.iter_matches('ushers')) == ['he', 'hers', 'she']
+    assert list(matcher.iter_matches('xyz')) == []
+
+def test_default_rules_reproduce_legacy_classification():
+    """Test rules mặc định giữ logic của analyze_attack_type cũ"""
+    engine = RuleEngine(Config.RULES_PATH)
+
+    assert engine.classify({'endpoint': '/api/wallet/import', 'method': 'POST',
+                            'payload': {'private_key': '0xabc'}})['attack_type'] == 'brute_force'
+    assert engine.classify({'endpoint': '/api/wallet/x', 'method': 'DELETE'})['attack_type'] == 'api_exploit'
+    assert engine.classify({'endpoint': '/api/transfer', 'method': 'POST'})['attack_type'] == 'transaction_test'
+    assert engine.classify({'endpoint': '/api/wallet/balance', 'method': 'GET'})['attack_type'] == 'balance_scan'
+    assert engine.classify({'endpoint': '/api/wallet/balance', 'method': 'POST'})['attack_type'] is None
+
+def test_signature_rules_and_priority():
+    """Test nhiều rule khớp được trả về theo priority"""
+    engine = RuleEngine(Config.RULES_PATH)
+    result = engine.classify({
+        'endpoint': '/api/wallet/balance',
+        'method': 'GET',
+        'headers': {'User-Agent': 'sqlmap/1.7'},
+        'query_params': {'address': "' OR 1=1 --"}
+    })
+
+    assert result['attack_type'] == 'sql_injection'
+    assert result['attack_types'] == ['sql_injection', 'scanner', 'balance_scan']
+    assert result['rule_ids'] == ['CB-1003', 'CB-1101', 'CB-1204']
+
+def test_pattern_only_matches_its_field(tmp_path):
+    """Test pattern khai báo cho field nào chỉ khớp trên field đó"""
+    rules_path = tmp_path / 'rules.json'
+    rules_path.write_text(json.dumps({'rules': [
+        {'id': 'T-1', 'attack_type': 'probe', 'patterns': {'path': ['admin']}}
+    ]}))
+    engine = RuleEngine(str(rules_path))
+
+    assert engine.classify({'endpoint': '/admin', 'method': 'GET'})['rule_ids'] == ['T-1']
+    assert engine.classify({'endpoint': '/x', 'method': 'GET', 'payload': {'admin': 1}})['rule_ids'] == []
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
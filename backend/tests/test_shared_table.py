@@ -0,0 +1,107 @@
+"""
+Tests cho bảng counter mmap dùng chung giữa các process
+"""
+import sys
+import os
+import multiprocessing
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import shared_table
+from utils.shared_table import SharedCounterTable
+
+pytestmark = pytest.mark.skipif(shared_table.fcntl is None, reason='Can fcntl (POSIX)')
+
+def _keys_in_bucket(table, bucket, count):
+    """Tìm các key rơi vào cùng một bucket để tạo collision"""
+    keys = []
+    i = 0
+    while len(keys) < count:
+        key = f'10.0.{i // 256}.{i % 256}'
+        if table.key_hash(key) % table.buckets == bucket:
+            keys.append(key)
+        i += 1
+    return keys
+
+def test_collision_keeps_keys_separate(tmp_path):
+    """Test các key cùng bucket dùng slot riêng, counter không lẫn nhau"""
+    table = SharedCounterTable(str(tmp_path / 'table'), slots=16, ways=4)
+    a, b, c = _keys_in_bucket(table, 0, 3)
+
+    assert table.incr(a) == 1
+    assert table.incr(b, 5) == 5
+    assert table.incr(a) == 2
+    assert table.get(b) == 5
+    assert table.get(c) == 0
+    assert table.used_slots() == 2
+
+def test_full_bucket_evicts_oldest_window(tmp_path):
+    """Test bucket đầy thì key có window cũ nhất bị ghi đè, bucket khác không bị ảnh hưởng"""
+    table = SharedCounterTable(str(tmp_path / 'table'), slots=8, ways=2)
+    old, recent, new = _keys_in_bucket(table, 1, 3)
+
+    assert table.hit(old, 1, 60, now=0)
+    assert table.hit(recent, 1, 60, now=120)
+    assert not table.hit(recent, 1, 60, now=130)
+
+    # Key mới chiếm slot của key cũ nhất; key còn lại vẫn giữ state
+    assert table.hit(new, 1, 60, now=130)
+    assert table.evictions == 1
+    assert not table.hit(recent, 1, 60, now=131)
+
+    # State của key bị ghi đè đã mất: được tính lại từ đầu
+    assert table.hit(old, 1, 60, now=131)
+    assert table.evictions == 2
+
+def test_sweep_and_reopen(tmp_path):
+    """Test sweeper dọn key rate limit không hoạt động, state còn sau khi mở lại file"""
+    path = str(tmp_path / 'table')
+    table = SharedCounterTable(path, slots=64, ways=4)
+    table.hit('1.1.1.1', 10, 60, now=0)
+    table.incr('counter', 3)
+    table.close()
+
+    reopened = SharedCounterTable(path, slots=64, ways=4)
+    assert reopened.get('counter') == 3
+    assert reopened.sweep(now=180) == 1
+    assert reopened.get('counter') == 3
+
+def test_config_mismatch_replaces_file_without_truncating_mapped_one(tmp_path):
+    """Test mở với slots khác: file mới được rename vào chỗ, process đang mmap file cũ không bị SIGBUS"""
+    path = str(tmp_path / 'table')
+    old = SharedCounterTable(path, slots=64, ways=4)
+    old.incr('counter', 3)
+
+    new = SharedCounterTable(path, slots=128, ways=4)
+    assert new.get('counter') == 0
+    new.incr('counter')
+
+    # Bảng cũ vẫn đọc/ghi được trên inode cũ (truncate sẽ làm truy cập mmap này SIGBUS)
+    assert old.incr('counter') == 4
+    assert old.used_slots() == 1
+    assert os.listdir(str(tmp_path)) == ['table']
+
+    assert SharedCounterTable(path, slots=128, ways=4).get('counter') == 1
+
+def _hammer(path, rounds):
+    table = SharedCounterTable(path, slots=64, ways=4)
+    for _ in range(rounds):
+        table.incr('shared')
+
+def test_atomic_across_processes(tmp_path):
+    """Test nhiều process tăng cùng một counter không mất cập nhật"""
+    path = str(tmp_path / 'table')
+    SharedCounterTable(path, slots=64, ways=4)
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_hammer, args=(path, 500)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert SharedCounterTable(path, slots=64, ways=4).get('shared') == 2000
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,91 @@
+"""
+Tests cho sketch Space-Saving (top IP)
+"""
+import sys
+import os
+import random
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from utils.space_saving import SpaceSaving
+from services.heavy_hitters import TopIPTracker
+
+def test_heavy_hitters_within_error_bound():
+    """Test IP tấn công nhiều được tìm thấy và count lệch không quá sai số"""
+    random.seed(1)
+    stream = [f'10.0.0.{i}' for i in range(5) for _ in range(2000)]
+    stream += [f'172.16.{i // 256}.{i % 256}' for i in range(20000)]
+    random.shuffle(stream)
+
+    sketch = SpaceSaving(capacity=100)
+    for ip in stream:
+        sketch.update(ip)
+
+    exact = Counter(stream)
+    top = sketch.top(5)
+    assert {ip for ip, _, _ in top} == {f'10.0.0.{i}' for i in range(5)}
+    for ip, count, error in top:
+        assert count - error <= exact[ip] <= count
+        assert error <= len(stream) // 100
+    assert len(sketch) == 100
+
+def test_merge_and_serialize():
+    """Test merge hai sketch (ví dụ hai process) sau khi serialize"""
+    a, b = SpaceSaving(10), SpaceSaving(10)
+    for i in range(100):
+        a.update('1.1.1.1')
+        b.update('1.1.1.1')
+        b.update(f'2.2.2.{i}')
+
+    merged = SpaceSaving.from_dict(a.to_dict())
+    merged.merge(SpaceSaving.from_dict(b.to_dict()))
+
+    ip, count, error = merged.top(1)[0]
+    assert ip == '1.1.1.1'
+    assert count - error <= 200 <= count
+    assert merged.total == 300
+
+def test_windows_expire():
+    """Test window giờ qua bỏ event cũ, toàn thời gian vẫn giữ"""
+    tracker = TopIPTracker(capacity=10)
+    tracker.record('1.1.1.1', now=0)
+    tracker.record('2.2.2.2', now=4000)
+
+    assert [item['_id'] for item in tracker.top('hour', now=4000)['items']] == ['2.2.2.2']
+    assert tracker.top('all', now=4000)['total'] == 2
+    assert tracker.top('day', now=4000)['total'] == 2
+
+def test_workers_checkpoint_separately_and_merge():
+    """Test mỗi worker checkpoint riêng: top gộp worker khác, worker đã dừng được nhận lại không mất count"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.heavy_hitters
+
+    a = TopIPTracker(collection, capacity=10, instance='a', result_ttl=0)
+    b = TopIPTracker(collection, capacity=10, instance='b', result_ttl=0)
+    for _ in range(3):
+        a.record('1.1.1.1')
+    for _ in range(5):
+        b.record('2.2.2.2')
+    a.checkpoint()
+    b.checkpoint()
+
+    top = a.top('all')
+    assert top['total'] == 8
+    assert [item['_id'] for item in top['items']] == ['2.2.2.2', '1.1.1.1']
+    assert a.top('hour')['total'] == 8
+
+    # b dừng: checkpoint released được worker mới nhận, checkpoint của a vẫn là của a
+    b.stop()
+    c = TopIPTracker(collection, capacity=10, instance='c', result_ttl=0)
+    assert c.restore() == len(b._windows) + 1
+    assert collection.count_documents({'instance': 'b'}) == 0
+
+    top = c.top('all')
+    assert top['total'] == 8
+    assert {item['_id']: item['count'] for item in top['items']} == {'2.2.2.2': 5, '1.1.1.1': 3}
+    assert c.top('day')['total'] == 8
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
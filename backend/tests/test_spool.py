@@ -0,0 +1,130 @@
+"""
+Tests cho EventSpool (append-only segment files)
+"""
+import sys
+import os
+import pytest
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+from services.spool import EventSpool, SpoolReplayer
+from utils.db_health import DatabaseHealth
+
+class _FakeAttackLog:
+    """insert_many giả: từ chối event có field 'bad', có thể giả lập mất kết nối"""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.stored = []
+
+    def insert_many(self, batch, rejected=None):
+        if self.down:
+            raise AutoReconnect('connection refused')
+
+        bad = [document for document in batch if document.get('bad')]
+        rejected.extend(bad)
+        self.stored.extend(document for document in batch if not document.get('bad'))
+        return len(batch) - len(bad)
+
+def _replayer(spool, attack_log):
+    return SpoolReplayer(spool, attack_log, DatabaseHealth(), ping_fn=lambda: None, batch_size=4)
+
+def test_append_seal_and_read(tmp_path):
+    """Test ghi, seal và đọc lại các event trong segment"""
+    spool = EventSpool(str(tmp_path))
+    events = [{'_id': ObjectId(), 'ip_address': f'10.0.0.{i}'} for i in range(10)]
+
+    spool.append(events[:4])
+    spool.append(events[4:])
+    assert spool.has_pending()
+
+    spool.seal()
+    segments = spool.sealed_segments()
+    assert len(segments) == 1
+
+    documents, corrupt = EventSpool.read_segment(segments[0])
+    assert documents == events
+    assert corrupt == 0
+
+def test_torn_and_corrupt_records_are_skipped(tmp_path):
+    """Test record bị cắt hoặc sai checksum ở cuối segment bị bỏ qua"""
+    spool = EventSpool(str(tmp_path))
+    spool.append([{'n': 1}, {'n': 2}])
+    spool.seal()
+    path = spool.sealed_segments()[0]
+
+    with open(path, 'ab') as f:
+        f.write(b'\x00\x00\x00\x10\x00\x00')
+
+    documents, corrupt = EventSpool.read_segment(path)
+    assert [d['n'] for d in documents] == [1, 2]
+    assert corrupt == 6
+
+    # Lật một byte trong payload của record thứ hai
+    data = bytearray(open(path, 'rb').read())
+    data[-10] ^= 0xFF
+    open(path, 'wb').write(bytes(data))
+
+    documents, _ = EventSpool.read_segment(path)
+    assert [d['n'] for d in documents] == [1]
+
+def test_segment_rotation_and_claim(tmp_path):
+    """Test xoay segment theo kích thước và claim/release khi replay"""
+    spool = EventSpool(str(tmp_path), segment_bytes=200)
+    for i in range(10):
+        spool.append([{'n': i, 'pad': 'x' * 50}])
+    spool.seal()
+
+    segments = spool.sealed_segments()
+    assert len(segments) > 1
+
+    claimed = spool.claim(segments[0])
+    assert claimed is not None
+    assert segments[0] not in spool.sealed_segments()
+    assert spool.claim(segments[0]) is None
+
+    spool.release(claimed)
+    assert segments[0] in spool.sealed_segments()
+
+def test_replay_dead_letters_rejected_events(tmp_path):
+    """Test event bị từ chối được chuyển sang .failed, database không bị đánh dấu offline"""
+    spool = EventSpool(str(tmp_path))
+    spool.append([{'n': i, 'bad': i in (2, 7)} for i in range(10)])
+    spool.seal()
+    spool.append([{'n': 10}])
+    spool.seal()
+
+    attack_log = _FakeAttackLog()
+    replayer = _replayer(spool, attack_log)
+    replayer.replay()
+
+    assert replayer.health.is_online()
+    assert not spool.sealed_segments()
+    assert [d['n'] for d in attack_log.stored] == [0, 1, 3, 4, 5, 6, 8, 9, 10]
+    assert replayer.replayed == 9
+    assert replayer.dead_lettered == 2
+
+    failed = spool.failed_segments()
+    assert len(failed) == 1
+    documents, _ = EventSpool.read_segment(failed[0])
+    assert [d['n'] for d in documents] == [2, 7]
+
+def test_replay_connection_failure_releases_segment(tmp_path):
+    """Test mất kết nối khi replay: segment được trả lại và database offline"""
+    spool = EventSpool(str(tmp_path))
+    spool.append([{'n': 1}])
+    spool.seal()
+    segments = spool.sealed_segments()
+
+    replayer = _replayer(spool, _FakeAttackLog(down=True))
+    with pytest.raises(AutoReconnect):
+        replayer.replay()
+
+    assert not replayer.health.is_online()
+    assert spool.sealed_segments() == segments
+    assert not spool.failed_segments()
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
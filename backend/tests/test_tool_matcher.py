@@ -0,0 +1,33 @@
+"""
+Tests cho ToolMatcher
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tool_matcher import ToolMatcher
+
+def test_tool_priority_matches_legacy_order():
+    """Test công cụ đứng trước trong KNOWN_TOOLS được ưu tiên, browser chỉ khi không khớp công cụ nào"""
+    matcher = ToolMatcher()
+
+    assert matcher.identify('sqlmap/1.7 (https://sqlmap.org)') == 'SQLMap'
+    assert matcher.identify('Mozilla/5.0 Chrome/120 python-requests/2.31') == 'Python Requests Library'
+    assert matcher.identify('Mozilla/5.0 (X11) Firefox/121.0') == 'Web Browser'
+    assert matcher.identify('Unknown') == 'Unknown Tool'
+    assert matcher.identify(None) == 'Unknown Tool'
+
+def test_tool_matcher_memoizes_user_agent():
+    """Test User-Agent lặp lại được trả từ cache"""
+    matcher = ToolMatcher(cache_size=2)
+
+    for _ in range(3):
+        matcher.identify('curl/8.4.0')
+
+    metrics = matcher.get_metrics()
+    assert metrics['misses'] == 1
+    assert metrics['hits'] == 2
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__, '-v'])
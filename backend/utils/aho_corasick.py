@@ -0,0 +1,75 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Automaton Aho-Corasick: tìm tất cả pattern trong một lần quét text"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._built = False
+
+    def add(self, pattern, value):
+        """Thêm pattern, `value` được trả về mỗi khi pattern xuất hiện trong text"""
+        if not pattern:
+            return
+
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+
+        self._out[node].append(value)
+        self._built = False
+
+    def build(self):
+        """Tính fail links (BFS) và gộp output theo chuỗi fail"""
+        queue = deque()
+
+        for node in self._goto[0].values():
+            self._fail[node] = 0
+            queue.append(node)
+
+        while queue:
+            node = queue.popleft()
+
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+        self._built = True
+
+    def iter_matches(self, text):
+        """Trả về các value của pattern xuất hiện trong text (có thể lặp lại)"""
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        node = 0
+
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+
+            if out[node]:
+                yield from out[node]
+
+    def __len__(self):
+        return len(self._goto)
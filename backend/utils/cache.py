@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel phân biệt "không có trong cache" với giá trị None đã được cache
+MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU có giới hạn kích thước, mỗi entry có TTL riêng"""
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        """Lấy giá trị còn hạn, trả về `default` nếu không có hoặc đã hết hạn"""
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=MISSING):
+        """Như get() nhưng không cập nhật counters và thứ tự LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                return default
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Lưu giá trị với TTL (mặc định self.ttl), evict entry ít dùng nhất khi đầy"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Gộp các lời gọi đồng thời cùng key thành một lần gọi upstream duy nhất"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Gọi fn() cho key; các thread khác đến trong lúc đang gọi sẽ chờ và dùng chung kết quả"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def get_metrics(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced
+            }
+
+
+class ResultCache:
+    """Cache kết quả tính toán (analytics): TTL theo key, gộp lời gọi đồng thời, vô hiệu theo số event ingest
+
+    Mặc định version ghi chỉ nằm trong process: ghi từ worker khác không làm kết quả ở đây cũ đi
+    nên giới hạn max_staleness chỉ đúng trong một worker. Truyền `shared_version` (SharedCounterTable)
+    để mọi worker trên cùng host dùng chung version; giữa các host kết quả vẫn có thể cũ tới hết TTL.
+    """
+
+    VERSION_KEY = 'stats_cache_version'
+
+    def __init__(self, max_size=256, ttl=30, max_staleness=2.0, shared_version=None):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self.singleflight = SingleFlight()
+
+        # Có event mới sau khi tính thì kết quả chỉ được dùng thêm tối đa max_staleness giây
+        self.max_staleness = max_staleness
+
+        self._version = 0
+        self._shared_version = shared_version
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.shared_errors = 0
+        self.recomputes = 0
+        self.recompute_ms_total = 0.0
+        self.last_recompute_ms = 0.0
+
+    def notify_write(self, count=1):
+        """Ghi nhận dữ liệu đã thay đổi (event mới được ghi, log bị xóa...)"""
+        with self._lock:
+            self._version += count
+
+        if self._shared_version is not None:
+            try:
+                self._shared_version.incr(self.VERSION_KEY, count)
+            except (OSError, ValueError) as e:
+                self.shared_errors += 1
+                print(f"[WARNING] Khong cap nhat duoc shared cache version: {str(e)}")
+
+    def _current_version(self):
+        if self._shared_version is not None:
+            try:
+                return self._shared_version.get(self.VERSION_KEY)
+            except (OSError, ValueError):
+                self.shared_errors += 1
+                # Không đọc được bảng chung: coi như đã có ghi mới, kết quả chỉ sống max_staleness giây
+                return None
+        return self._version
+
+    def _fresh(self, entry):
+        value, version, computed_at = entry
+        return version == self._current_version() or time.monotonic() - computed_at < self.max_staleness
+
+    def get_or_compute(self, key, fn, ttl=None):
+        """Trả về kết quả còn hiệu lực cho key, nếu không thì tính lại (một lần cho các request đồng thời)"""
+        entry = self.cache.peek(key)
+        if entry is not MISSING:
+            if self._fresh(entry):
+                with self._lock:
+                    self.hits += 1
+                return entry[0]
+
+            with self._lock:
+                self.stale += 1
+
+        with self._lock:
+            self.misses += 1
+
+        return self.singleflight.do(key, lambda: self._compute(key, fn, ttl))
+
+    def _compute(self, key, fn, ttl):
+        # Request khác có thể vừa tính xong trong lúc chờ
+        entry = self.cache.peek(key)
+        if entry is not MISSING and self._fresh(entry):
+            return entry[0]
+
+        version = self._current_version()
+        started = time.monotonic()
+
+        value = fn()
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        self.cache.set(key, (value, version, started), ttl=ttl)
+
+        with self._lock:
+            self.recomputes += 1
+            self.recompute_ms_total += elapsed_ms
+            self.last_recompute_ms = round(elapsed_ms, 3)
+
+        return value
+
+    def clear(self):
+        self.cache.clear()
+
+    def get_metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+                'stale_invalidations': self.stale,
+                'recomputes': self.recomputes,
+                'avg_recompute_ms': round(self.recompute_ms_total / self.recomputes, 3) if self.recomputes else 0,
+                'last_recompute_ms': self.last_recompute_ms,
+                'coalesced': self.singleflight.coalesced,
+                'write_version': self._version,
+                'shared_version': self._shared_version is not None,
+                'shared_errors': self.shared_errors,
+                'max_staleness_ms': int(self.max_staleness * 1000)
+            }
@@ -0,0 +1,199 @@
+import hashlib
+import json
+
+_TRUNCATED = '...[truncated]'
+
+
+class CapturePolicy:
+    """Giới hạn kích thước payload, headers và query params được lưu cho mỗi request"""
+
+    def __init__(self, max_body_bytes=65536, max_depth=8, max_keys=100, max_nodes=2000,
+                 max_string=4096, max_headers=64, max_header_bytes=4096,
+                 max_query_params=64, chunk_size=65536):
+        self.max_body_bytes = max_body_bytes
+        self.max_depth = max_depth
+        self.max_keys = max_keys
+        self.max_nodes = max_nodes
+        self.max_string = max_string
+        self.max_headers = max_headers
+        self.max_header_bytes = max_header_bytes
+        self.max_query_params = max_query_params
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_body_bytes=config.CAPTURE_MAX_BODY_BYTES,
+            max_depth=config.CAPTURE_MAX_DEPTH,
+            max_keys=config.CAPTURE_MAX_KEYS,
+            max_nodes=config.CAPTURE_MAX_NODES,
+            max_string=config.CAPTURE_MAX_STRING,
+            max_headers=config.CAPTURE_MAX_HEADERS,
+            max_header_bytes=config.CAPTURE_MAX_HEADER_BYTES,
+            max_query_params=config.CAPTURE_MAX_QUERY_PARAMS
+        )
+
+    def capture(self, request):
+        """Trích xuất headers, query params, payload theo policy
+
+        Trả về dict gồm headers, query_params, payload (None nếu không có body)
+        và capture (metadata truncation, None nếu không bị cắt).
+        """
+        truncated = []
+
+        headers = self._capture_pairs(request.headers.items(), self.max_headers, self.max_header_bytes)
+        if headers.pop(_TRUNCATED, False):
+            truncated.append('headers')
+
+        query_params = self._capture_pairs(request.args.items(), self.max_query_params, self.max_string)
+        if query_params.pop(_TRUNCATED, False):
+            truncated.append('query_params')
+
+        payload = None
+        meta = {}
+
+        body, body_size, body_sha256 = self._read_body(request)
+
+        if body_sha256 is not None:
+            # Body vượt giới hạn: chỉ giữ phần đầu (dạng text) và hash của toàn bộ body
+            payload = self._limit_string(body.decode('utf-8', errors='replace'))
+            truncated.append('payload')
+            meta['body_bytes'] = body_size
+            meta['body_sha256'] = body_sha256
+
+        elif body:
+            parsed = None
+            if request.is_json:
+                try:
+                    parsed = json.loads(body)
+                except (ValueError, RecursionError):
+                    parsed = body.decode('utf-8', errors='replace')
+            elif request.form:
+                parsed = request.form.to_dict()
+
+            if parsed is not None:
+                state = {'nodes': 0, 'truncated': False}
+                payload = self._limit_value(parsed, 0, state)
+                if state['truncated']:
+                    truncated.append('payload')
+
+        capture = None
+        if truncated:
+            capture = dict(meta, truncated=True, truncated_fields=truncated)
+
+        return {
+            'headers': headers,
+            'query_params': query_params,
+            'payload': payload,
+            'capture': capture
+        }
+
+    def _read_body(self, request):
+        """Đọc body theo stream, giữ tối đa max_body_bytes đầu tiên
+
+        Trả về (data, tổng số bytes, sha256 hex hoặc None nếu body không bị cắt).
+        """
+        cached = getattr(request, '_cached_data', None)
+        if cached is not None:
+            if len(cached) <= self.max_body_bytes:
+                return cached, len(cached), None
+            return cached[:self.max_body_bytes], len(cached), hashlib.sha256(cached).hexdigest()
+
+        content_length = request.content_length
+        if content_length == 0:
+            return b'', 0, None
+
+        stream = request.stream
+        prefix = bytearray()
+        digest = hashlib.sha256()
+        total = 0
+
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+
+            total += len(chunk)
+            digest.update(chunk)
+
+            room = self.max_body_bytes - len(prefix)
+            if room > 0:
+                prefix += chunk[:room]
+
+        data = bytes(prefix)
+
+        if total <= self.max_body_bytes:
+            # Trả body đã đọc lại cho werkzeug để route vẫn dùng được get_json()/form
+            request._cached_data = data
+            return data, total, None
+
+        # Body quá lớn: route nhận body rỗng (AttackLogger.log_request trả 413 trước khi route đọc body),
+        # bộ nhớ không phụ thuộc kích thước attacker gửi
+        request._cached_data = b''
+        return data, total, digest.hexdigest()
+
+    def _capture_pairs(self, items, max_count, max_value_bytes):
+        result = {}
+        truncated = False
+
+        for key, value in items:
+            if len(result) >= max_count:
+                truncated = True
+                break
+
+            key = self._safe_key(key[:256])
+            if isinstance(value, str) and len(value) > max_value_bytes:
+                value = value[:max_value_bytes] + _TRUNCATED
+                truncated = True
+
+            result[key] = value
+
+        if truncated:
+            result[_TRUNCATED] = True
+
+        return result
+
+    def _limit_value(self, value, depth, state):
+        state['nodes'] += 1
+        if state['nodes'] > self.max_nodes or depth > self.max_depth:
+            state['truncated'] = True
+            return _TRUNCATED
+
+        if isinstance(value, dict):
+            result = {}
+            for index, (key, item) in enumerate(value.items()):
+                if index >= self.max_keys:
+                    state['truncated'] = True
+                    break
+                result[self._safe_key(str(key)[:256])] = self._limit_value(item, depth + 1, state)
+            return result
+
+        if isinstance(value, list):
+            if len(value) > self.max_keys:
+                state['truncated'] = True
+            return [self._limit_value(item, depth + 1, state) for item in value[:self.max_keys]]
+
+        if isinstance(value, str):
+            limited = self._limit_string(value)
+            if limited is not value:
+                state['truncated'] = True
+            return limited
+
+        if isinstance(value, int) and not isinstance(value, bool) and abs(value) >= 2 ** 63:
+            # BSON không lưu được số nguyên lớn hơn int64
+            state['truncated'] = True
+            return str(value)[:64]
+
+        return value
+
+    def _limit_string(self, value):
+        if len(value) > self.max_string:
+            return value[:self.max_string] + _TRUNCATED
+        return value
+
+    @staticmethod
+    def _safe_key(key):
+        """Key bắt đầu bằng '$' hoặc chứa '.' không lưu được vào MongoDB"""
+        if key.startswith('$'):
+            key = '＄' + key[1:]
+        return key.replace('.', '．')
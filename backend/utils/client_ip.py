@@ -0,0 +1,8 @@
+def get_client_ip(request):
+    """Lấy IP address của client (xử lý proxy)"""
+    if request.headers.get('X-Forwarded-For'):
+        # Client đằng sau proxy
+        return request.headers.get('X-Forwarded-For').split(',')[0].strip()
+    if request.headers.get('X-Real-IP'):
+        return request.headers.get('X-Real-IP')
+    return request.remote_addr
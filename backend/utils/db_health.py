@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class DatabaseHealth:
+    """Trạng thái kết nối MongoDB dùng chung giữa models và worker nền"""
+
+    def __init__(self, online=True):
+        self._online = threading.Event()
+        if online:
+            self._online.set()
+
+        self.last_error = None
+        self.offline_since = None if online else time.time()
+        self.outages = 0 if online else 1
+
+    def is_online(self):
+        return self._online.is_set()
+
+    def mark_offline(self, error=None):
+        if self._online.is_set():
+            self._online.clear()
+            self.offline_since = time.time()
+            self.outages += 1
+            print(f"[WARNING] MongoDB khong kha dung, chuyen sang spool: {str(error)}")
+
+        if error is not None:
+            self.last_error = str(error)
+
+    def mark_online(self):
+        if not self._online.is_set():
+            self._online.set()
+            self.offline_since = None
+            print("[OK] MongoDB da ket noi lai")
+
+    def get_metrics(self):
+        return {
+            'online': self.is_online(),
+            'offline_since': self.offline_since,
+            'outages': self.outages,
+            'last_error': self.last_error
+        }
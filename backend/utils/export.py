@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+import zlib
+
+# pyarrow là dependency tùy chọn, chỉ cần cho export parquet/arrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet', 'arrow')
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Content type và phần mở rộng file theo format
+FORMAT_MEDIA = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+}
+
+# Cột của file export: (tiêu đề, hàm lấy giá trị từ log)
+CSV_COLUMNS = (
+    ('Timestamp', lambda log: log['timestamp'].isoformat() if log.get('timestamp') else ''),
+    ('IP Address', lambda log: log.get('ip_address', '')),
+    ('Method', lambda log: log.get('method', '')),
+    ('Endpoint', lambda log: log.get('endpoint', '')),
+    ('Attack Type', lambda log: log.get('attack_type', '')),
+    ('User Agent', lambda log: log.get('user_agent', '')),
+    ('Country', lambda log: (log.get('geolocation') or {}).get('country', ''))
+)
+
+# Field cần đọc từ MongoDB cho CSV
+CSV_PROJECTION = {
+    'timestamp': 1, 'ip_address': 1, 'method': 1, 'endpoint': 1,
+    'attack_type': 1, 'user_agent': 1, 'geolocation.country': 1
+}
+
+
+# Field của bản ghi export ndjson/parquet/arrow (geolocation được làm phẳng)
+GEO_FIELDS = ('country', 'country_code', 'region', 'city', 'latitude', 'longitude', 'timezone', 'isp')
+RECORD_FIELDS = ('timestamp', 'ip_address', 'method', 'endpoint', 'attack_type', 'tool', 'user_agent') + GEO_FIELDS
+
+RECORD_PROJECTION = {
+    'timestamp': 1, 'ip_address': 1, 'method': 1, 'endpoint': 1, 'attack_type': 1,
+    'tool': 1, 'user_agent': 1, 'geolocation': 1
+}
+
+
+def columnar_available():
+    return pa is not None
+
+
+def _schema():
+    """Schema cố định cho export columnar"""
+    return pa.schema([
+        ('timestamp', pa.timestamp('ms', tz='UTC')),
+        ('ip_address', pa.string()),
+        ('method', pa.string()),
+        ('endpoint', pa.string()),
+        ('attack_type', pa.string()),
+        ('tool', pa.string()),
+        ('user_agent', pa.string()),
+        ('country', pa.string()),
+        ('country_code', pa.string()),
+        ('region', pa.string()),
+        ('city', pa.string()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('timezone', pa.string()),
+        ('isp', pa.string())
+    ])
+
+
+def flatten_log(log):
+    """Bản ghi phẳng của một log cho export ndjson/columnar"""
+    geolocation = log.get('geolocation') or {}
+    record = {
+        'timestamp': log.get('timestamp'),
+        'ip_address': log.get('ip_address'),
+        'method': log.get('method'),
+        'endpoint': log.get('endpoint'),
+        'attack_type': log.get('attack_type'),
+        'tool': log.get('tool'),
+        'user_agent': log.get('user_agent')
+    }
+
+    for field in GEO_FIELDS:
+        value = geolocation.get(field)
+        if field in ('latitude', 'longitude'):
+            record[field] = float(value) if isinstance(value, (int, float)) else None
+        else:
+            record[field] = str(value) if value is not None else None
+
+    return record
+
+
+def stream_ndjson(logs, chunk_bytes=65536):
+    """Mỗi log một dòng JSON, trả về từng chunk (str) khoảng chunk_bytes"""
+    buffer = io.StringIO()
+
+    for log in logs:
+        record = flatten_log(log)
+        if record['timestamp'] is not None:
+            record['timestamp'] = record['timestamp'].isoformat() + 'Z'
+
+        buffer.write(json.dumps(record, ensure_ascii=False))
+        buffer.write('\n')
+
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """File-like chỉ ghi: giữ các byte pyarrow vừa ghi cho tới khi được lấy ra"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_columnar(logs, fmt, batch_rows=65536):
+    """Ghi logs thành parquet (mỗi record batch một row group) hoặc Arrow IPC file, trả về từng chunk bytes"""
+    if pa is None:
+        raise RuntimeError('Export parquet/arrow can cai dat pyarrow')
+
+    schema = _schema()
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode='w')
+
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(output, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(output, schema)
+
+    columns = {field: [] for field in RECORD_FIELDS}
+    rows = 0
+
+    def write_batch():
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    for log in logs:
+        for field, value in flatten_log(log).items():
+            columns[field].append(value)
+        rows += 1
+
+        if rows % batch_rows == 0:
+            write_batch()
+            data = sink.drain()
+            if data:
+                yield data
+
+    if rows % batch_rows or not rows:
+        write_batch()
+
+    writer.close()
+    yield sink.drain()
+
+
+def stream_csv(logs, chunk_bytes=65536):
+    """Ghi logs thành CSV, trả về từng chunk (str) khoảng chunk_bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([title for title, _ in CSV_COLUMNS])
+
+    for log in logs:
+        writer.writerow([value(log) for _, value in CSV_COLUMNS])
+
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_stream(chunks, compress=False):
+    """Encode UTF-8 các chunk, nén gzip on-the-fly nếu compress=True"""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,284 @@
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# Header file index: magic, số range IPv4, số range IPv6, offset + độ dài bảng location (JSON)
+_HEADER = struct.Struct('>8sIIQQ')
+_MAGIC = b'CBGEO001'
+
+# Record IPv4: start, end, location index (12 bytes)
+_V4_RECORD = struct.Struct('>III')
+# Record IPv6: start, end (16 bytes big-endian), location index (36 bytes)
+_V6_RECORD = struct.Struct('>16s16sI')
+_V4_START = struct.Struct('>I')
+
+_LOCATION_FIELDS = (
+    ('country', 'Unknown'),
+    ('country_code', 'Unknown'),
+    ('region', 'Unknown'),
+    ('city', 'Unknown'),
+    ('latitude', 0),
+    ('longitude', 0),
+    ('timezone', 'Unknown'),
+    ('isp', 'Unknown'),
+)
+
+
+def _parse_ip(value):
+    """Parse IP dạng chuỗi hoặc số nguyên"""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def _normalize_lookup_ip(ip_address):
+    """Chuẩn hóa IP cần tra cứu, IPv4-mapped IPv6 được đưa về IPv4"""
+    ip = ipaddress.ip_address(ip_address.strip())
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        return ip.ipv4_mapped
+    return ip
+
+
+def _location_from_row(row):
+    location = {}
+    for field, default in _LOCATION_FIELDS:
+        value = (row.get(field) or '').strip()
+        if field in ('latitude', 'longitude'):
+            try:
+                location[field] = float(value) if value else default
+            except ValueError:
+                location[field] = default
+        else:
+            location[field] = value or default
+    return location
+
+
+class _GeoTable:
+    """Bảng range đã compile, được mmap từ file index"""
+
+    def __init__(self, index_path):
+        self._file = open(index_path, 'rb')
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.v4_count, self.v6_count, loc_offset, loc_length = _HEADER.unpack_from(self.mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f'File index GeoIP khong hop le: {index_path}')
+
+        self.v4_offset = _HEADER.size
+        self.v6_offset = self.v4_offset + self.v4_count * _V4_RECORD.size
+        self.locations = json.loads(self.mm[loc_offset:loc_offset + loc_length].decode('utf-8'))
+
+    def lookup_v4(self, value):
+        mm = self.mm
+        base = self.v4_offset
+        size = _V4_RECORD.size
+
+        # Tìm record cuối cùng có start <= value
+        lo, hi = 0, self.v4_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _V4_START.unpack_from(mm, base + mid * size)[0] <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == 0:
+            return None
+
+        start, end, loc_index = _V4_RECORD.unpack_from(mm, base + (lo - 1) * size)
+        return loc_index if start <= value <= end else None
+
+    def lookup_v6(self, packed):
+        mm = self.mm
+        base = self.v6_offset
+        size = _V6_RECORD.size
+
+        # So sánh bytes big-endian cùng độ dài tương đương so sánh số
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * size
+            if mm[offset:offset + 16] <= packed:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo == 0:
+            return None
+
+        start, end, loc_index = _V6_RECORD.unpack_from(mm, base + (lo - 1) * size)
+        return loc_index if start <= packed <= end else None
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+
+class GeoIPDatabase:
+    """Engine tra cứu GeoIP offline từ file CSV range (start_ip, end_ip, country, ...)"""
+
+    def __init__(self, csv_path, index_path=None, reload_check_interval=30):
+        self.csv_path = csv_path
+        self.index_path = index_path or csv_path + '.idx'
+        self.reload_check_interval = reload_check_interval
+
+        self._table = None
+        self._source_mtime = None
+        self._last_check = 0
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+
+        self.load()
+
+    @staticmethod
+    def compile(csv_path, index_path):
+        """Compile file CSV thành file index nhị phân đã sắp xếp"""
+        locations = []
+        location_ids = {}
+        v4_ranges = []
+        v6_ranges = []
+
+        with open(csv_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    start = _parse_ip(row['start_ip'])
+                    end = _parse_ip(row['end_ip'])
+                except (KeyError, ValueError):
+                    continue
+
+                if start.version != end.version or int(start) > int(end):
+                    continue
+
+                location = _location_from_row(row)
+                key = tuple(location[field] for field, _ in _LOCATION_FIELDS)
+                loc_index = location_ids.get(key)
+                if loc_index is None:
+                    loc_index = len(locations)
+                    location_ids[key] = loc_index
+                    locations.append(location)
+
+                if start.version == 4:
+                    v4_ranges.append((int(start), int(end), loc_index))
+                else:
+                    v6_ranges.append((start.packed, end.packed, loc_index))
+
+        v4_ranges.sort()
+        v6_ranges.sort()
+
+        locations_blob = json.dumps(locations, ensure_ascii=False).encode('utf-8')
+        loc_offset = _HEADER.size + len(v4_ranges) * _V4_RECORD.size + len(v6_ranges) * _V6_RECORD.size
+
+        # Ghi ra file tạm (tên riêng, cùng thư mục) rồi rename để reader không bao giờ thấy file dở dang
+        # và nhiều process compile cùng lúc không ghi chung một file tạm
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(index_path) + '.',
+            suffix='.tmp',
+            dir=os.path.dirname(os.path.abspath(index_path))
+        )
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(_HEADER.pack(_MAGIC, len(v4_ranges), len(v6_ranges), loc_offset, len(locations_blob)))
+                for record in v4_ranges:
+                    out.write(_V4_RECORD.pack(*record))
+                for record in v6_ranges:
+                    out.write(_V6_RECORD.pack(*record))
+                out.write(locations_blob)
+
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return len(v4_ranges), len(v6_ranges)
+
+    def load(self):
+        """Load (hoặc compile lại nếu CSV mới hơn) và swap bảng đang dùng"""
+        source_mtime = os.path.getmtime(self.csv_path)
+
+        if not os.path.exists(self.index_path) or os.path.getmtime(self.index_path) < source_mtime:
+            self.compile(self.csv_path, self.index_path)
+
+        old_table = self._table
+        self._table = _GeoTable(self.index_path)
+        self._source_mtime = source_mtime
+        self._last_check = time.monotonic()
+
+        # Đóng mmap + file của bảng cũ, lookup đang dùng bảng cũ sẽ thử lại với bảng mới
+        if old_table is not None:
+            old_table.close()
+
+    def _maybe_reload(self):
+        """Kiểm tra file nguồn định kỳ, reload ở thread nền khi có thay đổi"""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_check_interval:
+            return
+        self._last_check = now
+
+        try:
+            changed = os.path.getmtime(self.csv_path) != self._source_mtime
+        except OSError:
+            return
+
+        if not changed:
+            return
+
+        with self._reload_lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        threading.Thread(target=self._reload, name='geoip-reload', daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+            print(f"[OK] Da reload GeoIP database: {self.csv_path}")
+        except Exception as e:
+            print(f"[ERROR] Loi reload GeoIP database: {str(e)}")
+        finally:
+            self._reloading = False
+
+    def lookup(self, ip_address):
+        """Tra cứu IP, trả về dict location hoặc None nếu không có trong dataset"""
+        self._maybe_reload()
+
+        try:
+            ip = _normalize_lookup_ip(ip_address)
+        except ValueError:
+            return None
+
+        while True:
+            table = self._table
+            try:
+                if ip.version == 4:
+                    loc_index = table.lookup_v4(int(ip))
+                else:
+                    loc_index = table.lookup_v6(ip.packed)
+                break
+            except ValueError:
+                # mmap của bảng cũ vừa bị đóng khi reload
+                if table is self._table:
+                    raise
+
+        if loc_index is None:
+            return None
+
+        return dict(table.locations[loc_index])
+
+    def get_metrics(self):
+        table = self._table
+        return {
+            'source': self.csv_path,
+            'ipv4_ranges': table.v4_count,
+            'ipv6_ranges': table.v6_count,
+            'locations': len(table.locations)
+        }
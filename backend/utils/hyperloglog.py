@@ -0,0 +1,80 @@
+import math
+from hashlib import blake2b
+
+
+def hash64(value):
+    """Hash 64-bit ổn định giữa các process (hash() của Python bị random hóa theo process)"""
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8', 'surrogatepass')
+    return int.from_bytes(blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Ước lượng số phần tử phân biệt với bộ nhớ cố định 2^precision byte (sai số ~1.04/sqrt(2^precision))"""
+
+    def __init__(self, precision=10, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'HyperLogLog precision phai tu 4 den 16: {precision}')
+
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+
+        if len(self.registers) != self.m:
+            raise ValueError('So register khong khop voi precision')
+
+        # Ước lượng được giữ tới khi register thay đổi (đa số add không đổi register)
+        self._estimate = None
+
+    @staticmethod
+    def position(value, precision):
+        """(index register, rank) của một phần tử"""
+        hashed = hash64(value)
+        suffix_bits = 64 - precision
+        remainder = hashed & ((1 << suffix_bits) - 1)
+        return hashed >> suffix_bits, suffix_bits - remainder.bit_length() + 1
+
+    def add(self, value):
+        """Thêm một phần tử, trả về True nếu register thay đổi"""
+        index, rank = self.position(value, self.precision)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            self._estimate = None
+            return True
+        return False
+
+    def merge(self, other):
+        """Hợp hai sketch cùng precision (max từng register)"""
+        if other.precision != self.precision:
+            raise ValueError('Khong the merge HyperLogLog khac precision')
+
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        self._estimate = None
+
+    def count(self):
+        if self._estimate is None:
+            self._estimate = self._compute()
+        return self._estimate
+
+    def _compute(self):
+        m = self.m
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # Small range: linear counting khi còn register trống
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, precision):
+        return cls(precision, registers=data)
@@ -1,21 +1,88 @@
+import os
 import requests
+from config import Config
+from utils.cache import TTLCache, SingleFlight, MISSING
+from utils.geoip import GeoIPDatabase
+
+UNKNOWN_LOCATION = {
+    'country': 'Unknown',
+    'city': 'Unknown',
+    'latitude': 0,
+    'longitude': 0
+}
+
 
 class IPTracker:
     """Tracker để lấy geolocation từ IP address"""
 
-    @staticmethod
-    def get_geolocation(ip_address):
-        """Lấy geolocation từ IP address (sử dụng free API)"""
+    def __init__(self, geoip_path=None):
+        # Ưu tiên database GeoIP offline nếu có file, fallback về ip-api.com
+        geoip_path = geoip_path if geoip_path is not None else Config.GEOIP_DATABASE_PATH
+        self.geoip_db = None
+
+        if Config.GEOIP_PROVIDER != 'remote' and geoip_path and os.path.exists(geoip_path):
+            try:
+                self.geoip_db = GeoIPDatabase(
+                    geoip_path,
+                    reload_check_interval=Config.GEOIP_RELOAD_INTERVAL
+                )
+                print(f"[OK] Da load GeoIP database offline: {geoip_path}")
+            except Exception as e:
+                print(f"[ERROR] Loi load GeoIP database {geoip_path}: {str(e)}")
+
+        # Cache kết quả theo IP; lookup lỗi được cache với TTL ngắn hơn
+        self.cache = TTLCache(max_size=Config.GEO_CACHE_SIZE, ttl=Config.GEO_CACHE_TTL)
+        self.negative_ttl = Config.GEO_CACHE_NEGATIVE_TTL
+        self.singleflight = SingleFlight()
+
+    def get_geolocation(self, ip_address):
+        """Lấy geolocation từ IP address"""
         if not ip_address or ip_address == '127.0.0.1' or ip_address == 'localhost':
-            return {
-                'country': 'Unknown',
-                'city': 'Unknown',
-                'latitude': 0,
-                'longitude': 0
-            }
+            return dict(UNKNOWN_LOCATION)
+
+        location = self.cache.get(ip_address)
+        if location is MISSING:
+            # Nhiều request cùng IP đồng thời chỉ gọi provider một lần
+            location = self.singleflight.do(ip_address, lambda: self._load(ip_address))
+
+        return dict(location) if location else dict(UNKNOWN_LOCATION)
+
+    def _load(self, ip_address):
+        """Tra cứu provider và ghi kết quả (kể cả lỗi) vào cache"""
+        location = self.cache.peek(ip_address)
+        if location is not MISSING:
+            return location
 
+        location = self._lookup(ip_address)
+
+        if location:
+            self.cache.set(ip_address, location)
+        else:
+            self.cache.set(ip_address, None, ttl=self.negative_ttl)
+
+        return location
+
+    def _lookup(self, ip_address):
+        """Tra cứu provider, trả về None nếu không xác định được vị trí"""
+        if self.geoip_db is not None:
+            return self.geoip_db.lookup(ip_address)
+
+        if Config.GEOIP_PROVIDER == 'local':
+            return None
+
+        return self._lookup_remote(ip_address)
+
+    def get_cache_metrics(self):
+        """Chỉ số cache geolocation"""
+        metrics = self.cache.get_metrics()
+        metrics['negative_ttl'] = self.negative_ttl
+        metrics['singleflight'] = self.singleflight.get_metrics()
+        return metrics
+
+    @staticmethod
+    def _lookup_remote(ip_address):
+        """Lấy geolocation từ ip-api.com (free, không cần API key)"""
         try:
-            # Sử dụng ip-api.com (free, không cần API key)
             response = requests.get(
                 f'http://ip-api.com/json/{ip_address}',
                 timeout=5
@@ -39,12 +106,7 @@ class IPTracker:
         except Exception as e:
             print(f"Error getting geolocation for {ip_address}: {str(e)}")
 
-        return {
-            'country': 'Unknown',
-            'city': 'Unknown',
-            'latitude': 0,
-            'longitude': 0
-        }
+        return None
 
     @staticmethod
     def is_suspicious_ip(ip_address, known_vpn_ranges=None):
@@ -0,0 +1,87 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+
+class JobLease:
+    """Lease trong MongoDB để chỉ một worker (trên mọi host) chạy job nền dùng chung dữ liệu
+
+    Document {_id: name, owner, expires_at}: worker giữ lease gia hạn mỗi ttl/3 giây, lease hết hạn
+    (worker chết hoặc mất kết nối) thì worker khác nhận. Các host cần đồng bộ đồng hồ (NTP).
+    """
+
+    def __init__(self, collection, name, ttl=30, owner=None):
+        self.collection = collection
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}'
+
+        self._lock = threading.Lock()
+        self._held = False
+        self._check_at = 0.0
+        self._valid_until = 0.0
+
+        # Counters
+        self.acquired = 0
+        self.lost = 0
+        self.errors = 0
+
+    def is_held(self):
+        """Worker này có đang giữ lease không, tự gia hạn/nhận lease mỗi ttl/3 giây"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._check_at:
+                self._check_at = now + self.ttl / 3
+                held = self._acquire(now)
+                if held and not self._held:
+                    self.acquired += 1
+                elif self._held and not held:
+                    self.lost += 1
+                self._held = held
+
+            # Gia hạn lỗi liên tục: lease tự mất hiệu lực khi quá ttl kể từ lần gia hạn cuối
+            return self._held and now < self._valid_until
+
+    def _acquire(self, started):
+        now = datetime.utcnow()
+        try:
+            self.collection.update_one(
+                {'_id': self.name, '$or': [{'owner': self.owner}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'owner': self.owner, 'expires_at': now + timedelta(seconds=self.ttl), 'renewed_at': now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Lease đang thuộc worker khác và chưa hết hạn (upsert trùng _id)
+            return False
+        except Exception as e:
+            print(f"[WARNING] Khong gia han duoc lease {self.name}: {str(e)}")
+            self.errors += 1
+            return self._held
+
+        self._valid_until = started + self.ttl
+        return True
+
+    def release(self):
+        """Trả lease khi dừng để worker khác nhận ngay, không chờ hết hạn"""
+        with self._lock:
+            if not self._held:
+                return
+
+            self._held = False
+            try:
+                self.collection.delete_one({'_id': self.name, 'owner': self.owner})
+            except Exception as e:
+                print(f"[WARNING] Khong tra duoc lease {self.name}: {str(e)}")
+
+    def get_metrics(self):
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'held': self._held and time.monotonic() < self._valid_until,
+            'acquired': self.acquired,
+            'lost': self.lost,
+            'errors': self.errors
+        }
@@ -0,0 +1,32 @@
+import threading
+
+# Registry các hàm cung cấp chỉ số runtime (queue, cache, worker nền...)
+_providers = {}
+_lock = threading.Lock()
+
+
+def register_metrics(name, provider):
+    """Đăng ký một hàm trả về dict chỉ số dưới tên `name`"""
+    with _lock:
+        _providers[name] = provider
+
+
+def unregister_metrics(name):
+    """Hủy đăng ký chỉ số"""
+    with _lock:
+        _providers.pop(name, None)
+
+
+def collect_metrics():
+    """Thu thập chỉ số của tất cả thành phần đã đăng ký"""
+    with _lock:
+        providers = dict(_providers)
+
+    snapshot = {}
+    for name, provider in providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            snapshot[name] = {'error': str(e)}
+
+    return snapshot
@@ -0,0 +1,33 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Các chế độ tính total cho danh sách có phân trang
+TOTAL_MODES = ('exact', 'estimated', 'none')
+
+
+def encode_cursor(timestamp, object_id):
+    """Cursor opaque cho vị trí (timestamp, _id) trong danh sách sắp xếp giảm dần"""
+    raw = json.dumps([timestamp.isoformat(), str(object_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Giải mã cursor, ValueError nếu cursor không hợp lệ"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, object_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId, UnicodeError) as e:
+        raise ValueError(f'Cursor khong hop le: {cursor}') from e
+
+
+def keyset_condition(timestamp, object_id, direction):
+    """Điều kiện lấy các bản ghi sau ('after', cũ hơn) hoặc trước ('before', mới hơn) vị trí cursor"""
+    op = '$lt' if direction == 'after' else '$gt'
+    return {'$or': [
+        {'timestamp': {op: timestamp}},
+        {'timestamp': timestamp, '_id': {op: object_id}}
+    ]}
@@ -0,0 +1,31 @@
+# Chế độ hiển thị cho các API danh sách
+VIEWS = ('summary', 'full')
+
+
+def build_projection(view='summary', fields=None, summary_fields=(), allowed_fields=(), required_fields=()):
+    """Tạo projection cho find(): danh sách `fields` (phân tách bằng dấu phẩy) hoặc theo view
+
+    Trả về None khi cần cả document (view=full), ValueError khi view/field không hợp lệ.
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [
+            field for field in requested
+            if field not in allowed_fields and field.split('.', 1)[0] not in allowed_fields
+        ]
+        if unknown:
+            raise ValueError(f"Field khong hop le: {', '.join(unknown)}")
+    elif view == 'full':
+        return None
+    elif view == 'summary':
+        requested = list(summary_fields)
+    else:
+        raise ValueError(f"view phai la mot trong: {', '.join(VIEWS)}")
+
+    paths = list(dict.fromkeys([*requested, *required_fields]))
+
+    # Bỏ path con khi path cha đã được chọn (MongoDB từ chối projection bị path collision)
+    return {
+        field: 1 for field in paths
+        if not any(field.startswith(parent + '.') for parent in paths)
+    }
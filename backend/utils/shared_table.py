@@ -0,0 +1,240 @@
+import mmap
+import os
+import struct
+import threading
+from utils.hyperloglog import hash64
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: không có khóa byte-range POSIX
+    fcntl = None
+
+MAGIC = b'CBSHTBL1'
+HEADER = struct.Struct('<8sQQ')  # magic, số slot, số slot mỗi bucket
+HEADER_SIZE = 64
+
+# Slot: hash key (0 = trống), window_seconds, window index, count window hiện tại, count window trước
+SLOT = struct.Struct('<Qqqqq')
+
+
+class SharedCounterTable:
+    """Bảng hash số slot cố định trên file mmap, dùng chung giữa các process trên cùng host
+
+    Key được hash 64-bit ổn định giữa các process và thuộc một bucket gồm `ways` slot liền nhau.
+    Mỗi thao tác khóa cả bucket: fcntl.lockf trên đoạn byte của bucket (giữa các process)
+    và một threading.Lock theo bucket (lockf không chặn các thread trong cùng process).
+    Bucket đầy thì slot có window cũ nhất bị ghi đè.
+    """
+
+    def __init__(self, path, slots=65536, ways=8, lock_stripes=256):
+        if fcntl is None:
+            raise RuntimeError('SharedCounterTable can fcntl (chi ho tro Linux/macOS)')
+        if slots % ways:
+            raise ValueError('slots phai chia het cho ways')
+
+        self.path = path
+        self.slots = slots
+        self.ways = ways
+        self.buckets = slots // ways
+        self.size = HEADER_SIZE + slots * SLOT.size
+
+        self._fd = self._open_file()
+        self._map = mmap.mmap(self._fd, self.size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        self._thread_locks = [threading.Lock() for _ in range(lock_stripes)]
+
+        # Counters (của process hiện tại)
+        self.inserts = 0
+        self.evictions = 0
+
+    def _open_file(self):
+        """Mở file, tạo/kiểm tra header dưới khóa để các worker khởi động cùng lúc không ghi đè nhau
+
+        File đã có nhưng khác cấu hình có thể đang được process khác mmap: truncate sẽ làm process đó
+        SIGBUS, nên ghi file mới rồi rename nguyên tử vào chỗ (process cũ vẫn dùng inode cũ).
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+                if self._is_current(fd) and self._prepare(fd):
+                    fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+                    return fd
+            except BaseException:
+                os.close(fd)
+                raise
+
+            # File đã bị thay bằng rename trong lúc chờ khóa (hoặc vừa thay xong): mở lại file mới.
+            # Đóng fd cũng nhả khóa lockf
+            os.close(fd)
+
+    def _is_current(self, fd):
+        try:
+            return os.stat(self.path).st_ino == os.fstat(fd).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _prepare(self, fd):
+        """True nếu file dùng được ngay; False nếu đã được thay bằng file mới (cần mở lại)"""
+        size = os.fstat(fd).st_size
+        if size == self.size:
+            magic, slots, ways = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+            if magic == MAGIC and slots == self.slots and ways == self.ways:
+                return True
+
+        if size == 0:
+            # File mới tạo: chưa process nào mmap được, khởi tạo tại chỗ
+            os.ftruncate(fd, self.size)
+            os.pwrite(fd, HEADER.pack(MAGIC, self.slots, self.ways), 0)
+            return True
+
+        print(f"[WARNING] {self.path} khac cau hinh (slots/ways), tao bang moi thay the")
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        temp_fd = os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(temp_fd, self.size)
+            os.pwrite(temp_fd, HEADER.pack(MAGIC, self.slots, self.ways), 0)
+        finally:
+            os.close(temp_fd)
+        os.replace(temp_path, self.path)
+        return False
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @staticmethod
+    def key_hash(key):
+        # 0 đánh dấu slot trống
+        return hash64(key) or 1
+
+    def _locked(self, bucket):
+        return _BucketLock(self, bucket)
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * SLOT.size
+
+    def _read(self, slot):
+        return list(SLOT.unpack_from(self._map, self._offset(slot)))
+
+    def _write(self, slot, values):
+        SLOT.pack_into(self._map, self._offset(slot), *values)
+
+    def _find(self, hashed, window_seconds, window):
+        """Slot của key trong bucket (tạo mới/ghi đè nếu chưa có), gọi khi đã giữ khóa bucket"""
+        first = (hashed % self.buckets) * self.ways
+        empty = None
+        oldest = None
+
+        for slot in range(first, first + self.ways):
+            values = self._read(slot)
+            if values[0] == hashed and values[1] == window_seconds:
+                return slot, values
+            if values[0] == 0:
+                if empty is None:
+                    empty = slot
+            elif oldest is None or values[2] < oldest[1]:
+                oldest = (slot, values[2])
+
+        if empty is not None:
+            slot = empty
+            self.inserts += 1
+        else:
+            # Bucket đầy: ghi đè key có window cũ nhất
+            slot = oldest[0]
+            self.evictions += 1
+
+        values = [hashed, window_seconds, window, 0, 0]
+        self._write(slot, values)
+        return slot, values
+
+    def hit(self, key, max_requests, window_seconds, now):
+        """Sliding window counter nguyên tử giữa các process: True nếu request được phép"""
+        hashed = self.key_hash(key)
+        window = int(now // window_seconds)
+
+        with self._locked(hashed % self.buckets):
+            slot, values = self._find(hashed, window_seconds, window)
+
+            if values[2] != window:
+                values[4] = values[3] if values[2] == window - 1 else 0
+                values[3] = 0
+                values[2] = window
+
+            elapsed = (now % window_seconds) / window_seconds
+            allowed = values[4] * (1 - elapsed) + values[3] < max_requests
+            if allowed:
+                values[3] += 1
+
+            self._write(slot, values)
+            return allowed
+
+    def incr(self, key, amount=1):
+        """Counter nguyên tử dùng chung (không window), trả về giá trị mới"""
+        hashed = self.key_hash(key)
+
+        with self._locked(hashed % self.buckets):
+            slot, values = self._find(hashed, 0, 0)
+            values[3] += amount
+            self._write(slot, values)
+            return values[3]
+
+    def get(self, key):
+        hashed = self.key_hash(key)
+        bucket = hashed % self.buckets
+
+        with self._locked(bucket):
+            for slot in range(bucket * self.ways, (bucket + 1) * self.ways):
+                values = self._read(slot)
+                if values[0] == hashed and values[1] == 0:
+                    return values[3]
+        return 0
+
+    def sweep(self, now):
+        """Xóa các key rate limit không hoạt động quá một window, trả về số slot đã dọn"""
+        removed = 0
+
+        for bucket in range(self.buckets):
+            with self._locked(bucket):
+                for slot in range(bucket * self.ways, (bucket + 1) * self.ways):
+                    values = self._read(slot)
+                    if values[0] and values[1] and values[2] < int(now // values[1]) - 1:
+                        self._write(slot, (0, 0, 0, 0, 0))
+                        removed += 1
+
+        return removed
+
+    def used_slots(self):
+        return sum(
+            1 for slot in range(self.slots)
+            if SLOT.unpack_from(self._map, self._offset(slot))[0]
+        )
+
+
+class _BucketLock:
+    """Khóa bucket: threading.Lock trong process + lockf trên đoạn byte của bucket giữa các process"""
+
+    __slots__ = ('table', 'bucket')
+
+    def __init__(self, table, bucket):
+        self.table = table
+        self.bucket = bucket
+
+    def __enter__(self):
+        table = self.table
+        table._thread_locks[self.bucket % len(table._thread_locks)].acquire()
+        try:
+            fcntl.lockf(table._fd, fcntl.LOCK_EX, table.ways * SLOT.size,
+                        table._offset(self.bucket * table.ways))
+        except BaseException:
+            table._thread_locks[self.bucket % len(table._thread_locks)].release()
+            raise
+
+    def __exit__(self, *exc):
+        table = self.table
+        try:
+            fcntl.lockf(table._fd, fcntl.LOCK_UN, table.ways * SLOT.size,
+                        table._offset(self.bucket * table.ways))
+        finally:
+            table._thread_locks[self.bucket % len(table._thread_locks)].release()
@@ -0,0 +1,100 @@
+import heapq
+
+
+class SpaceSaving:
+    """Sketch Space-Saving cho heavy hitters: giữ tối đa capacity key
+
+    Với N event đã thêm, mỗi count ước lượng lệch tối đa `error` của key (<= N / capacity),
+    count - error là cận dưới đảm bảo. Mọi key có tần suất thật > N / capacity đều nằm trong sketch.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._errors = {}
+
+        # Min-heap (count, key) cập nhật lười: entry cũ bị bỏ qua khi pop
+        self._heap = []
+
+    def __len__(self):
+        return len(self._counts)
+
+    def update(self, key, weight=1):
+        self.total += weight
+
+        if key in self._counts:
+            self._counts[key] += weight
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = weight
+            self._errors[key] = 0
+        else:
+            # Thay key có count nhỏ nhất, key mới thừa hưởng count đó làm sai số
+            min_key, min_count = self._pop_min()
+            del self._counts[min_key]
+            del self._errors[min_key]
+            self._counts[key] = min_count + weight
+            self._errors[key] = min_count
+
+        heapq.heappush(self._heap, (self._counts[key], key))
+
+        # Heap chứa nhiều entry cũ: dựng lại để bộ nhớ không tăng theo số event
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return key, count
+
+    def _rebuild_heap(self):
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def min_count(self):
+        """Count nhỏ nhất đang giữ (0 khi sketch chưa đầy), là cận trên sai số của key ngoài sketch"""
+        if len(self._counts) < self.capacity:
+            return 0
+        return min(self._counts.values())
+
+    def top(self, k=10):
+        """k key có count lớn nhất: [(key, count, error)]"""
+        items = heapq.nlargest(k, self._counts.items(), key=lambda item: item[1])
+        return [(key, count, self._errors[key]) for key, count in items]
+
+    def merge(self, other):
+        """Gộp sketch khác vào (mergeable summary): key thiếu ở một bên được cộng min count của bên đó"""
+        self_min, other_min = self.min_count(), other.min_count()
+        counts, errors = {}, {}
+
+        for key in set(self._counts) | set(other._counts):
+            counts[key] = self._counts.get(key, self_min) + other._counts.get(key, other_min)
+            errors[key] = self._errors.get(key, self_min) + other._errors.get(key, other_min)
+
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self._counts = {key: counts[key] for key in kept}
+        self._errors = {key: errors[key] for key in kept}
+        self.total += other.total
+        self._rebuild_heap()
+
+    def copy(self):
+        return SpaceSaving.from_dict(self.to_dict())
+
+    def to_dict(self):
+        """Dạng serialize (key là IP có dấu '.', nên lưu dạng list thay vì field name)"""
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'items': [[key, count, self._errors[key]] for key, count in self._counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['capacity'])
+        sketch.total = data['total']
+        for key, count, error in data['items']:
+            sketch._counts[key] = count
+            sketch._errors[key] = error
+        sketch._rebuild_heap()
+        return sketch
@@ -0,0 +1,69 @@
+from functools import lru_cache
+from config import Config
+from utils.aho_corasick import AhoCorasick
+
+# Thứ tự quyết định độ ưu tiên khi User-Agent khớp nhiều công cụ
+KNOWN_TOOLS = {
+    'python-requests': 'Python Requests Library',
+    'curl': 'cURL Command Line',
+    'postman': 'Postman API Client',
+    'insomnia': 'Insomnia API Client',
+    'axios': 'Axios (JavaScript)',
+    'httpie': 'HTTPie',
+    'wget': 'Wget',
+    'scrapy': 'Scrapy Web Scraper',
+    'selenium': 'Selenium Automation',
+    'nikto': 'Nikto Web Scanner',
+    'nmap': 'Nmap Network Scanner',
+    'sqlmap': 'SQLMap',
+    'burp': 'Burp Suite',
+    'metasploit': 'Metasploit Framework',
+    'w3af': 'W3AF Security Scanner'
+}
+
+BROWSER_KEYWORDS = ('chrome', 'firefox', 'safari')
+
+WEB_BROWSER = 'Web Browser'
+UNKNOWN_TOOL = 'Unknown Tool'
+
+
+class ToolMatcher:
+    """Nhận diện công cụ tấn công từ User-Agent bằng một automaton, có memo theo UA"""
+
+    def __init__(self, cache_size=4096):
+        self._matcher = AhoCorasick()
+
+        for priority, (keyword, tool_name) in enumerate(KNOWN_TOOLS.items()):
+            self._matcher.add(keyword, (priority, tool_name))
+
+        browser_priority = len(KNOWN_TOOLS)
+        for keyword in BROWSER_KEYWORDS:
+            self._matcher.add(keyword, (browser_priority, WEB_BROWSER))
+
+        self._matcher.build()
+
+        # User-Agent lặp lại liên tục: memo theo chuỗi UA chính xác
+        self.identify = lru_cache(maxsize=cache_size)(self._identify)
+
+    def _identify(self, user_agent):
+        best = None
+        for match in self._matcher.iter_matches((user_agent or '').lower()):
+            if best is None or match[0] < best[0]:
+                best = match
+
+        return best[1] if best else UNKNOWN_TOOL
+
+    def get_metrics(self):
+        info = self.identify.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'size': info.currsize,
+            'max_size': info.maxsize,
+            'hits': info.hits,
+            'misses': info.misses,
+            'hit_ratio': round(info.hits / lookups, 4) if lookups else 0
+        }
+
+
+# Instance dùng chung cho ingest và analytics
+tool_matcher = ToolMatcher(cache_size=Config.TOOL_CACHE_SIZE)
@@ -0,0 +1,36 @@
+"""
+Entry point WSGI cho production: gunicorn -c gunicorn.conf.py wsgi:application
+
+Với preload_app, master chỉ import code (chia sẻ bộ nhớ copy-on-write giữa các worker).
+App, MongoClient và các thread nền được tạo trong từng worker sau khi fork (hook post_fork),
+vì MongoClient và thread không an toàn khi fork.
+"""
+import threading
+from app import create_app, shutdown_app
+
+_app = None
+_lock = threading.Lock()
+
+
+def init_worker():
+    """Tạo app cho process hiện tại (gọi một lần sau khi fork)"""
+    global _app
+    with _lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+
+def shutdown_worker():
+    """Dừng worker nền, flush ingest queue và đóng MongoClient của process hiện tại"""
+    global _app
+    with _lock:
+        if _app is not None:
+            shutdown_app(_app)
+            _app = None
+
+
+def application(environ, start_response):
+    # Server không có hook post_fork (waitress, mod_wsgi...): tạo app ở request đầu tiên
+    app = _app if _app is not None else init_worker()
+    return app(environ, start_response)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Search, Download, Filter } from 'lucide-react';
 import Table from '../components/common/Table';
 import Pagination from '../components/common/Pagination';
@@ -25,6 +25,13 @@ const AttackLogs = () => {
     attackType: '',
   });
 
+  // Cursor của từng trang đã xem: sang trang kế tiếp dùng keyset thay vì offset
+  const pageCursorsRef = useRef({});
+
+  useEffect(() => {
+    pageCursorsRef.current = {};
+  }, [filters]);
+
   useEffect(() => {
     loadLogs();
   }, [currentPage, filters]);
@@ -34,10 +41,17 @@ const AttackLogs = () => {
       setLoading(true);
 
       const params = {
-        page: currentPage,
         per_page: perPage,
+        total: 'estimated',
       };
 
+      const cursor = pageCursorsRef.current[currentPage];
+      if (cursor) {
+        params.after = cursor;
+      } else {
+        params.page = currentPage;
+      }
+
       if (filters.attackType) {
         params.attack_type = filters.attackType;
       }
@@ -50,6 +64,10 @@ const AttackLogs = () => {
 
       setLogs(response.data.logs);
       setTotalLogs(response.data.total);
+
+      if (response.data.next_cursor) {
+        pageCursorsRef.current[currentPage + 1] = response.data.next_cursor;
+      }
       setLoading(false);
     } catch (error) {
       console.error('Error loading logs:', error);
@@ -58,25 +76,38 @@ const AttackLogs = () => {
     }
   };
 
-  const handleRowClick = (log) => {
+  const handleRowClick = async (log) => {
+    // Danh sách chỉ có field tóm tắt, chi tiết được tải khi mở
     setSelectedLog(log);
     setModalOpen(true);
+
+    try {
+      const response = await analyticsAPI.getAttackDetail(log._id);
+      setSelectedLog(response.data);
+    } catch (error) {
+      console.error('Error loading log detail:', error);
+      toast.error('Không thể tải chi tiết tấn công');
+    }
   };
 
-  const handleExport = async () => {
+  const handleExport = () => {
     try {
-      const response = await analyticsAPI.exportLogs();
-      const csv = response.data.csv;
+      // Export theo filter đang chọn
+      const params = {};
+      if (filters.attackType) {
+        params.attack_type = filters.attackType;
+      }
+      if (filters.search) {
+        params.ip = filters.search;
+      }
 
-      // Download CSV
-      const blob = new Blob([csv], { type: 'text/csv' });
-      const url = window.URL.createObjectURL(blob);
+      // Download CSV (server stream file kèm Content-Disposition)
       const a = document.createElement('a');
-      a.href = url;
+      a.href = analyticsAPI.getExportUrl(params);
       a.download = `attack-logs-${new Date().toISOString()}.csv`;
       a.click();
 
-      toast.success('Đã xuất file thành công');
+      toast.success('Đã bắt đầu tải file');
     } catch (error) {
       console.error('Error exporting:', error);
       toast.error('Không thể xuất file');
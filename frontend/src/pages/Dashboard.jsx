@@ -38,6 +38,10 @@ const Dashboard = () => {
   const prevTotalRef = useRef(null);
   const prevAttacksRef = useRef([]);
 
+  // Live feed: seq của frame cuối cùng và handler mới nhất
+  const lastSeqRef = useRef(null);
+  const streamHandlerRef = useRef(null);
+
   const loadDashboardData = useCallback(async (showNotification = true) => {
     try {
       // Load all data in parallel
@@ -45,7 +49,7 @@ const Dashboard = () => {
         analyticsAPI.getStats(),
         analyticsAPI.getTimeline(7),
         analyticsAPI.getAttackTypes(),
-        analyticsAPI.getAttacks({ page: 1, per_page: 5 }),
+        analyticsAPI.getAttacks({ page: 1, per_page: 5, total: 'none' }),
       ]);
 
       const newTotal = statsRes.data?.total_attacks || 0;
@@ -119,15 +123,122 @@ const Dashboard = () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
-  useEffect(() => {
-    // Auto refresh mỗi 3 giây khi live mode
-    const interval = setInterval(() => {
-      if (isLive) {
-        loadDashboardData(true);
+  // Áp dụng một frame của live feed: cộng counter deltas thay vì tải lại toàn bộ
+  const applyStreamFrame = (frame) => {
+    // Bị mất frame (client chậm) thì tải lại số liệu đầy đủ
+    if (lastSeqRef.current !== null && frame.seq !== lastSeqRef.current + 1) {
+      lastSeqRef.current = frame.seq;
+      loadDashboardData(false);
+      return;
+    }
+    lastSeqRef.current = frame.seq;
+
+    const { total, attack_types: typeDeltas } = frame.deltas;
+    const today = new Date().toISOString().slice(0, 10);
+
+    setStats((prev) => prev && {
+      ...prev,
+      total_attacks: (prev.total_attacks || 0) + total,
+      today_attacks: (prev.today_attacks || 0) + total,
+    });
+
+    setAttackTypes((prev) => {
+      const next = prev.map((item) => ({ ...item, count: item.count + (typeDeltas[item._id] || 0) }));
+      Object.entries(typeDeltas).forEach(([type, count]) => {
+        if (!next.some((item) => item._id === type)) {
+          next.push({ _id: type, count });
+        }
+      });
+      return next.sort((a, b) => b.count - a.count);
+    });
+
+    setTimeline((prev) => {
+      if (prev.length > 0 && prev[prev.length - 1].date === today) {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, count: last.count + total }];
       }
-    }, 3000);
+      return [...prev, { date: today, count: total }];
+    });
+
+    const newAttacks = [...frame.events, ...prevAttacksRef.current].slice(0, 5);
+    prevAttacksRef.current = newAttacks;
+    prevTotalRef.current = (prevTotalRef.current || 0) + total;
+    setRecentAttacks(newAttacks);
+    setLastUpdate(new Date());
+
+    const newestAttack = frame.events[0];
+    if (newestAttack) {
+      const attackTypeName = ATTACK_TYPE_NAMES[newestAttack.attack_type] || newestAttack.attack_type;
+
+      toast.warning(
+        `🚨 Phát hiện ${total} tấn công mới: ${attackTypeName} từ ${newestAttack.ip_address}`
+      );
+
+      // Flash animation
+      setNewAttackAlert(true);
+      setTimeout(() => setNewAttackAlert(false), 2000);
+
+      playNotificationSound();
+    }
+  };
+  streamHandlerRef.current = applyStreamFrame;
+
+  useEffect(() => {
+    // Live mode: nhận event qua SSE thay vì polling
+    if (!isLive) {
+      return undefined;
+    }
+
+    let source = null;
+    let pollTimer = null;
+    let retryTimer = null;
+    let connectedBefore = false;
+
+    const connect = () => {
+      source = analyticsAPI.streamAttacks();
+
+      source.onopen = () => {
+        lastSeqRef.current = null;
+
+        // Stream hoạt động lại: bỏ polling dự phòng
+        if (pollTimer) {
+          clearInterval(pollTimer);
+          pollTimer = null;
+        }
+
+        // Kết nối lại (hoặc bật lại live mode): đồng bộ số liệu đã bỏ lỡ
+        if (connectedBefore || !loading) {
+          loadDashboardData(false);
+        }
+        connectedBefore = true;
+      };
+
+      source.addEventListener('attacks', (event) => {
+        streamHandlerRef.current(JSON.parse(event.data));
+      });
+
+      source.onerror = () => {
+        // Lỗi mạng: EventSource tự kết nối lại. Response không phải 200 (vd. 503 khi đủ client)
+        // thì EventSource đóng hẳn: quay về polling mỗi 3 giây và thử stream lại sau 30 giây
+        if (source.readyState !== EventSource.CLOSED) {
+          return;
+        }
+
+        source.close();
+        if (!pollTimer) {
+          pollTimer = setInterval(() => loadDashboardData(true), 3000);
+        }
+        retryTimer = setTimeout(connect, 30000);
+      };
+    };
+
+    connect();
 
-    return () => clearInterval(interval);
+    return () => {
+      source.close();
+      clearInterval(pollTimer);
+      clearTimeout(retryTimer);
+    };
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [isLive]);
 
@@ -275,16 +275,11 @@ const Reports = () => {
     setExporting(false);
   };
 
-  const handleExportCSV = async () => {
+  const handleExportCSV = () => {
     try {
-      const response = await analyticsAPI.exportLogs();
-      const csv = response.data.csv;
-
-      // Download CSV
-      const blob = new Blob([csv], { type: 'text/csv' });
-      const url = window.URL.createObjectURL(blob);
+      // Download CSV (server stream file kèm Content-Disposition)
       const a = document.createElement('a');
-      a.href = url;
+      a.href = analyticsAPI.getExportUrl();
       a.download = `cryptobeekeeper-report-${new Date().toISOString()}.csv`;
       a.click();
 
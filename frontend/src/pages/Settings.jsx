@@ -258,6 +258,9 @@ const Settings = () => {
               >
                 <option value="csv">CSV</option>
                 <option value="json">JSON</option>
+                <option value="ndjson">NDJSON (phân tích offline)</option>
+                <option value="parquet">Parquet (phân tích offline)</option>
+                <option value="arrow">Arrow (phân tích offline)</option>
                 <option value="pdf">PDF (Báo cáo)</option>
               </select>
             </div>
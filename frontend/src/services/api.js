@@ -42,6 +42,12 @@ export const analyticsAPI = {
     return response.data;
   },
 
+  // Lấy chi tiết một attack log (headers, payload...)
+  getAttackDetail: async (logId) => {
+    const response = await api.get(`/api/analytics/attacks/${logId}`);
+    return response.data;
+  },
+
   // Lấy top IPs
   getTopIPs: async (limit = 10) => {
     const response = await api.get('/api/analytics/top-ips', { params: { limit } });
@@ -78,10 +84,13 @@ export const analyticsAPI = {
     return response.data;
   },
 
-  // Export logs
-  exportLogs: async (params = {}) => {
-    const response = await api.get('/api/analytics/export', { params });
-    return response.data;
+  // Live feed (Server-Sent Events): event mới và counter deltas
+  streamAttacks: () => new EventSource(`${API_BASE_URL}/api/analytics/stream`),
+
+  // URL export logs: file được server stream về, trình duyệt tải trực tiếp (không giữ trong bộ nhớ)
+  getExportUrl: (params = {}) => {
+    const query = new URLSearchParams(params).toString();
+    return `${API_BASE_URL}/api/analytics/export${query ? `?${query}` : ''}`;
   },
 };
 
@@ -89,7 +98,7 @@ export const analyticsAPI = {
 export const honeypotAPI = {
   // Lấy danh sách tất cả wallets
   getWallets: async (limit = 100, skip = 0) => {
-    const response = await api.get('/api/wallet/list', { params: { limit, skip } });
+    const response = await api.get('/api/wallet/list', { params: { limit, skip, view: 'summary' } });
     return response.data;
   },
 
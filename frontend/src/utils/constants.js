@@ -87,5 +87,8 @@ export const TOAST_DURATION = {
 export const EXPORT_FORMATS = [
   { value: 'csv', label: 'CSV' },
   { value: 'json', label: 'JSON' },
+  { value: 'ndjson', label: 'NDJSON' },
+  { value: 'parquet', label: 'Parquet' },
+  { value: 'arrow', label: 'Arrow' },
   { value: 'pdf', label: 'PDF (Coming soon)', disabled: true },
 ];